@@ -0,0 +1,267 @@
+import re
+import bisect
+import logging
+from pyap import parser as pyap_parser
+from pyap.source_US import data as pyap_us_rules
+from assignment1.pattern_matcher import iter_paragraph_blocks
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Characters of text handed to pyap at a time by the document-level pass.
+PYAP_BLOCK_CHARS = 65536
+
+# The substitutions pyap applies to its input before matching (AddressParser._normalize_string),
+# in the same order. They are repeated here so its match offsets can be mapped back to the input.
+PYAP_NORMALIZATION = (
+    (re.compile(r'\r*(\n\r*)+', re.UNICODE), ', '),
+    (re.compile(r'\s*(\,\s*)+', re.UNICODE), ', '),
+    (re.compile(r'\s+', re.UNICODE), ' '),
+    (re.compile('[‐‑‒–—―]', re.UNICODE), '-'),
+)
+
+# The pyap parser of this process, created by check_pyap_internals when the module is imported.
+_address_parser = None
+
+# The region prefilter of this process, created on first use.
+_region_prefilter = None
+
+# Function to return the pyap parser, creating it on first use.
+def get_address_parser():
+    """
+    Returns a US pyap AddressParser shared by every call, so its detection rules are
+    imported and set up once per process instead of once per call.
+    """
+    global _address_parser
+    if _address_parser is None:
+        _address_parser = pyap_parser.AddressParser(country='US')
+    return _address_parser
+
+# Function to take the state rule out of pyap's address rule.
+def pyap_region_rule():
+    """
+    Returns the "region1" group of pyap's US full_address rule (the state names and
+    abbreviations it requires in every address), or None if the group cannot be found.
+    """
+    source = getattr(pyap_us_rules, 'full_address', '')
+    start = source.find('(?P<region1>')
+    depth, end = 0, start
+    while start >= 0 and end < len(source):
+        if source[end] == '\\':
+            end += 2
+            continue
+        depth += {'(': 1, ')': -1}.get(source[end], 0)
+        end += 1
+        if depth == 0:
+            break
+    if start < 0 or depth != 0:
+        return None
+    return source[start:end]
+
+# Function to check that pyap still has the internals this module relies on.
+def check_pyap_internals():
+    """
+    Checks the parts of pyap that are not its public API: the "region1" group of
+    pyap.source_US.data.full_address, the clean_text a parser keeps after parse, and the
+    match_start and match_end offsets of each address. A known address is parsed once, and
+    the parser is kept as the shared one (see get_address_parser).
+
+    Raises:
+        ImportError: If any of them is missing, e.g. after a pyap upgrade.
+    """
+    global _address_parser
+    if pyap_region_rule() is None:
+        raise ImportError("pyap.source_US.data.full_address has no 'region1' group; "
+                          "this pyap version is not supported (see the Pipfile).")
+    address_parser = pyap_parser.AddressParser(country='US')
+    sample = "1 Main Street\nSpringfield, IL 62701"
+    addresses = address_parser.parse(sample)
+    if (not isinstance(getattr(address_parser, 'clean_text', None), str) or not addresses
+            or not all(isinstance(getattr(addresses[0], name, None), int) for name in ('match_start', 'match_end'))):
+        raise ImportError("pyap's AddressParser no longer exposes clean_text, match_start and match_end; "
+                          "this pyap version is not supported (see the Pipfile).")
+    _address_parser = address_parser
+
+# Function to build a cheap test for text that may hold a US address.
+def get_region_prefilter():
+    """
+    Returns a pattern matching the state names and abbreviations pyap requires in every US
+    address (the "region1" group of its full_address rule).
+
+    The group is taken from pyap's own rule, so the prefilter accepts everything pyap can
+    match. Escaped spaces (as in "New York") are widened to any whitespace, since pyap
+    matches its normalized copy of the text, in which whitespace runs become one space.
+    """
+    global _region_prefilter
+    if _region_prefilter is None:
+        region = pyap_region_rule().replace('\\ ', r'\s+')
+        _region_prefilter = re.compile(region, re.VERBOSE | re.UNICODE)
+    return _region_prefilter
+
+# Function to split text into the paragraphs that may hold an address.
+def iter_address_paragraphs(text, block_chars=PYAP_BLOCK_CHARS):
+    """
+    Splits text at blank lines and yields the paragraphs that mention a US state or
+    territory (see get_region_prefilter), cut into blocks of at most block_chars characters.
+
+    Args:
+        text (str): The text to split.
+        block_chars (int): The maximum block size.
+
+    Yields:
+        tuple: The offset of the block in text and the block itself.
+    """
+    prefilter = get_region_prefilter()
+    for block_start, block in iter_paragraph_blocks(text, block_chars):
+        if prefilter.search(block):
+            yield block_start, block
+
+# Function to normalize text like pyap while recording the replacements it makes.
+def normalize_with_edits(text):
+    """
+    Applies PYAP_NORMALIZATION and records every replacement, so offsets in the result can
+    be mapped back to the input with map_offset_back.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        tuple: The normalized text, and for each substitution (in order) the list of its
+        replacements as (new_start, new_end, old_start, old_end) offsets.
+    """
+    passes = []
+    for pattern, replacement in PYAP_NORMALIZATION:
+        parts, edits = [], []
+        position = new_position = 0
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            parts.append(text[position:start])
+            new_position += start - position
+            parts.append(replacement)
+            edits.append((new_position, new_position + len(replacement), start, end))
+            new_position += len(replacement)
+            position = end
+        parts.append(text[position:])
+        text = ''.join(parts)
+        passes.append(edits)
+    return text, passes
+
+# Function to map an offset of the normalized text back to the input.
+def map_offset_back(offset, passes, is_end):
+    """
+    Maps an offset of the text returned by normalize_with_edits back to the input text.
+
+    Args:
+        offset (int): A start offset, or an exclusive end offset if is_end is True.
+        passes (list): The replacements returned by normalize_with_edits.
+        is_end (bool): Whether offset is an exclusive end offset.
+
+    Returns:
+        int: The corresponding offset in the input text. An offset inside a replacement maps
+        to the start (or, for an end offset, the end) of the text it replaced.
+    """
+    for edits in reversed(passes):
+        char = offset - 1 if is_end else offset
+        index = bisect.bisect_right(edits, (char, float('inf'))) - 1
+        if index >= 0 and char < edits[index][1]:
+            offset = edits[index][3] if is_end else edits[index][2]
+        elif index >= 0:
+            offset = offset - edits[index][1] + edits[index][3]
+    return offset
+
+# Function to find pyap's addresses in a block by their text.
+def search_address_texts(block, addresses):
+    """
+    Finds each address pyap reported in a block by searching the block for its text, for
+    blocks whose normalized copy cannot be mapped back to the block. pyap's address text is
+    normalized, so its words may be separated by any run of whitespace and commas in the
+    block. Each address is searched for after the previous one, so repeated addresses are
+    found in order.
+
+    Args:
+        block (str): The block passed to pyap.
+        addresses (list): The addresses pyap found in the block.
+
+    Returns:
+        list of tuple: The (start, end) offsets in block of the addresses found.
+    """
+    spans, position = [], 0
+    for address in addresses:
+        words = re.findall(r'[^\s,]+', str(address))
+        if not words:
+            continue
+        match = re.compile(r'[\s,]+'.join(re.escape(word) for word in words)).search(block, position)
+        if match is None:
+            logging.warning("Address '%s' reported by pyap was not found in its block.", address)
+            continue
+        spans.append(match.span())
+        position = match.end()
+    return spans
+
+# Function to find the offsets of every address pyap recognizes in a text.
+def find_address_spans(text, block_chars=PYAP_BLOCK_CHARS):
+    """
+    Runs pyap over the whole text, a block at a time, and returns where its addresses are.
+
+    The text is scanned a paragraph at a time (see iter_address_paragraphs), so addresses
+    that wrap across lines inside a paragraph are still found, and paragraphs that mention
+    no US state or territory, which pyap cannot match, are skipped. pyap reports offsets in
+    its normalized copy of the text; they are mapped back to offsets in text. If a block was
+    normalized differently than normalize_with_edits expects, its addresses are searched for
+    by their text instead (see search_address_texts).
+
+    Args:
+        text (str): The text to scan.
+        block_chars (int): Maximum characters passed to pyap at once. Defaults to PYAP_BLOCK_CHARS.
+
+    Returns:
+        list of tuple: The (start, end) offsets of the addresses, in order.
+    """
+    address_parser = get_address_parser()
+    spans = []
+    for block_start, block in iter_address_paragraphs(text, block_chars):
+        addresses = address_parser.parse(block)
+        if not addresses:
+            continue
+        clean_text, passes = normalize_with_edits(block)
+        if clean_text != address_parser.clean_text:
+            logging.warning("pyap normalized a block differently than expected; searching for its %s addresses instead.", len(addresses))
+            spans.extend((block_start + start, block_start + end) for start, end in search_address_texts(block, addresses))
+            continue
+        for address in addresses:
+            if address.match_end > address.match_start:
+                spans.append((block_start + map_offset_back(address.match_start, passes, False),
+                              block_start + map_offset_back(address.match_end, passes, True)))
+    logging.debug("Found %s addresses with the document-level pyap pass.", len(spans))
+    return spans
+
+# Function to split document spans into per-line spans.
+def spans_by_line(spans, line_offsets, lines):
+    """
+    Splits document spans into the parts that fall on each line, leaving out line breaks
+    (including a trailing "\\n" kept on a line read with readlines).
+
+    Args:
+        spans (list of tuple): (start, end) offsets in "\\n".join(lines).
+        line_offsets (list of int): The offset of each line in the joined text.
+        lines (list of str): The lines.
+
+    Returns:
+        dict: Line index mapped to the sorted (start, end) offsets within that line.
+    """
+    by_line = {}
+    for start, end in spans:
+        line_index = bisect.bisect_right(line_offsets, start) - 1
+        while line_index < len(lines) and line_offsets[line_index] < end:
+            line_start = line_offsets[line_index]
+            part_start = max(start, line_start) - line_start
+            part_end = min(end, line_start + len(lines[line_index].rstrip('\n'))) - line_start
+            if part_end > part_start:
+                by_line.setdefault(line_index, []).append((part_start, part_end))
+            line_index += 1
+    for parts in by_line.values():
+        parts.sort()
+    return by_line
+
+# Fail at import, rather than redact addresses wrongly, if pyap's internals have changed.
+check_pyap_internals()
@@ -0,0 +1,156 @@
+import os
+import re
+import sys
+import glob
+import fnmatch
+import logging
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Input pattern that reads the list of files from stdin, one path per line.
+STDIN_FILE_LIST = "-"
+
+# Suffix of gzip-compressed inputs, removed from the output names.
+GZIP_SUFFIX = ".gz"
+
+# Function to split a pattern into its fixed directory and the components that need matching.
+def split_pattern(pattern):
+    """
+    Splits a glob pattern at its first component with wildcards.
+
+    Args:
+        pattern (str): The pattern, e.g. "data/**/*.txt".
+
+    Returns:
+        tuple: The directory before the first wildcard ("" for the current directory) and the
+        list of remaining components (empty if the pattern has no wildcards).
+    """
+    parts = re.split(r'[\\/]', pattern) if os.altsep else pattern.split(os.sep)
+    for position, part in enumerate(parts):
+        if glob.has_magic(part):
+            return os.sep.join(parts[:position]) or (os.sep if position else ""), parts[position:]
+    return pattern, []
+
+# Function to tell whether a pattern component matches a directory entry name.
+def component_matches(name, part):
+    """
+    Matches a name against one pattern component like glob does: hidden names (starting
+    with ".") only match components that start with "." too.
+    """
+    if name.startswith('.') and not part.startswith('.'):
+        return False
+    return fnmatch.fnmatch(name, part)
+
+# Function to walk the directories that match the remaining pattern components.
+def iter_matches(directory, parts):
+    """
+    Yields the files under directory whose path matches the pattern components, reading each
+    directory with os.scandir as it goes, so no directory listing is held in memory.
+
+    A "**" component matches any number of directories, including none.
+
+    Args:
+        directory (str): The directory to search ("" for the current directory).
+        parts (list of str): The pattern components still to match.
+
+    Yields:
+        str: The matching file paths, joined like glob.glob joins them.
+    """
+    part, rest = parts[0], parts[1:]
+    if part == '**':
+        while rest and rest[0] == '**':
+            rest = rest[1:]
+        if not rest:
+            rest = ['*']
+        yield from iter_matches(directory, rest)
+    try:
+        entries = os.scandir(directory or os.curdir)
+    except OSError as error:
+        logging.warning("Cannot read directory '%s': %s", directory, error)
+        return
+    with entries:
+        for entry in entries:
+            path = os.path.join(directory, entry.name) if directory else entry.name
+            try:
+                if part == '**':
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        yield from iter_matches(path, parts)
+                elif component_matches(entry.name, part):
+                    if rest:
+                        if entry.is_dir():
+                            yield from iter_matches(path, rest)
+                    elif entry.is_file():
+                        yield path
+            except OSError as error:
+                logging.warning("Cannot read '%s': %s", path, error)
+
+# Function to read file paths from a stream.
+def iter_listed_files(stream):
+    """
+    Yields the non-empty lines of a stream, without their line breaks, as file paths.
+    """
+    for line in stream:
+        path = line.rstrip('\r\n')
+        if path:
+            yield path
+
+# Function to find the input files lazily.
+def iter_files(pattern, stdin=None):
+    """
+    Yields the files matching a pattern one at a time, so processing can start before the
+    whole directory tree has been read.
+
+    Args:
+        pattern (str): A glob pattern ("**" matches any number of directories), a single file,
+            or "-" to read one path per line from stdin.
+        stdin (file, optional): The stream read for "-". Defaults to sys.stdin.
+
+    Yields:
+        str: The file paths.
+    """
+    if pattern == STDIN_FILE_LIST:
+        yield from iter_listed_files(stdin or sys.stdin)
+        return
+    root, parts = split_pattern(pattern)
+    if not parts:
+        if os.path.isfile(root):
+            yield root
+        return
+    yield from iter_matches(root, parts)
+
+# Function to return the directory output names are made relative to.
+def discovery_root(pattern):
+    """
+    Returns the directory before the first wildcard of the pattern, or the current directory
+    for "-" and patterns without wildcards.
+    """
+    if pattern == STDIN_FILE_LIST:
+        return os.curdir
+    root, parts = split_pattern(pattern)
+    return (root or os.curdir) if parts else (os.path.dirname(root) or os.curdir)
+
+# Function to name the outputs of an input file.
+def output_stem(file_path, root=None):
+    """
+    Returns the name the outputs of an input file start with.
+
+    Without a root this is the file name; with one it is the file's path relative to the
+    root, so inputs with the same name in different directories get different outputs and
+    the names do not depend on which other files are processed. Paths outside the root are
+    used from the top of their drive. A ".gz" suffix is removed.
+
+    Args:
+        file_path (str): The input file.
+        root (str, optional): The discovery root (see discovery_root). Defaults to None.
+
+    Returns:
+        str: The output name, possibly containing directory separators.
+    """
+    if root is None:
+        stem = os.path.basename(file_path)
+    else:
+        stem = os.path.relpath(os.path.abspath(file_path), os.path.abspath(root))
+        if stem == os.pardir or stem.startswith(os.pardir + os.sep):
+            stem = os.path.splitdrive(os.path.abspath(file_path))[1].lstrip(os.sep)
+    return stem[:-len(GZIP_SUFFIX)] if stem.endswith(GZIP_SUFFIX) else stem
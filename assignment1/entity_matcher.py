@@ -0,0 +1,223 @@
+import re
+import logging
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Key used inside trie nodes to mark the end of a complete term.
+TERM_END = ''
+
+# Function to build a character trie from a list of terms.
+def build_trie(terms, ignore_case=False):
+    """
+    Builds a character trie (nested dictionaries) from the given terms.
+
+    Each node is a dictionary mapping the next character to its child node. A node
+    that completes a term carries the TERM_END key. Empty terms are skipped because
+    they can never be redacted.
+
+    Args:
+        terms (iterable of str): The terms to insert into the trie.
+        ignore_case (bool): If True, terms are lowercased before insertion.
+
+    Returns:
+        dict: The root node of the trie.
+    """
+    root = {}
+    for term in terms:
+        if not term:
+            continue
+        if ignore_case:
+            term = term.lower()
+        node = root
+        for char in term:
+            node = node.setdefault(char, {})
+        node[TERM_END] = True
+    return root
+
+# Terms longer than this are matched as plain escaped alternatives instead of through the trie.
+# Every optional group of the trie pattern nests inside the previous one, so a long term with
+# many shorter prefixes would nest deeper than the regex compiler can handle.
+MATCHER_MAX_TERM_CHARS = 100
+
+# Function to turn a trie into a regex pattern string.
+def trie_to_pattern(root):
+    """
+    Converts a trie into a regular expression that matches exactly the stored terms.
+
+    Children of a node start with distinct characters, so at most one branch can
+    match at any position and the regex engine never has to try alternatives.
+    Optional groups are greedy, which makes the pattern prefer the longest term
+    that starts at a given position.
+
+    The trie is walked with an explicit stack (children before their parent), so the
+    length of a term is not limited by the recursion limit.
+
+    Args:
+        root (dict): A trie node produced by build_trie.
+
+    Returns:
+        str: The regex pattern for the sub-trie rooted at root.
+    """
+    patterns = {}
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for char, child in node.items() if char != TERM_END)
+            continue
+        branches = [re.escape(char) + patterns.pop(id(child))
+                    for char, child in sorted(node.items()) if char != TERM_END]
+        if not branches:
+            body = ''
+        elif len(branches) == 1:
+            body = branches[0]
+            if TERM_END in node:
+                body = '(?:' + body + ')?'
+        else:
+            body = '(?:' + '|'.join(branches) + ')'
+            if TERM_END in node:
+                body += '?'
+        patterns[id(node)] = body
+    return patterns[id(root)]
+
+# Function to compile a single-pass matcher for a list of terms.
+def compile_matcher(terms, ignore_case=False, word_boundary=False):
+    """
+    Compiles the given terms into one regex built from a trie.
+
+    Terms longer than MATCHER_MAX_TERM_CHARS are tried first, longest first, as escaped
+    literals; they are longer than every trie term, so the longest term starting at a
+    position still wins.
+
+    Args:
+        terms (iterable of str): The terms to match.
+        ignore_case (bool): If True, matching is case-insensitive.
+        word_boundary (bool): If True, terms only match as whole words.
+
+    Returns:
+        re.Pattern or None: The compiled matcher, or None if there is nothing to match.
+    """
+    terms = set(terms)
+    long_terms = sorted((term for term in terms if len(term) > MATCHER_MAX_TERM_CHARS), key=len, reverse=True)
+    trie = build_trie((term for term in terms if len(term) <= MATCHER_MAX_TERM_CHARS), ignore_case=ignore_case)
+    if not trie and not long_terms:
+        return None
+    alternatives = [re.escape(term) for term in long_terms]
+    if trie:
+        alternatives.append(trie_to_pattern(trie))
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if word_boundary:
+        pattern = r'(?<!\w)(?:' + pattern + r')(?!\w)'
+    flags = re.IGNORECASE if ignore_case else 0
+    return re.compile(pattern, flags)
+
+# Function to compile a matcher for every enabled entity type.
+def compile_entity_matcher(entities, redact_settings):
+    """
+    Builds the redaction matcher for one document from its entity lists.
+
+    Args:
+        entities (dict): Entity type (e.g. "PERSON") mapped to the list of strings found for it.
+        redact_settings (dict): Entity type mapped to a bool saying whether it should be redacted.
+
+    Returns:
+        re.Pattern or None: The compiled matcher, or None if no enabled entity is present.
+    """
+    terms = set()
+    for entity_type, should_redact in redact_settings.items():
+        if should_redact and entity_type in entities:
+            terms.update(entities[entity_type])
+    logging.debug("Compiling entity matcher for %s terms.", len(terms))
+    return compile_matcher(terms)
+
+# Function to find every span matched by a compiled matcher.
+def find_spans(matcher, text, start=0, end=None):
+    """
+    Scans the text once and returns the matched spans.
+
+    Overlaps are resolved the same way every time: the leftmost match wins, and
+    among matches starting at the same position the longest one wins.
+
+    Args:
+        matcher (re.Pattern or None): A matcher from compile_matcher or compile_entity_matcher.
+        text (str): The text to scan.
+        start (int): Offset where the scan starts. Defaults to 0.
+        end (int, optional): Offset where the scan stops, as if the text ended there, so one
+            line of a document can be scanned without copying it out. Defaults to the end of the text.
+
+    Returns:
+        list of tuple: Sorted, non-overlapping (start, end) offsets into text.
+    """
+    if matcher is None:
+        return []
+    return [match.span() for match in matcher.finditer(text, start, len(text) if end is None else end)]
+
+# Function to find every occurrence of a few terms without compiling a matcher.
+def term_spans(text, terms):
+    """
+    Returns the (start, end) offsets of every occurrence of each term in the text. For short
+    texts with few terms, such as the cells of a table, this is cheaper than compiling a matcher.
+
+    Args:
+        text (str): The text to scan.
+        terms (iterable of str): The terms; empty ones are skipped.
+
+    Returns:
+        list of tuple: The spans, possibly overlapping, in no particular order (see merge_spans).
+    """
+    spans = []
+    for term in set(terms):
+        if not term:
+            continue
+        start = text.find(term)
+        while start >= 0:
+            spans.append((start, start + len(term)))
+            start = text.find(term, start + 1)
+    return spans
+
+# Function to mask the given spans of a text.
+def mask_spans(text, spans, mask_char='█'):
+    """
+    Replaces every character inside the given spans with the mask character.
+
+    Args:
+        text (str): The text to mask.
+        spans (list of tuple): Sorted, non-overlapping (start, end) offsets.
+        mask_char (str): The character used for masking. Defaults to '█'.
+
+    Returns:
+        str: The masked text, built in a single pass.
+    """
+    if not spans:
+        return text
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(text[position:start])
+        parts.append(mask_char * (end - start))
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+# Function to write a text with the given spans masked.
+def write_masked(f, text, spans, mask_char='█'):
+    """
+    Writes the text to a stream with every character inside the spans replaced by the
+    mask character, one segment at a time, so the masked text is never built in memory.
+
+    Args:
+        f (file object): The text stream written to (a file or io.StringIO).
+        text (str): The text to mask.
+        spans (list of tuple): Sorted, non-overlapping (start, end) offsets.
+        mask_char (str): The character used for masking. Defaults to '█'.
+    """
+    position = 0
+    for start, end in spans:
+        if start > position:
+            f.write(text[position:start])
+        f.write(mask_char * (end - start))
+        position = end
+    if position < len(text):
+        f.write(text[position:] if position else text)
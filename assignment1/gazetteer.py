@@ -0,0 +1,189 @@
+import re
+import logging
+import us
+import pycountry
+from assignment1.entity_matcher import TERM_END
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Characters stripped from both ends of a token before it is looked up.
+TOKEN_STRIP_CHARS = '.,'
+
+# Place names that are not in the us or pycountry data but are always recognised.
+EXTRA_PLACE_NAMES = ('USA',)
+
+# The gazetteer index of this process, built on first use.
+_gazetteer = None
+
+# Function to split a place name into the tokens used as index keys.
+def place_tokens(name):
+    """
+    Splits a place name on whitespace and normalizes each token like the document tokens.
+
+    Args:
+        name (str): The place name, e.g. "Korea, Republic of".
+
+    Returns:
+        tuple of str: The normalized, non-empty tokens, e.g. ("Korea", "Republic", "of").
+    """
+    tokens = (token.strip(TOKEN_STRIP_CHARS) for token in name.split())
+    return tuple(token for token in tokens if token)
+
+# Function to build a gazetteer index from place names.
+def build_gazetteer(names):
+    """
+    Builds a gazetteer index from the given place names.
+
+    Single-token names go into a hashed set, so each document token costs one lookup.
+    Multi-token names go into a token trie (nested dictionaries keyed by token, with
+    TERM_END marking a complete name), so "New York" or "United Kingdom" are found
+    without trying every name at every position.
+
+    Args:
+        names (iterable of str): The place names to index.
+
+    Returns:
+        dict: The index, with a "single" set and a "trie" root node.
+    """
+    gazetteer = {"single": set(), "trie": {}}
+    add_place_names(gazetteer, names)
+    return gazetteer
+
+# Function to add place names to an existing gazetteer index.
+def add_place_names(gazetteer, names):
+    """
+    Adds place names to a gazetteer index in place.
+
+    Args:
+        gazetteer (dict): An index returned by build_gazetteer.
+        names (iterable of str): The place names to add.
+    """
+    for name in names:
+        tokens = place_tokens(name)
+        if not tokens:
+            continue
+        if len(tokens) == 1:
+            gazetteer["single"].add(tokens[0])
+            continue
+        node = gazetteer["trie"]
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[TERM_END] = True
+
+# Function to list the built-in place names.
+def default_place_names():
+    """
+    Returns the U.S. state names and abbreviations, the country names and two-letter
+    codes, and EXTRA_PLACE_NAMES.
+
+    Returns:
+        list of str: The built-in place names.
+    """
+    names = []
+    for state in us.states.STATES:
+        names.extend((state.abbr, state.name))
+    for country in pycountry.countries:
+        names.extend((country.name, country.alpha_2))
+    names.extend(EXTRA_PLACE_NAMES)
+    return names
+
+# Function to return the gazetteer index of this process, building it on first use.
+def get_gazetteer():
+    """
+    Returns the gazetteer index of this process.
+
+    The index is built from default_place_names the first time it is needed and then
+    reused for every document.
+
+    Returns:
+        dict: The index, with a "single" set and a "trie" root node.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = build_gazetteer(default_place_names())
+        logging.info("Built gazetteer with %s single-token names.", len(_gazetteer["single"]))
+    return _gazetteer
+
+# Function to add user-supplied place names to the gazetteer of this process.
+def extend_gazetteer(names):
+    """
+    Adds place names to the gazetteer of this process.
+
+    Args:
+        names (iterable of str): The place names to add.
+    """
+    add_place_names(get_gazetteer(), names)
+
+# Function to drop the gazetteer of this process.
+def reset_gazetteer():
+    """
+    Drops the gazetteer index, so the next lookup rebuilds it from the built-in names only.
+    """
+    global _gazetteer
+    _gazetteer = None
+
+# Function to read a list of place names from a file.
+def load_place_list(file_path):
+    """
+    Reads place names from a text file with one name per line.
+
+    Blank lines and lines starting with '#' are ignored.
+
+    Args:
+        file_path (str): The path of the place list.
+
+    Returns:
+        list of str: The place names.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+# Function to find the place names that occur in a text.
+def find_places(text, gazetteer=None, with_spans=False):
+    """
+    Finds every gazetteer place name in the text.
+
+    The text is split on whitespace and each token is stripped of '.' and ','. A token
+    found in the single-token set is reported. At every token the trie is also walked
+    to find the longest multi-token name starting there, which is reported as it appears
+    in the text (e.g. "Korea, Republic of"), so it can be masked verbatim.
+
+    Args:
+        text (str): The text to scan.
+        gazetteer (dict, optional): The index to use. Defaults to get_gazetteer().
+        with_spans (bool): If True, each place is returned as a (text, start, end) tuple. Defaults to False.
+
+    Returns:
+        list of str: The place names found, in document order, with repeats.
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    single, trie = gazetteer["single"], gazetteer["trie"]
+
+    # Normalized tokens with the offsets of their stripped text.
+    tokens = []
+    for match in re.finditer(r'\S+', text):
+        raw = match.group()
+        token = raw.strip(TOKEN_STRIP_CHARS)
+        if token:
+            start = match.start() + (len(raw) - len(raw.lstrip(TOKEN_STRIP_CHARS)))
+            tokens.append((token, start, start + len(token)))
+
+    places = []
+    for i, (token, start, end) in enumerate(tokens):
+        if token in single:
+            places.append((token, start, end) if with_spans else token)
+        node = trie.get(token)
+        longest_end = None
+        j = i + 1
+        while node is not None:
+            if TERM_END in node:
+                longest_end = tokens[j - 1][2]
+            if j == len(tokens):
+                break
+            node = node.get(tokens[j][0])
+            j += 1
+        if longest_end is not None:
+            places.append((text[start:longest_end], start, longest_end) if with_spans else text[start:longest_end])
+    return places
@@ -1,12 +1,28 @@
 import os
 import re
+import bisect
 import logging
+from functools import lru_cache
+from assignment1.entity_matcher import compile_entity_matcher, compile_matcher, find_spans, mask_spans
+from assignment1.models import get_wordnet
+from assignment1.span_index import merge_spans
 
 # Configure logger for helper.py
 logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Abbreviations whose trailing period does not end a sentence.
+NON_TERMINAL_ABBREVIATIONS = ('Mr', 'Mrs', 'Ms', 'Dr', 'Prof', 'Sr', 'Jr', 'St', 'Mt', 'vs', 'etc', 'e.g', 'i.e', 'No')
+
+# Sentence boundaries: a blank line, or whitespace after '.', '!' or '?' (and any closing quotes or brackets)
+# that does not follow one of the NON_TERMINAL_ABBREVIATIONS.
+SENTENCE_BOUNDARY_PATTERN = re.compile(
+    r'\n[ \t]*\n\s*'
+    r'|(?<=[.!?])(?<!\b' + r')(?<!\b'.join(re.escape(abbreviation + '.') for abbreviation in NON_TERMINAL_ABBREVIATIONS) + r')'
+    r'(?P<close>["\')\]]*)\s+'
+)
+
 # Function to apply redactions to text based on specified settings and entity lists.
-def apply_redaction(text, entities, redact_names=False, redact_dates=False, redact_phones=False, redact_address=False, redact_topics=[] ):
+def apply_redaction(text, entities, redact_names=False, redact_dates=False, redact_phones=False, redact_address=False, redact_topics=[], matcher=None, spans=None):
     """
     Redacts specified types of sensitive information from the given text.
     Parameters:
@@ -16,30 +32,38 @@ def apply_redaction(text, entities, redact_names=False, redact_dates=False, reda
     redact_dates (bool): If True, redact dates (entities of type "DATE"). Default is False.
     redact_phones (bool): If True, redact phone numbers (entities of type "PHONE"). Default is False.
     redact_address (bool): If True, redact addresses (entities of type "ADDRESS"). Default is False.
-    redact_topics (list): A list of additional topics/terms to be redacted from the text.
+    redact_topics (list): A list of additional topics/terms; sentences of the text containing one are redacted.
+    matcher (re.Pattern, optional): A matcher prebuilt with compile_entity_matcher for the same entities and settings.
+        Callers redacting many lines of one document should build it once and pass it in. Defaults to None.
+    spans (list of dict, optional): Spans read from a span index (see read_span_index). When given, entities
+        is ignored and the spans of the enabled types are masked directly, without detection; "TOPIC"
+        spans are masked if redact_topics is non-empty (any truthy value). Defaults to None.
     Returns:
     str: The redacted text with specified entities and topics replaced by a series of █ characters.
     """
     logging.debug("Applying redactions based on settings.")
-    redacted_text = text  
     redact_settings = {
         "PERSON": redact_names,
         "DATE": redact_dates,
         "PHONE": redact_phones,
         "ADDRESS": redact_address,
     }
-    #print(f"entites in redact {entities}")
-    # Iterate over each entity type and apply redaction if enabled.
-    for entity_type, should_redact in redact_settings.items():
-        if should_redact and entity_type in entities:
-            for item in entities[entity_type]:
-                # pattern = r'\b' + re.escape(item) + r'\b'
-                redacted_text = redacted_text.replace(item, '█' * len(item))
-                # redacted_text = re.sub(pattern, '█' * len(item), redacted_text, flags=re.IGNORECASE)
-                logging.debug(f"Redacted {entity_type}: {item}")
+    # Mask the spans of a span index directly; detection already happened when it was written.
+    if spans is not None:
+        redact_settings["TOPIC"] = bool(redact_topics)
+        spans = merge_spans(span for span in spans if redact_settings.get(span["type"]))
+        logging.debug("Masking %s spans from a span index.", len(spans))
+        return mask_spans(text, spans)
+
+    # Find all enabled entities in a single scan instead of one str.replace per entity.
+    if matcher is None:
+        matcher = compile_entity_matcher(entities, redact_settings)
+    spans = find_spans(matcher, text)
+    redacted_text = mask_spans(text, spans)
+    logging.debug("Redacted %s entity occurrences.", len(spans))
     # Additional redaction for specified topics.
     if redact_topics:
-        redacted_text = hide_terms_in_sentences(redacted_text, redact_topics)
+        redacted_text = hide_topic_sentences(redacted_text, compile_topic_matcher(tuple(redact_topics)))
         logging.debug("Applied topic-based redactions.")
 
     return redacted_text
@@ -61,7 +85,7 @@ def list_files(folder_pattern):
     """
     import glob
     files = glob.glob(folder_pattern)
-    logging.debug(f"Listing files with pattern {folder_pattern}: {files}")
+    logging.debug("Listing files with pattern %s: %s", folder_pattern, files)
     return files
 
 # Function to retrieve related words for a given concept using WordNet.
@@ -78,7 +102,7 @@ def get_related_words(concept):
     Logs:
         Debug information about the related words found for the concept.
     """
-    from nltk.corpus import wordnet
+    wordnet = get_wordnet()
     synonyms = []
     for syn in wordnet.synsets(concept):
         for lemma in syn.lemmas():
@@ -92,41 +116,140 @@ def get_related_words(concept):
             synonyms.append(clean_name)
     synonyms =set(synonyms)
 
-    logging.debug(f"Related words for concept {concept}: {synonyms}")
+    logging.debug("Related words for concept %s: %s", concept, synonyms)
     #print(f"Related words for concept {concept}: {synonyms}")
     return list(set(synonyms))
 
 # Function to redact entire sentences containing any of a list of terms.
-def hide_terms_in_sentences(text, related_words):
+def hide_terms_in_sentences(text, related_words, word_boundary=False):
     """
     Redacts sentences in the given text that contain any of the related words.
     Args:
         text (str): The input text containing multiple sentences.
         related_words (list of str): A list of words to search for in the sentences.
+        word_boundary (bool): If True, only whole-word matches count. Defaults to False.
     Returns:
         str: The text with sentences containing related words redacted.
-    The function splits the input text into sentences, checks each sentence for the presence of any word from the related_words list (which we will get from the get_related_words function),
-    and replaces the entire sentence with a redacted block if any related word is found. The redacted sentences are joined back into a single string.
-    """
-    sentences = re.split(r'\. ', text)
-    redacted_sentences = []
-    #print(f"related words n hide terms function {related_words, len(sentences)}")
-    for sentence in sentences:
-        should_redact = False
-        for word in related_words:
-            if word.lower() in sentence.lower():
-                should_redact = True
-                break
-        if should_redact:
-            redacted_sentences.append('█' * len(sentence))
-            # print(f"Redacted a sentence due to related word: {sentence}")
-            logging.debug(f"Redacted a sentence due to related word: {sentence}")
-        else:
-            
-            #print(f"Keeping a sentence: {word }, {sentence}")
-            redacted_sentences.append(sentence + '.')
-    final_text = ' '.join(redacted_sentences).rstrip('.')
-    if text.endswith('.'):
-        final_text += '.'
-    logging.debug(f"Final redacted text: {final_text}")
+    The related words (which we will get from the get_related_words function) are compiled into one
+    case-insensitive matcher, the text is split into sentences once, and every sentence containing a
+    match is replaced by a redacted block of the same length (see hide_topic_sentences).
+    """
+    final_text = hide_topic_sentences(text, compile_topic_matcher(tuple(related_words), word_boundary))
+    logging.debug("Final redacted text: %s", final_text)
     return final_text
+
+# Function to compile the related words of the redaction topics into one matcher.
+@lru_cache(maxsize=32)
+def compile_topic_matcher(related_words, word_boundary=False):
+    """
+    Compiles the related words into one case-insensitive matcher built from a trie.
+
+    The result is cached, so a run that redacts many documents with the same topics
+    compiles the matcher only once.
+
+    Args:
+        related_words (tuple of str): The words to look for (a tuple, so it can be cached).
+        word_boundary (bool): If True, words only match as whole words, so "ring" does not
+            match inside "string". Defaults to False, which matches substrings like
+            hide_terms_in_sentences always did.
+
+    Returns:
+        re.Pattern or None: The compiled matcher, or None if there are no words.
+    """
+    logging.debug("Compiling topic matcher for %s related words.", len(related_words))
+    return compile_matcher(related_words, ignore_case=True, word_boundary=word_boundary)
+
+# Function to split a text into sentences.
+def sentence_spans(text):
+    """
+    Splits the text into sentences and returns their offsets.
+
+    A sentence ends at '.', '!' or '?' followed by whitespace (titles such as "Mr." and
+    other NON_TERMINAL_ABBREVIATIONS excepted), or at a blank line. Sentences may span
+    several lines. The whitespace between sentences belongs to none of them.
+
+    Args:
+        text (str): The text to segment.
+
+    Returns:
+        list of tuple: The (start, end) offsets of the non-empty sentences, in order.
+    """
+    spans = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+        # Closing quotes or brackets after the final punctuation belong to the sentence.
+        end = boundary.end('close') if boundary.group('close') is not None else boundary.start()
+        if end > start:
+            spans.append((start, end))
+        start = boundary.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+# Function to find the sentences that contain a topic word.
+def topic_sentence_spans(text, matcher, sentences=None):
+    """
+    Finds the sentences that contain at least one match of the topic matcher.
+
+    The text is scanned once with the matcher; each match is assigned to its sentence
+    by binary search over the sentence offsets.
+
+    Args:
+        text (str): The text to scan.
+        matcher (re.Pattern or None): A matcher from compile_topic_matcher.
+        sentences (list of tuple, optional): The sentence offsets of the text. Defaults to sentence_spans(text).
+
+    Returns:
+        list of tuple: The (start, end) offsets of the sentences to redact, in order.
+    """
+    if matcher is None:
+        return []
+    if sentences is None:
+        sentences = sentence_spans(text)
+    sentence_starts = [start for start, _ in sentences]
+    matched = []
+    for match in matcher.finditer(text):
+        index = bisect.bisect_right(sentence_starts, match.start()) - 1
+        if index >= 0 and match.start() < sentences[index][1] and (not matched or matched[-1] != index):
+            matched.append(index)
+    return [sentences[index] for index in matched]
+
+# Function to redact every sentence that contains a topic word.
+def hide_topic_sentences(text, matcher):
+    """
+    Masks every sentence of the text that contains a match of the topic matcher.
+
+    The text is segmented into sentences once and scanned once. Line breaks inside a
+    redacted sentence are kept, so the redacted text has the same lines and length as
+    the input.
+
+    Args:
+        text (str): The text to redact.
+        matcher (re.Pattern or None): A matcher from compile_topic_matcher.
+
+    Returns:
+        str: The text with the matching sentences replaced by █ characters.
+    """
+    spans = topic_mask_spans(text, matcher)
+    if spans:
+        logging.debug("Redacted %s sentence fragments containing topic words.", len(spans))
+    return mask_spans(text, spans)
+
+# Function to list the offsets masked by topic redaction.
+def topic_mask_spans(text, matcher):
+    """
+    Returns the offsets hide_topic_sentences masks: the parts of each matching sentence
+    between line breaks.
+
+    Args:
+        text (str): The text to scan.
+        matcher (re.Pattern or None): A matcher from compile_topic_matcher.
+
+    Returns:
+        list of tuple: Sorted (start, end) offsets, none of which contains a line break.
+    """
+    spans = []
+    for start, end in topic_sentence_spans(text, matcher):
+        for line in re.finditer(r'[^\n]+', text[start:end]):
+            spans.append((start + line.start(), start + line.end()))
+    return spans
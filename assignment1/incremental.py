@@ -0,0 +1,246 @@
+import os
+import json
+import hashlib
+import logging
+from importlib import metadata
+from assignment1.models import DEFAULT_SPACY_MODEL
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Version of the redactor's own detection rules (regex patterns, title and email heuristics,
+# gazetteer). Bump it whenever they change, so cached entities are recomputed.
+DETECTION_VERSION = "2"
+
+# Name of the manifest file written to the output directory in incremental mode.
+MANIFEST_NAME = ".redactor_manifest.json"
+
+# Directory (inside the output directory) holding the cached entities of each input.
+ENTITY_CACHE_DIR = ".redactor_entities"
+
+# Bytes read at a time when hashing a file.
+HASH_BLOCK_BYTES = 1 << 20
+
+# Manifest entries of the files processed in this process, in completion order.
+PENDING_MANIFEST_ENTRIES = []
+
+# Function to hash a file's content.
+def file_hash(file_path):
+    """
+    Returns the SHA-256 of a file's bytes, reading it in blocks so memory stays bounded.
+
+    Args:
+        file_path (str): The file to hash.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to look up an installed package version without importing the package.
+def package_version(package):
+    """
+    Returns the installed version of a distribution, or None if it is not installed.
+    """
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+# Function to describe everything that determines the detected entities.
+def detector_versions(args):
+    """
+    Collects the versions and options that the detected entities depend on.
+
+    Args:
+        args (Namespace): Command-line arguments (hardened regex limits, --places lists, --prefilter stages
+            and the entity registry).
+
+    Returns:
+        dict: The redactor's DETECTION_VERSION, the spaCy, model and gazetteer package versions,
+        the hardened regex limits, the hashes of the --places lists, the prefilter stages and whether
+        the entity registry is used.
+    """
+    versions = {"detection": DETECTION_VERSION, "spacy_model": DEFAULT_SPACY_MODEL}
+    for package in ("spacy", DEFAULT_SPACY_MODEL, "us", "pycountry"):
+        versions[package] = package_version(package)
+    if getattr(args, "hardened_regex", False):
+        versions["hardened_regex"] = [getattr(args, "regex_max_chars", None), getattr(args, "regex_time_limit", None)]
+    versions["places"] = [file_hash(path) for path in getattr(args, "places", None) or []]
+    if getattr(args, "prefilter", None) is not None and not getattr(args, "prefilter_recall_check", False):
+        versions["prefilter"] = sorted(args.prefilter)
+    if getattr(args, "entity_registry", False) or getattr(args, "entity_registry_store", None):
+        versions["entity_registry"] = {"skip_ner": bool(getattr(args, "entity_registry_skip_ner", False))}
+    return versions
+
+# Function to describe everything that determines how the entities are masked.
+def redaction_settings(args):
+    """
+    Collects the flags, concepts and versions that decide how detected entities are masked.
+
+    Args:
+        args (Namespace): Command-line arguments.
+
+    Returns:
+        dict: The redaction flags, the concepts, the output options, and the pyap version.
+    """
+    return {
+        "names": bool(args.names),
+        "dates": bool(args.dates),
+        "phones": bool(args.phones),
+        "address": bool(args.address),
+        "concept": list(args.concept or []),
+        "concept_word_boundary": bool(getattr(args, "concept_word_boundary", False)),
+        "stream": bool(getattr(args, "stream", False)),
+        "structured": getattr(args, "structured", "text"),
+        "text_fields": sorted(getattr(args, "text_fields", None) or []),
+        "span_index": bool(getattr(args, "span_index", False)),
+        "stable_names": bool(getattr(args, "stable_names", False)),
+        "gzip_output": bool(getattr(args, "gzip_output", False)),
+        "stats_aggregate": bool(getattr(args, "stats_aggregate", None)),
+        "pyap": package_version("pyap"),
+        "pyap_block_chars": getattr(args, "pyap_block_chars", None),
+    }
+
+# Function to turn a dictionary into a short stable key.
+def settings_key(settings):
+    """
+    Returns the SHA-256 of the dictionary's canonical JSON form.
+    """
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Function to write JSON to a file atomically.
+def write_json_atomic(path, data):
+    """
+    Writes the data to a temporary file and moves it into place, so a reader never sees
+    a partly written file.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, sort_keys=True)
+    os.replace(temp_path, path)
+
+# Function to read the manifest of an output directory.
+def load_manifest(output_dir):
+    """
+    Reads the manifest of the output directory.
+
+    Args:
+        output_dir (str): The output directory.
+
+    Returns:
+        dict: The absolute input path mapped to its manifest entry; empty if there is no manifest.
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Function to write the manifest of an output directory.
+def save_manifest(output_dir, manifest):
+    """
+    Writes the manifest of the output directory.
+
+    Args:
+        output_dir (str): The output directory.
+        manifest (dict): The absolute input path mapped to its manifest entry.
+    """
+    write_json_atomic(os.path.join(output_dir, MANIFEST_NAME), manifest)
+    logging.info("Wrote manifest with %s entries to '%s'.", len(manifest), output_dir)
+
+# Function to build the manifest entry of a processed file.
+def manifest_entry(index, content_hash, detectors, settings, outputs, stats=None):
+    """
+    Builds the manifest entry recording how a file was processed.
+
+    Args:
+        index (int or None): 1-based position of the file in the input list (names the stats file),
+            or None when the outputs are named after the file (--stable-names).
+        content_hash (str): The file's content hash.
+        detectors (dict): The detector_versions used.
+        settings (dict): The redaction_settings used.
+        outputs (list of str): The paths of the files written for the input.
+        stats (str, optional): The file's formatted statistics, appended again to the
+            --stats-aggregate file when the file is skipped in a later run. Defaults to None.
+
+    Returns:
+        dict: The manifest entry.
+    """
+    entry = {"hash": content_hash, "index": index, "detectors": settings_key(detectors),
+             "settings": settings_key(settings), "outputs": outputs}
+    if stats is not None:
+        entry["stats"] = stats
+    return entry
+
+# Function to decide whether a file can be skipped.
+def is_unchanged(entry, content_hash, detectors, settings):
+    """
+    Returns True if the file was already processed with the same content, detectors and
+    settings, and all of its outputs still exist. With --stats-aggregate the entry must also
+    hold the file's statistics, so they can be written to the new aggregate.
+
+    The file's position in the input list is not compared: only the sample_stats<index>.txt
+    name depends on it, and the caller can write that file again from the entry's statistics.
+
+    Args:
+        entry (dict or None): The file's manifest entry from the previous run.
+        content_hash (str): The file's current content hash.
+        detectors (dict): The current detector_versions.
+        settings (dict): The current redaction_settings.
+
+    Returns:
+        bool: Whether the file's outputs are up to date.
+    """
+    return (entry is not None
+            and entry.get("hash") == content_hash
+            and entry.get("detectors") == settings_key(detectors)
+            and entry.get("settings") == settings_key(settings)
+            and all(os.path.exists(path) for path in entry.get("outputs", []))
+            and (not settings.get("stats_aggregate") or "stats" in entry))
+
+# Function to return the cache path of a file's entities.
+def entity_cache_path(output_dir, content_hash, detectors):
+    """
+    Returns the path of the cached entities for the given content and detectors.
+    """
+    return os.path.join(output_dir, ENTITY_CACHE_DIR, f"{content_hash}-{settings_key(detectors)[:16]}.json")
+
+# Function to read cached entities.
+def load_cached_entities(output_dir, content_hash, detectors):
+    """
+    Reads the entities detected earlier in a file with the same content and detectors.
+
+    Args:
+        output_dir (str): The output directory.
+        content_hash (str): The file's content hash.
+        detectors (dict): The current detector_versions.
+
+    Returns:
+        dict or None: "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to their entity lists,
+        or None if nothing is cached.
+    """
+    try:
+        with open(entity_cache_path(output_dir, content_hash, detectors), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function to cache the entities detected in a file.
+def store_cached_entities(output_dir, content_hash, detectors, entities):
+    """
+    Caches the entities detected in a file, keyed by its content hash and the detectors.
+
+    Args:
+        output_dir (str): The output directory.
+        content_hash (str): The file's content hash.
+        detectors (dict): The detector_versions used.
+        entities (dict): "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to their entity lists.
+    """
+    os.makedirs(os.path.join(output_dir, ENTITY_CACHE_DIR), exist_ok=True)
+    write_json_atomic(entity_cache_path(output_dir, content_hash, detectors),
+                      {entity_type: sorted(values) for entity_type, values in entities.items()})
@@ -0,0 +1,160 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Stages of the redaction pipeline, in the order they run.
+PIPELINE_STAGES = ("read", "regex", "titles", "ner", "gazetteer", "pyap", "topics", "redaction", "write")
+
+# Per-file records finished in this process, in completion order.
+COLLECTED_FILE_METRICS = []
+
+# Timings of the file currently being processed by each thread.
+_active = threading.local()
+
+# Function to start collecting stage timings for a file.
+def begin_file_metrics(file_name):
+    """
+    Starts a new timing record for the given file in the current thread.
+
+    Args:
+        file_name (str): The name of the file being processed.
+    """
+    _active.record = {"file": file_name, "stages": dict.fromkeys(PIPELINE_STAGES, 0.0), "started": time.perf_counter()}
+
+# Function to add time to a stage of the current file.
+def add_stage_time(stage, seconds):
+    """
+    Adds the elapsed seconds to a stage of the file being processed by this thread.
+
+    Calls made while no file is being timed (e.g. from library code) are ignored.
+
+    Args:
+        stage (str): One of PIPELINE_STAGES.
+        seconds (float): The time spent in the stage.
+    """
+    record = getattr(_active, "record", None)
+    if record is not None:
+        record["stages"][stage] += seconds
+
+# Context manager timing a block of code as one stage.
+@contextmanager
+def stage_timer(stage):
+    """
+    Times the enclosed block and adds the elapsed time to the given stage.
+
+    Args:
+        stage (str): One of PIPELINE_STAGES.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+# Function to finish the timing record of the current file.
+def end_file_metrics():
+    """
+    Closes the timing record of the current file and stores it in COLLECTED_FILE_METRICS.
+
+    Returns:
+        dict or None: The record with the file name, seconds per stage and total seconds,
+        or None if no file was being timed.
+    """
+    record = getattr(_active, "record", None)
+    if record is None:
+        return None
+    _active.record = None
+    record["total"] = time.perf_counter() - record.pop("started")
+    COLLECTED_FILE_METRICS.append(record)
+    return record
+
+# Function to sum per-file records into totals per stage.
+def aggregate_metrics(records):
+    """
+    Sums the per-file records.
+
+    Args:
+        records (list of dict): Records returned by end_file_metrics.
+
+    Returns:
+        dict: The number of files, total seconds, and total seconds per stage.
+    """
+    stages = dict.fromkeys(PIPELINE_STAGES, 0.0)
+    for record in records:
+        for stage, seconds in record["stages"].items():
+            stages[stage] += seconds
+    return {"files": len(records), "total": sum(record["total"] for record in records), "stages": stages}
+
+# Function to render metrics as JSON.
+def format_metrics_json(records):
+    """
+    Renders the per-file records and their aggregate as a JSON document.
+
+    Args:
+        records (list of dict): Records returned by end_file_metrics.
+
+    Returns:
+        str: The JSON text.
+    """
+    return json.dumps({"aggregate": aggregate_metrics(records), "files": records}, indent=2)
+
+# Function to escape a Prometheus label value.
+def escape_label(value):
+    """
+    Escapes backslashes, quotes and newlines in a Prometheus label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Function to render metrics in the Prometheus text exposition format.
+def format_metrics_prometheus(records):
+    """
+    Renders the per-file records and their aggregate in the Prometheus text format.
+
+    Args:
+        records (list of dict): Records returned by end_file_metrics.
+
+    Returns:
+        str: The exposition text.
+    """
+    aggregate = aggregate_metrics(records)
+    lines = [
+        "# HELP redactor_files_total Files processed.",
+        "# TYPE redactor_files_total counter",
+        f"redactor_files_total {aggregate['files']}",
+        "# HELP redactor_stage_seconds_total Seconds spent in each pipeline stage over all files.",
+        "# TYPE redactor_stage_seconds_total counter",
+    ]
+    for stage, seconds in aggregate["stages"].items():
+        lines.append(f'redactor_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+    lines += [
+        "# HELP redactor_file_stage_seconds Seconds spent in each pipeline stage for one file.",
+        "# TYPE redactor_file_stage_seconds gauge",
+    ]
+    for record in records:
+        file_label = escape_label(record["file"])
+        for stage, seconds in record["stages"].items():
+            lines.append(f'redactor_file_stage_seconds{{file="{file_label}",stage="{stage}"}} {seconds:.6f}')
+    return "\n".join(lines) + "\n"
+
+# Function to write the collected metrics to a file.
+def write_metrics(path, records, metrics_format="json"):
+    """
+    Writes the metrics in the requested format.
+
+    Args:
+        path (str): The file to write. "-" writes to stdout.
+        records (list of dict): Records returned by end_file_metrics.
+        metrics_format (str): "json" or "prometheus". Defaults to "json".
+    """
+    text = format_metrics_prometheus(records) if metrics_format == "prometheus" else format_metrics_json(records)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    logging.info("Wrote %s metrics for %d files to '%s'", metrics_format, len(records), path)
@@ -0,0 +1,78 @@
+import os
+import logging
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Name of the spaCy model used for NER. It can be overridden with the REDACTOR_SPACY_MODEL environment variable.
+DEFAULT_SPACY_MODEL = os.environ.get('REDACTOR_SPACY_MODEL', 'en_core_web_md')
+
+# Loaded models, keyed by name. Models are added on first use or injected with register_model.
+_models = {}
+
+# Function to register (or replace) a model in the registry.
+def register_model(name, model):
+    """
+    Registers a model under the given name so later lookups return it without loading anything.
+
+    Tests use this to inject a lightweight stub in place of the spaCy pipeline or WordNet.
+
+    Args:
+        name (str): The registry key, either 'nlp' or 'wordnet'.
+        model (object): The model object to return for that key.
+    """
+    _models[name] = model
+    logging.debug("Registered model '%s'.", name)
+
+# Function to forget all loaded or injected models.
+def clear_models():
+    """
+    Removes every model from the registry, so the next lookup loads it again.
+    """
+    _models.clear()
+
+# Function to return the spaCy pipeline, loading it on first use.
+def get_nlp(model_name=None):
+    """
+    Returns the spaCy pipeline used for named entity recognition.
+
+    The model is loaded the first time this function is called and cached for the
+    rest of the process. Importing spaCy is itself expensive, so it is only imported here.
+
+    Args:
+        model_name (str, optional): The spaCy model to load. Defaults to DEFAULT_SPACY_MODEL.
+
+    Returns:
+        spacy.language.Language: The loaded pipeline.
+    """
+    if 'nlp' not in _models:
+        import spacy
+        model_name = model_name or DEFAULT_SPACY_MODEL
+        logging.info("Loading spaCy model '%s'.", model_name)
+        _models['nlp'] = spacy.load(model_name)
+    return _models['nlp']
+
+# Function to return the WordNet corpus reader, loading it on first use.
+def get_wordnet():
+    """
+    Returns the NLTK WordNet corpus reader.
+
+    WordNet is never downloaded implicitly, so the tool works on hosts without network
+    access. If the corpus is not installed a LookupError explains how to install it.
+
+    Returns:
+        nltk.corpus.reader.WordNetCorpusReader: The loaded WordNet reader.
+
+    Raises:
+        LookupError: If the WordNet data is not installed.
+    """
+    if 'wordnet' not in _models:
+        from nltk.corpus import wordnet
+        try:
+            wordnet.ensure_loaded()
+        except LookupError as error:
+            raise LookupError("NLTK WordNet data is not installed. Install it with "
+                              "'python -m nltk.downloader wordnet' before using --concept.") from error
+        logging.info("Loaded NLTK WordNet corpus.")
+        _models['wordnet'] = wordnet
+    return _models['wordnet']
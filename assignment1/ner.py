@@ -0,0 +1,91 @@
+import logging
+from assignment1.models import get_nlp
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Entity labels the redactor reads from the NER output.
+NER_LABELS = ("PERSON", "GPE")
+
+# Function to list the pipeline components that NER does not need.
+def ner_disabled_pipes(nlp):
+    """
+    Returns the names of the pipeline components that can be disabled for NER.
+
+    A component is kept if it sets doc.ents (the "ner" or an entity ruler) or if it is a
+    shared tok2vec/transformer layer that such a component listens to. Everything else,
+    such as the tagger, parser, attribute ruler and lemmatizer, is disabled.
+
+    Args:
+        nlp (spacy.language.Language): The loaded spaCy pipeline.
+
+    Returns:
+        list of str: The names of the components to disable.
+    """
+    needed = set()
+    for name in nlp.pipe_names:
+        if "doc.ents" in nlp.get_pipe_meta(name).assigns:
+            needed.add(name)
+    for name, component in nlp.pipeline:
+        listeners = getattr(component, "listening_components", [])
+        if needed.intersection(listeners):
+            needed.add(name)
+    return [name for name in nlp.pipe_names if name not in needed]
+
+# Function to collect the entities of interest from a processed document.
+def entities_from_doc(doc):
+    """
+    Collects the PERSON and GPE entity texts of a processed document.
+
+    Args:
+        doc (spacy.tokens.Doc): The processed document.
+
+    Returns:
+        dict: Each label in NER_LABELS mapped to the list of entity texts, in document order.
+    """
+    entities = {label: [] for label in NER_LABELS}
+    for entity in doc.ents:
+        if entity.label_ in entities:
+            entities[entity.label_].append(entity.text)
+    return entities
+
+# Function to run batched NER over many texts.
+def extract_ner_entities_batch(texts, nlp=None, batch_size=64, n_process=1):
+    """
+    Runs named entity recognition over many texts using nlp.pipe.
+
+    Only the components needed for NER run; the others are disabled for the duration
+    of the call. Models without a pipe method (such as test stubs) are called once per text.
+
+    Args:
+        texts (iterable of str): The texts to process.
+        nlp (spacy.language.Language, optional): The pipeline to use. Defaults to the registry's model.
+        batch_size (int): Number of texts sent through the pipeline at once. Defaults to 64.
+        n_process (int): Number of processes spaCy uses for the batch. Defaults to 1.
+
+    Returns:
+        list of dict: For each input text, the PERSON and GPE entity texts found in it.
+    """
+    if nlp is None:
+        nlp = get_nlp()
+    if not hasattr(nlp, "pipe"):
+        return [entities_from_doc(nlp(text)) for text in texts]
+
+    disabled = ner_disabled_pipes(nlp)
+    logging.debug("Running batched NER (batch_size=%s, n_process=%s, disabled=%s).", batch_size, n_process, disabled)
+    with nlp.select_pipes(disable=disabled):
+        return [entities_from_doc(doc) for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process)]
+
+# Function to run NER over a single text.
+def extract_ner_entities(text, nlp=None):
+    """
+    Runs named entity recognition over one text with the trimmed pipeline.
+
+    Args:
+        text (str): The text to process.
+        nlp (spacy.language.Language, optional): The pipeline to use. Defaults to the registry's model.
+
+    Returns:
+        dict: The PERSON and GPE entity texts found in the text.
+    """
+    return extract_ner_entities_batch([text], nlp=nlp, batch_size=1)[0]
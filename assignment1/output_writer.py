@@ -0,0 +1,149 @@
+import os
+import gzip
+import time
+import queue
+import logging
+import threading
+from assignment1.entity_matcher import write_masked
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Maximum number of outputs waiting for the writer thread. Producers wait when it is full,
+# so memory stays bounded when the disk is slower than redaction.
+OUTPUT_QUEUE_SIZE = 64
+
+# Queue item that tells the writer thread to stop.
+_STOP = object()
+
+# The writer thread of this process and its queue and errors, while one is running.
+_writer = None
+
+# Counters of the last writer thread: outputs written, seconds spent writing them ("busy") and
+# seconds producers waited for room in the queue ("blocked").
+OUTPUT_WRITER_STATS = {"outputs": 0, "busy": 0.0, "blocked": 0.0}
+
+# Function to open a text file, compressed or not.
+def open_text(path, mode='r', newline=None):
+    """
+    Opens a UTF-8 text file, through gzip if its name ends with ".gz".
+
+    Args:
+        path (str): The file path.
+        mode (str): 'r', 'w' or 'a'. Defaults to 'r'.
+        newline (str, optional): Passed to open; the csv module needs ''. Defaults to None.
+
+    Returns:
+        file object: The open text stream.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline=newline)
+    return open(path, mode, encoding='utf-8', newline=newline)
+
+# Function to write a text file now.
+def write_text_file(path, content, mode='w', spans=None):
+    """
+    Writes content to a text file (gzip-compressed if its name ends with ".gz"), creating
+    its directory if needed.
+
+    Args:
+        path (str): The file path.
+        content (str): The text to write.
+        mode (str): 'w' to replace the file or 'a' to append to it. Defaults to 'w'.
+        spans (list of tuple, optional): Sorted, non-overlapping (start, end) offsets of content that
+            are masked while writing (see write_masked). Defaults to None.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open_text(path, mode) as f:
+        if spans is None:
+            f.write(content)
+        else:
+            write_masked(f, content, spans)
+
+# Function run by the writer thread.
+def _write_queued(outputs, errors):
+    """
+    Writes queued (path, content, mode, spans) items until the stop item arrives, recording failures.
+
+    Any exception of a write is recorded, not only OSError (bad content raises TypeError or
+    UnicodeEncodeError), so the thread keeps draining the queue and producers never block on it.
+    """
+    while True:
+        item = outputs.get()
+        if item is _STOP:
+            return
+        path, content, mode, spans = item
+        start = time.perf_counter()
+        try:
+            write_text_file(path, content, mode, spans)
+        except Exception as error:
+            logging.error("Failed to write '%s': %s", path, error)
+            errors.append((path, f"{type(error).__name__}: {error}"))
+        OUTPUT_WRITER_STATS["busy"] += time.perf_counter() - start
+        OUTPUT_WRITER_STATS["outputs"] += 1
+
+# Function to start writing outputs on a background thread.
+def start_output_writer(queue_size=OUTPUT_QUEUE_SIZE):
+    """
+    Starts a writer thread; until stop_output_writer is called, write_output queues its
+    outputs for it instead of writing them on the calling thread, so redacting the next file
+    overlaps with writing the previous one.
+
+    Args:
+        queue_size (int): Maximum number of outputs waiting to be written. Defaults to OUTPUT_QUEUE_SIZE.
+    """
+    global _writer
+    if _writer is not None:
+        return
+    OUTPUT_WRITER_STATS.update(outputs=0, busy=0.0, blocked=0.0)
+    outputs, errors = queue.Queue(maxsize=queue_size), []
+    thread = threading.Thread(target=_write_queued, args=(outputs, errors), name="output-writer", daemon=True)
+    thread.start()
+    _writer = (outputs, thread, errors)
+
+# Function to write an output, on the writer thread if one is running.
+def write_output(path, content, mode='w', spans=None):
+    """
+    Writes (or with mode 'a', appends) content to path, through the writer thread if
+    start_output_writer was called, and directly otherwise. Outputs are written in the
+    order they are given.
+
+    Args:
+        path (str): The file path ("*.gz" is compressed).
+        content (str): The text to write.
+        mode (str): 'w' or 'a'. Defaults to 'w'.
+        spans (list of tuple, optional): Offsets of content masked while writing, so a redacted
+            output does not have to be built as a string first. Defaults to None.
+    """
+    if _writer is None:
+        write_text_file(path, content, mode, spans)
+    else:
+        start = time.perf_counter()
+        _writer[0].put((path, content, mode, spans))
+        OUTPUT_WRITER_STATS["blocked"] += time.perf_counter() - start
+
+# Function to wait for the queued outputs and stop the writer thread.
+def stop_output_writer():
+    """
+    Waits until every queued output is written and stops the writer thread.
+
+    Returns:
+        list of tuple: The (path, error) pairs of the outputs that could not be written.
+    """
+    global _writer
+    if _writer is None:
+        return []
+    outputs, thread, errors = _writer
+    outputs.put(_STOP)
+    thread.join()
+    _writer = None
+    return errors
+
+# Function to read the counters of the last writer thread.
+def get_output_writer_stats():
+    """
+    Returns a copy of OUTPUT_WRITER_STATS.
+    """
+    return dict(OUTPUT_WRITER_STATS)
@@ -1,11 +1,58 @@
 import re
+import time
 import logging
 
 # Set up logging for this module.
 logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Function to build the regex pattern strings for every entity type.
+def build_entity_patterns():
+    """
+    Builds the regular expression strings used to extract each entity type.
+    Returns:
+        dict: Entity types (e.g. "PERSON", "DATE") mapped to their regex pattern strings.
+    """
+    months_long = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
+    months_short = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)'
+    upper = r'[A-Z]'
+    lower = r'[a-z]'
+    name = upper + lower + r'+'
+
+    address_suffix = r'(?:St|Street|Ave|Avenue|Blvd|Boulevard|Rd|Road|Lane|Ln|Drive|Dr|Plaza|Way|Terrace|Court|Square|Loop|Parkway|Str)'
+    additional_info = r'(?:,?\s(?:\d+\s)?(?:[A-Za-z]+\s)?(?:Floor|Fl|Suite|Ste|Room|Apt|Unit|#)\s?\d+[A-Za-z]?)?'
+
+    # Aggregate patterns for different entities.
+    patterns = {
+        "PERSON": r'\b' + name + r'\s' + name + r'\b',
+        # The local part and domain are bounded by their RFC 5321 maximum lengths (64 and 255).
+        # Unbounded, a long dotted run without "@" costs time quadratic in its length.
+        "EMAIL": r'\b[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9.-]{1,255}\.[A-Z|a-z]{2,}\b',
+        "PHONE": r'(?<!\d)(?:\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}(?![\d.])',
+        "ADDRESS": (
+            # The street name is words separated by single whitespace characters. The older form
+            # (?:[A-Za-z]+\s?)+ matches the same strings, but it can split a word in
+            # exponentially many ways and backtracks catastrophically when no suffix follows.
+            r'\b\d+\s[A-Za-z]+(?:\s[A-Za-z]+)*\s?' + address_suffix + r'\b' + additional_info +
+            r'(?:,?\s(?:[A-Za-z]+\s)+,?\s?' + upper + r'{2}\s?\d{5}(?:-\d{4})?)?'
+        ),
+        "DATE": (
+            r'\b\d{1,2}(?:st|nd|rd|th)?\s' + months_long + r'\s\d{4}\b'
+            r'|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b'
+            r'|\b' + months_long + r'\s\d{1,2},\s\d{4}\b'
+            r'|\b' + months_long + r' \d{1,2}\b'
+            r'|\b(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun),\s\d{1,2}\s' + months_short + r'\s\d{4}\b'
+        )
+    }
+    return patterns
+
+# Pattern strings for every entity type, built once at import time.
+ENTITY_PATTERNS = build_entity_patterns()
+
+# Each pattern compiled once, at import time.
+COMPILED_ENTITY_PATTERNS = {key: re.compile(pattern) for key, pattern in ENTITY_PATTERNS.items()}
+
 # Function to extract entities from text using regex patterns.
-def extract_using_regex(text):
+def extract_using_regex(text, with_spans=False):
     """
     Extract entities from the given text using regular expressions.
     This function uses predefined regular expression patterns to identify and extract various types of entities 
@@ -16,8 +63,14 @@ def extract_using_regex(text):
     - ADDRESS: Street addresses with optional additional information like floor, suite, or apartment number.
     - DATE: Dates in multiple formats, including long-form dates (e.g., "March 14, 1879"), short-form dates 
       (e.g., "01/01/2020"), and day-month-year formats.
+    All patterns are compiled once at import time (see COMPILED_ENTITY_PATTERNS), and the text
+    is scanned once per entity type with finditer, so the offsets of each match are available.
+    Matches of one type never overlap each other, but may overlap matches of another type.
+    A single scan with all patterns combined was tried and was slower: every pattern had to
+    be tried twice at each candidate position to report overlapping matches of several types.
     Args:
         text (str): The input text from which entities are to be extracted.
+        with_spans (bool): If True, each entity is returned as a (text, start, end) tuple. Defaults to False.
     Returns:
         dict: A dictionary where the keys are entity types (e.g., "PERSON", "EMAIL") and the values are lists 
         of strings representing the extracted entities of that type.
@@ -35,36 +88,137 @@ def extract_using_regex(text):
     
     """
     logging.debug("Starting regex extraction of entities.")
-    
-    # Define regex patterns for various entity types.
-    months_long = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
-    months_short = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)'
-    upper = r'[A-Z]'
-    lower = r'[a-z]'
-    name = upper + lower + r'+'
-    
-    address_suffix = r'(?:St|Street|Ave|Avenue|Blvd|Boulevard|Rd|Road|Lane|Ln|Drive|Dr|Plaza|Way|Terrace|Court|Square|Loop|Parkway|Str)'
-    additional_info = r'(?:,?\s(?:\d+\s)?(?:[A-Za-z]+\s)?(?:Floor|Fl|Suite|Ste|Room|Apt|Unit|#)\s?\d+[A-Za-z]?)?'
 
-    # Aggregate patterns for different entities.
-    patterns = {
-        "PERSON": r'\b' + name + r'\s' + name + r'\b',
-        "EMAIL": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-        "PHONE": r'(?<!\d)(?:\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}(?![\d.])',
-        "ADDRESS": (
-            r'\b\d+\s(?:[A-Za-z]+\s?)+' + address_suffix + r'\b' + additional_info +
-            r'(?:,?\s(?:[A-Za-z]+\s)+,?\s?' + upper + r'{2}\s?\d{5}(?:-\d{4})?)?'
-        ),
-        "DATE": (
-            r'\b\d{1,2}(?:st|nd|rd|th)?\s' + months_long + r'\s\d{4}\b'
-            r'|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b'
-            r'|\b' + months_long + r'\s\d{1,2},\s\d{4}\b'
-            r'|\b' + months_long + r' \d{1,2}\b'
-            r'|\b(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun),\s\d{1,2}\s' + months_short + r'\s\d{4}\b'
-        )
-    }
+    if with_spans:
+        results = {key: [(match.group(), match.start(), match.end()) for match in pattern.finditer(text)]
+                   for key, pattern in COMPILED_ENTITY_PATTERNS.items()}
+    else:
+        results = {key: pattern.findall(text) for key, pattern in COMPILED_ENTITY_PATTERNS.items()}
+    logging.debug("Regex extraction results: %s", results)
+    return results
+
+# Function to extract entities by scanning the text once per entity type.
+def extract_using_regex_per_type(text):
+    """
+    Extracts the same entities as extract_using_regex, running one re.findall per entity type.
+
+    This is the reference behaviour extract_using_regex must reproduce, also with_spans; it is
+    kept for tests and benchmarks.
+    Args:
+        text (str): The input text from which entities are to be extracted.
+    Returns:
+        dict: Entity types mapped to the lists of matched strings.
+    """
+    return {key: pattern.findall(text) for key, pattern in COMPILED_ENTITY_PATTERNS.items()}
+
+# Limits used by extract_using_regex_hardened unless the caller passes its own.
+HARDENED_MAX_CHARS = 20_000_000
+HARDENED_TIME_LIMIT = 60.0
+HARDENED_BLOCK_CHARS = 8192
+
+# Number of documents on which the hardened extractor hit a limit, by limit kind.
+REGEX_LIMIT_COUNTERS = {"size_limit": 0, "time_limit": 0}
+
+# Function to split text into blocks for the hardened extractor.
+def iter_text_blocks(text, block_chars=HARDENED_BLOCK_CHARS):
+    """
+    Splits text into consecutive blocks of at most block_chars characters.
 
-    # Extract entities using the defined patterns.
-    results = {key: re.findall(pattern, text) for key, pattern in patterns.items()}
-    logging.debug(f"Regex extraction results: {results}")
+    Blocks end at a paragraph break ("\\n\\n") when there is one, otherwise at a line break,
+    so entities are rarely cut in two. A block without any line break is cut at block_chars.
+    Args:
+        text (str): The text to split.
+        block_chars (int): The maximum block size.
+    Yields:
+        tuple: The offset of the block in text and the block itself.
+    """
+    start = 0
+    while start < len(text):
+        end = min(start + block_chars, len(text))
+        if end < len(text):
+            cut = text.rfind('\n\n', start, end)
+            if cut <= start:
+                cut = text.rfind('\n', start, end)
+            if cut > start:
+                end = cut + 1
+        yield start, text[start:end]
+        start = end
+
+# Blank lines that separate paragraphs.
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n[ \t\r\f\v]*\n')
+
+# Function to split text into paragraphs of bounded size.
+def iter_paragraph_blocks(text, block_chars=HARDENED_BLOCK_CHARS):
+    """
+    Splits text at blank lines, and paragraphs longer than block_chars with iter_text_blocks.
+
+    Unlike iter_text_blocks, a block never holds more than one paragraph, so callers can
+    decide paragraph by paragraph which ones need further work.
+    Args:
+        text (str): The text to split.
+        block_chars (int): The maximum block size.
+    Yields:
+        tuple: The offset of the block in text and the block itself.
+    """
+    start = 0
+    for end in [match.start() for match in PARAGRAPH_BREAK_PATTERN.finditer(text)] + [len(text)]:
+        if end > start:
+            for block_start, block in iter_text_blocks(text[start:end], block_chars):
+                yield start + block_start, block
+        start = end
+
+# Function to extract entities with size and time limits.
+def extract_using_regex_hardened(text, max_chars=HARDENED_MAX_CHARS, time_limit=HARDENED_TIME_LIMIT,
+                                 block_chars=HARDENED_BLOCK_CHARS, with_spans=False):
+    """
+    Extracts the same entities as extract_using_regex with a bounded worst case.
+
+    The patterns run in linear time on the inputs known to be pathological (see
+    benchmarks/bench_pathological.py), but the text is still scanned in blocks (see
+    iter_text_blocks), so a run of text that is expensive for a pattern can only cost as much
+    as one block. Only the first max_chars characters are scanned. time_limit is checked
+    between blocks only: a block that has started is always scanned to its end, so a run can
+    exceed time_limit by the time of one block, and scanning stops at the first block boundary
+    after it has passed. Each limit that is hit is logged and counted in REGEX_LIMIT_COUNTERS.
+    Entities that cross a block boundary are not found.
+    Args:
+        text (str): The input text from which entities are to be extracted.
+        max_chars (int): Maximum number of characters scanned per document.
+        time_limit (float): Seconds after which no further block of a document is started.
+        block_chars (int): Size of the blocks scanned one at a time.
+        with_spans (bool): If True, each entity is returned as a (text, start, end) tuple. Defaults to False.
+    Returns:
+        dict: Entity types mapped to the lists of extracted entities, as in extract_using_regex.
+    """
+    results = {key: [] for key in ENTITY_PATTERNS}
+    if len(text) > max_chars:
+        REGEX_LIMIT_COUNTERS["size_limit"] += 1
+        logging.warning("Regex extraction limited to the first %s of %s characters.", max_chars, len(text))
+        text = text[:max_chars]
+
+    deadline = time.perf_counter() + time_limit
+    for offset, block in iter_text_blocks(text, block_chars):
+        if time.perf_counter() > deadline:
+            REGEX_LIMIT_COUNTERS["time_limit"] += 1
+            logging.warning("Regex extraction stopped after %ss at character %s of %s.", time_limit, offset, len(text))
+            break
+        block_results = extract_using_regex(block, with_spans=True)
+        for key, matches in block_results.items():
+            for entity, start, end in matches:
+                results[key].append((entity, offset + start, offset + end) if with_spans else entity)
     return results
+
+# Function to read and reset the limit counters.
+def get_regex_limit_counters(reset=False):
+    """
+    Returns a copy of REGEX_LIMIT_COUNTERS.
+    Args:
+        reset (bool): If True, the counters are set back to zero after being read.
+    Returns:
+        dict: The number of documents that hit each limit.
+    """
+    counters = dict(REGEX_LIMIT_COUNTERS)
+    if reset:
+        for key in REGEX_LIMIT_COUNTERS:
+            REGEX_LIMIT_COUNTERS[key] = 0
+    return counters
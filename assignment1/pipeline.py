@@ -0,0 +1,134 @@
+import time
+import queue
+import logging
+import threading
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Maximum number of files read ahead of the one being redacted. The reader waits when the
+# queue is full, so at most this many file contents are held in memory beyond the current one.
+READ_QUEUE_SIZE = 8
+
+# Queue item that tells the consumer the reader is done.
+_STOP = object()
+
+# Function to create the counters of a pipelined run.
+def new_pipeline_stats():
+    """
+    Returns zeroed counters for read_ahead: the number of "files" read, the seconds the reader
+    spent finding and reading files ("read_busy") and waiting for room in the queue
+    ("read_blocked"), and the seconds the consumer waited for the next file ("redact_wait").
+    """
+    return {"files": 0, "read_busy": 0.0, "read_blocked": 0.0, "redact_wait": 0.0}
+
+# Function to read files on a background thread ahead of their processing.
+def read_ahead(files, read_file=None, queue_size=READ_QUEUE_SIZE, stats=None):
+    """
+    Yields the files with their contents, read by a background thread that stays up to
+    queue_size files ahead, so reading (and finding) the next files overlaps with processing
+    the current one.
+
+    Files are yielded in the order given. If reading a file fails, the error is raised when
+    that file is reached, as if it had been read in place. Closing the generator early stops
+    the reader.
+
+    Args:
+        files (iterable of str): The file paths, consumed on the reader thread.
+        read_file (callable, optional): Reads a path and returns its content. If None, no file is
+            read and None is yielded as each content. Defaults to None.
+        queue_size (int): Maximum number of files read ahead. Defaults to READ_QUEUE_SIZE.
+        stats (dict, optional): Counters from new_pipeline_stats, updated as the files are read. Defaults to None.
+
+    Yields:
+        tuple: The file path, its content (or None) and the seconds spent reading it.
+    """
+    stats = stats if stats is not None else new_pipeline_stats()
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def read_files():
+        try:
+            paths = iter(files)
+            while not stop.is_set():
+                start = time.perf_counter()
+                path = next(paths, None)
+                if path is None:
+                    break
+                content, error = None, None
+                if read_file is not None:
+                    try:
+                        content = read_file(path)
+                    except Exception as read_error:
+                        error = read_error
+                seconds = time.perf_counter() - start
+                stats["read_busy"] += seconds
+                stats["files"] += 1
+                put_start = time.perf_counter()
+                items.put((path, content, seconds, error))
+                stats["read_blocked"] += time.perf_counter() - put_start
+        except Exception as error:
+            logging.error("Failed to list the input files: %s", error)
+            items.put((None, None, 0.0, error))
+        finally:
+            items.put(_STOP)
+
+    reader = threading.Thread(target=read_files, name="input-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            wait_start = time.perf_counter()
+            item = items.get()
+            stats["redact_wait"] += time.perf_counter() - wait_start
+            if item is _STOP:
+                return
+            path, content, seconds, error = item
+            if error is not None:
+                raise error
+            yield path, content, seconds
+    finally:
+        # Unblock a reader waiting for room in the queue, then wait for it to finish.
+        stop.set()
+        while reader.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                reader.join(0.01)
+
+# Function to summarise how busy each stage of a pipelined run was.
+def pipeline_utilization(wall_seconds, stats, writer_stats):
+    """
+    Computes the share of the run each stage spent working.
+
+    The reader and writer threads are busy while they read or write; the redaction stage (the
+    calling thread) is busy whenever it is neither waiting for the next file nor for room in
+    the writer's queue. The stage closest to 100% is the bottleneck.
+
+    Args:
+        wall_seconds (float): Duration of the run.
+        stats (dict): Counters filled by read_ahead.
+        writer_stats (dict): Counters of the output writer (see get_output_writer_stats).
+
+    Returns:
+        dict: The utilization of the "read", "redact" and "write" stages (0 to 1), the seconds
+        redaction waited for input and for the writer, the number of files and the "bottleneck".
+    """
+    wall_seconds = max(wall_seconds, 1e-9)
+    utilization = {
+        "read": min(stats["read_busy"] / wall_seconds, 1.0),
+        "redact": max(0.0, 1.0 - (stats["redact_wait"] + writer_stats["blocked"]) / wall_seconds),
+        "write": min(writer_stats["busy"] / wall_seconds, 1.0),
+    }
+    return {**utilization, "wall_seconds": wall_seconds, "files": stats["files"],
+            "redact_waited_for_input": stats["redact_wait"], "redact_waited_for_writer": writer_stats["blocked"],
+            "bottleneck": max(utilization, key=utilization.get)}
+
+# Function to format the utilization summary.
+def format_utilization(summary):
+    """
+    Returns the summary from pipeline_utilization as one line of text.
+    """
+    return (f"Pipeline over {summary['wall_seconds']:.2f}s and {summary['files']} files: "
+            f"read {summary['read']:.0%}, redact {summary['redact']:.0%}, write {summary['write']:.0%} busy; "
+            f"redaction waited {summary['redact_waited_for_input']:.2f}s for input and "
+            f"{summary['redact_waited_for_writer']:.2f}s for the writer; bottleneck: {summary['bottleneck']}")
@@ -0,0 +1,205 @@
+import re
+import logging
+from assignment1.pattern_matcher import ENTITY_PATTERNS, iter_paragraph_blocks
+from assignment1.gazetteer import find_places
+from assignment1.ner import NER_LABELS, extract_ner_entities_batch
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Maximum characters of a paragraph judged (and sent to NER) as one piece.
+PREFILTER_BLOCK_CHARS = 4096
+
+# A word of at least two letters starting with an uppercase letter. Lowercase boilerplate,
+# numeric tables and most code have none, and PERSON and GPE entities almost always do.
+CAPITALIZED_TOKEN_PATTERN = re.compile(r'\b[A-Z][A-Za-z]')
+
+# Two capitalized words in a row (the regex PERSON pattern) or a title followed by a capitalized word.
+REGEX_CANDIDATE_PATTERN = re.compile(ENTITY_PATTERNS["PERSON"] + r'|\b(?:Dear|Mr|Mrs|Ms|Dr|Prof)\.?\s+[A-Z]')
+
+# Function to check for a capitalized word.
+def has_capitalized_token(text):
+    """
+    Returns True if the text contains a word starting with an uppercase letter.
+    """
+    return CAPITALIZED_TOKEN_PATTERN.search(text) is not None
+
+# Function to check for a known place name.
+def has_place_name(text):
+    """
+    Returns True if the gazetteer finds a state, country or --places name in the text.
+    """
+    return bool(find_places(text))
+
+# Function to check for a regex name candidate.
+def has_regex_candidate(text):
+    """
+    Returns True if the text contains two capitalized words in a row or a title such as "Mr.".
+    """
+    return REGEX_CANDIDATE_PATTERN.search(text) is not None
+
+# Cheap checks that can send a paragraph to NER, by name, from cheapest to most expensive.
+PREFILTER_STAGES = {
+    "capitalized": has_capitalized_token,
+    "regex": has_regex_candidate,
+    "gazetteer": has_place_name,
+}
+
+# Stages used when --prefilter is given without names. It only skips text without any
+# capitalized word, so NER results are rarely affected.
+DEFAULT_PREFILTER_STAGES = ("capitalized",)
+
+# Counters of the cascade: paragraphs judged, paragraphs sent to NER, characters kept from NER,
+# how many paragraphs reached and were accepted by each stage, and the recall check results.
+PREFILTER_COUNTERS = {"paragraphs": 0, "ner_paragraphs": 0, "skipped_chars": 0,
+                      **{f"{stage}_{kind}": 0 for stage in PREFILTER_STAGES for kind in ("checked", "hits")},
+                      "recall_entities": 0, "recall_missed": 0}
+
+# Function to read and reset the cascade counters.
+def get_prefilter_counters(reset=False):
+    """
+    Returns a copy of PREFILTER_COUNTERS.
+
+    Args:
+        reset (bool): If True, the counters are set back to zero after being read.
+
+    Returns:
+        dict: The counter names mapped to their values.
+    """
+    counters = dict(PREFILTER_COUNTERS)
+    if reset:
+        for key in PREFILTER_COUNTERS:
+            PREFILTER_COUNTERS[key] = 0
+    return counters
+
+# Function to put the requested stages in cascade order.
+def ordered_stages(stages):
+    """
+    Returns the requested stage names in PREFILTER_STAGES order, so cheaper checks run first.
+
+    Args:
+        stages (iterable of str): Stage names; an empty iterable selects DEFAULT_PREFILTER_STAGES.
+
+    Returns:
+        list of str: The stage names to run.
+
+    Raises:
+        ValueError: If a name is not in PREFILTER_STAGES.
+    """
+    stages = set(stages) or set(DEFAULT_PREFILTER_STAGES)
+    unknown = stages.difference(PREFILTER_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown prefilter stage(s): {', '.join(sorted(unknown))}")
+    return [stage for stage in PREFILTER_STAGES if stage in stages]
+
+# Function to pick the parts of a text that need NER.
+def candidate_paragraphs(text, stages, block_chars=PREFILTER_BLOCK_CHARS):
+    """
+    Splits text into paragraphs and keeps those accepted by at least one stage.
+
+    The stages run in order and the first one that accepts a paragraph ends the cascade
+    for it. Every check and hit is counted in PREFILTER_COUNTERS.
+
+    Args:
+        text (str): The text to split.
+        stages (list of str): Stage names, as returned by ordered_stages.
+        block_chars (int): Paragraphs longer than this are judged in pieces. Defaults to PREFILTER_BLOCK_CHARS.
+
+    Returns:
+        list of str: The accepted paragraphs, in text order.
+    """
+    accepted = []
+    for _, paragraph in iter_paragraph_blocks(text, block_chars):
+        PREFILTER_COUNTERS["paragraphs"] += 1
+        for stage in stages:
+            PREFILTER_COUNTERS[f"{stage}_checked"] += 1
+            if PREFILTER_STAGES[stage](paragraph):
+                PREFILTER_COUNTERS[f"{stage}_hits"] += 1
+                accepted.append(paragraph)
+                break
+        else:
+            PREFILTER_COUNTERS["skipped_chars"] += len(paragraph)
+    PREFILTER_COUNTERS["ner_paragraphs"] += len(accepted)
+    return accepted
+
+# Function to count the NER entities the cascade lost.
+def check_recall(full_entities, filtered_entities):
+    """
+    Compares the entities of a full NER run with those of the prefiltered run of the same
+    text, counts them in PREFILTER_COUNTERS and logs the ones the cascade missed.
+
+    Args:
+        full_entities (dict): The PERSON and GPE entities found in the whole text.
+        filtered_entities (dict): The PERSON and GPE entities found in the accepted paragraphs.
+    """
+    for label in NER_LABELS:
+        expected = set(full_entities[label])
+        missed = expected.difference(filtered_entities[label])
+        PREFILTER_COUNTERS["recall_entities"] += len(expected)
+        PREFILTER_COUNTERS["recall_missed"] += len(missed)
+        if missed:
+            logging.warning("Prefilter missed %s %s entities found by full NER: %s", len(missed), label, sorted(missed))
+
+# Function to run NER over many texts through the prefilter cascade.
+def extract_ner_entities_prefiltered(texts, stages, nlp=None, batch_size=64, n_process=1, recall_check=False,
+                                     block_chars=PREFILTER_BLOCK_CHARS):
+    """
+    Runs NER only over the paragraphs of each text that the cascade accepts.
+
+    The accepted paragraphs of all texts are sent through extract_ner_entities_batch together,
+    and their entities are gathered back per text. In recall-check mode the whole texts are
+    also run through NER, the two results are compared (see check_recall), and the full
+    results are returned, so the output matches a run without the prefilter.
+
+    Args:
+        texts (iterable of str): The texts to process.
+        stages (iterable of str): Names of the PREFILTER_STAGES to run (empty for the defaults).
+        nlp (spacy.language.Language, optional): The pipeline to use. Defaults to the registry's model.
+        batch_size (int): Number of texts sent through the pipeline at once. Defaults to 64.
+        n_process (int): Number of processes spaCy uses for the batch. Defaults to 1.
+        recall_check (bool): Whether to compare with full NER. Defaults to False.
+        block_chars (int): Maximum size of a judged paragraph. Defaults to PREFILTER_BLOCK_CHARS.
+
+    Returns:
+        list of dict: For each input text, the PERSON and GPE entity texts found in it.
+    """
+    texts = list(texts)
+    stages = ordered_stages(stages)
+    paragraphs_per_text = [candidate_paragraphs(text, stages, block_chars) for text in texts]
+    paragraph_entities = iter(extract_ner_entities_batch([paragraph for paragraphs in paragraphs_per_text for paragraph in paragraphs],
+                                                         nlp=nlp, batch_size=batch_size, n_process=n_process))
+    results = []
+    for paragraphs in paragraphs_per_text:
+        entities = {label: [] for label in NER_LABELS}
+        for _ in paragraphs:
+            for label, found in next(paragraph_entities).items():
+                entities[label].extend(found)
+        results.append(entities)
+
+    if recall_check:
+        full_results = extract_ner_entities_batch(texts, nlp=nlp, batch_size=batch_size, n_process=n_process)
+        for full_entities, filtered_entities in zip(full_results, results):
+            check_recall(full_entities, filtered_entities)
+        return full_results
+    return results
+
+# Function to run NER as configured on the command line.
+def extract_ner_entities_for_args(texts, args, nlp=None, batch_size=64, n_process=1):
+    """
+    Runs NER over the texts, through the prefilter cascade when args.prefilter is set.
+
+    Args:
+        texts (iterable of str): The texts to process.
+        args (Namespace): Command-line arguments (prefilter and prefilter_recall_check).
+        nlp (spacy.language.Language, optional): The pipeline to use. Defaults to the registry's model.
+        batch_size (int): Number of texts sent through the pipeline at once. Defaults to 64.
+        n_process (int): Number of processes spaCy uses for the batch. Defaults to 1.
+
+    Returns:
+        list of dict: For each input text, the PERSON and GPE entity texts found in it.
+    """
+    stages = getattr(args, "prefilter", None)
+    if stages is None:
+        return extract_ner_entities_batch(texts, nlp=nlp, batch_size=batch_size, n_process=n_process)
+    return extract_ner_entities_prefiltered(texts, stages, nlp=nlp, batch_size=batch_size, n_process=n_process,
+                                            recall_check=getattr(args, "prefilter_recall_check", False))
@@ -0,0 +1,165 @@
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+from assignment1.metrics import PIPELINE_STAGES
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Milliseconds between two stack samples.
+PROFILE_INTERVAL_MS = 5
+
+# Number of documents listed in the slowest-documents report.
+PROFILE_TOP_DOCUMENTS = 10
+
+# The profile of this process while one runs: the cProfile profiler, the sampler thread, the
+# event that stops it and the number of samples taken of each collapsed stack.
+_profile = None
+
+# Function to describe a frame in a collapsed stack.
+def frame_label(frame):
+    """
+    Returns "function (file:line)" for a frame, with the line of the function's definition, so
+    every call of a function is merged into one node of the flame graph.
+    """
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+# Function to record a sample of a thread's stack.
+def sample_stack(frame, stacks):
+    """
+    Adds one sample of the stack ending at frame to stacks, keyed by its frames from the
+    outermost to the innermost joined with ";".
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    key = ";".join(reversed(labels))
+    stacks[key] = stacks.get(key, 0) + 1
+
+# Function to start profiling the calling thread.
+def start_profile(interval_ms=PROFILE_INTERVAL_MS):
+    """
+    Starts cProfile on the calling thread and a sampler thread that records the calling thread's
+    stack every interval_ms milliseconds, so both exact call counts and wall-clock stacks
+    (including time spent waiting) are available at the end.
+
+    Args:
+        interval_ms (float): Milliseconds between two samples. Defaults to PROFILE_INTERVAL_MS.
+    """
+    global _profile
+    if _profile is not None:
+        return
+    target = threading.get_ident()
+    stop, stacks = threading.Event(), {}
+
+    def sample():
+        while not stop.wait(interval_ms / 1000):
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                sample_stack(frame, stacks)
+
+    sampler = threading.Thread(target=sample, name="profile-sampler", daemon=True)
+    profiler = cProfile.Profile()
+    _profile = (profiler, sampler, stop, stacks)
+    sampler.start()
+    profiler.enable()
+
+# Function to stop profiling.
+def stop_profile():
+    """
+    Stops the profile started by start_profile.
+
+    Returns:
+        tuple: The cProfile profiler and the samples per collapsed stack, or None if no profile was running.
+    """
+    global _profile
+    if _profile is None:
+        return None
+    profiler, sampler, stop, stacks = _profile
+    profiler.disable()
+    stop.set()
+    sampler.join()
+    _profile = None
+    return profiler, stacks
+
+# Function to write stacks in the collapsed format.
+def write_collapsed_stacks(path, stacks):
+    """
+    Writes one "frame;frame;frame count" line per stack, the format read by flamegraph.pl,
+    speedscope and inferno.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+# Function to list the slowest documents of a run.
+def slowest_documents(records, top=PROFILE_TOP_DOCUMENTS):
+    """
+    Returns the top records with the longest total time, slowest first.
+
+    Args:
+        records (list of dict): Records returned by end_file_metrics.
+        top (int): Number of records to return. Defaults to PROFILE_TOP_DOCUMENTS.
+    """
+    return sorted(records, key=lambda record: record["total"], reverse=True)[:top]
+
+# Function to format the slowest-documents report.
+def format_slowest_documents(records, top=PROFILE_TOP_DOCUMENTS):
+    """
+    Renders the slowest documents as a table of their wall time and the seconds spent in each
+    stage, followed by the totals of the whole run.
+
+    Args:
+        records (list of dict): Records returned by end_file_metrics.
+        top (int): Number of documents listed. Defaults to PROFILE_TOP_DOCUMENTS.
+
+    Returns:
+        str: The report.
+    """
+    header = ["seconds"] + list(PIPELINE_STAGES) + ["file"]
+    rows = [[f"{record['total']:.4f}"] + [f"{record['stages'].get(stage, 0.0):.4f}" for stage in PIPELINE_STAGES] +
+            [record["file"]] for record in slowest_documents(records, top)]
+    totals = [f"{sum(record['total'] for record in records):.4f}"]
+    totals += [f"{sum(record['stages'].get(stage, 0.0) for record in records):.4f}" for stage in PIPELINE_STAGES]
+    rows.append(totals + [f"(all {len(records)} documents)"])
+    widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header) - 1)]
+    lines = [f"Slowest {min(top, len(records))} of {len(records)} documents"]
+    for row in [header] + rows:
+        lines.append("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) + "  " + row[-1])
+    return "\n".join(lines) + "\n"
+
+# Function to write every output of a profiled run.
+def write_profile(directory, profile, records, top=PROFILE_TOP_DOCUMENTS):
+    """
+    Writes the results of a profiled run to directory:
+
+    - profile.pstats: the cProfile statistics (for pstats, snakeviz or gprof2dot).
+    - profile.txt: the 30 functions with the highest cumulative time.
+    - profile.collapsed: the sampled stacks in the collapsed format (see write_collapsed_stacks).
+    - slowest.txt: the slowest documents with their stage breakdown (see format_slowest_documents).
+
+    Args:
+        directory (str): The output directory, created if needed.
+        profile (tuple): The profiler and stacks returned by stop_profile.
+        records (list of dict): Records returned by end_file_metrics.
+        top (int): Number of documents in slowest.txt. Defaults to PROFILE_TOP_DOCUMENTS.
+
+    Returns:
+        str: The slowest-documents report.
+    """
+    profiler, stacks = profile
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, "profile.pstats"))
+    with open(os.path.join(directory, "profile.txt"), 'w', encoding='utf-8') as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(30)
+    write_collapsed_stacks(os.path.join(directory, "profile.collapsed"), stacks)
+    report = format_slowest_documents(records, top)
+    with open(os.path.join(directory, "slowest.txt"), 'w', encoding='utf-8') as f:
+        f.write(report)
+    logging.info("Wrote the profile of %s documents and %s stack samples to '%s'.", len(records), sum(stacks.values()), directory)
+    return report
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import logging
+from collections import OrderedDict
+from assignment1.gazetteer import add_place_names, build_gazetteer, find_places, place_tokens
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Maximum number of entities the registry holds.
+REGISTRY_MAX_ENTITIES = 100_000
+
+# Share of the registry dropped when it is full. Evicting in bulk means the lookup index is
+# rebuilt once per eviction round instead of once per new entity.
+REGISTRY_EVICT_FRACTION = 0.1
+
+# Entity types that are shared between the documents of a run.
+REGISTRY_TYPES = ("PERSON", "ADDRESS")
+
+# Shortest entity the registry takes in. Shorter strings (initials, fragments) would be masked
+# wherever they occur as a word in every later document.
+REGISTRY_MIN_CHARS = 3
+
+# Shape of a registrable name: capitalized words of letters, apostrophes and hyphens, so email
+# local parts ("jdoe", "j.doe_2") and lowercase or numeric false positives are left out.
+REGISTRY_NAME_PATTERN = re.compile(r"[A-Z][A-Za-z'\-]*(?:\s+[A-Z][A-Za-z'\-]*)*")
+
+# The registry of this process while one is enabled: its entities in least recently used
+# order, its size limit, its store path, its lookup index and the entities added since the
+# last take_registry_updates call.
+_registry = None
+
+# Function to read an on-disk registry store.
+def load_registry_store(store_path):
+    """
+    Reads the entities of a registry store, a line at a time. Every entry is loaded into the
+    registry, so the store is read in full once rather than looked up in place.
+
+    The store has one "TYPE<TAB>count<TAB>JSON string" line per entity, least recently used
+    first. A missing file is treated as an empty store and unreadable lines are skipped.
+
+    Args:
+        store_path (str): The path of the store.
+
+    Returns:
+        list of tuple: (type, entity, count) in the order of the store.
+    """
+    entries = []
+    try:
+        with open(store_path, 'rb') as f:
+            for line in f:
+                try:
+                    entity_type, count, entity = line.decode('utf-8').rstrip('\n').split('\t', 2)
+                    entries.append((entity_type, json.loads(entity), int(count)))
+                except ValueError:
+                    logging.warning("Skipped an unreadable line of the entity registry '%s'.", store_path)
+    except FileNotFoundError:
+        logging.info("Starting a new entity registry at '%s'.", store_path)
+    return entries
+
+# Function to write the registry of this process to its store.
+def save_registry_store(store_path=None):
+    """
+    Writes the registry to a temporary file and moves it into place, so a reader never
+    sees a partly written store.
+
+    Args:
+        store_path (str, optional): The path to write. Defaults to the store the registry was enabled with.
+    """
+    store_path = store_path or (_registry and _registry["store_path"])
+    if not store_path:
+        return
+    temp_path = f"{store_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for (entity_type, entity), count in _registry["entities"].items():
+            f.write(f"{entity_type}\t{count}\t{json.dumps(entity)}\n")
+    os.replace(temp_path, store_path)
+    logging.info("Saved %s registry entities to '%s'.", len(_registry["entities"]), store_path)
+
+# Function to start a registry in this process.
+def enable_entity_registry(max_entities=REGISTRY_MAX_ENTITIES, store_path=None):
+    """
+    Starts an empty registry, or one filled from the store at store_path, holding at most
+    max_entities entities.
+
+    Args:
+        max_entities (int): The size limit. Defaults to REGISTRY_MAX_ENTITIES.
+        store_path (str, optional): The on-disk store read now and written by save_registry_store. Defaults to None.
+    """
+    global _registry
+    _registry = {"entities": OrderedDict(), "max_entities": max_entities, "store_path": store_path,
+                 "index": None, "updates": {entity_type: [] for entity_type in REGISTRY_TYPES}}
+    if store_path:
+        for entity_type, entity, count in load_registry_store(store_path):
+            if entity_type in REGISTRY_TYPES:
+                _registry["entities"][(entity_type, entity)] = count
+        evict_entities()
+        logging.info("Loaded %s registry entities from '%s'.", len(_registry["entities"]), store_path)
+
+# Function to stop the registry of this process.
+def disable_entity_registry():
+    """
+    Drops the registry of this process without saving it.
+    """
+    global _registry
+    _registry = None
+
+# Function to tell whether a registry is enabled.
+def registry_enabled():
+    """
+    Returns True if enable_entity_registry was called in this process.
+    """
+    return _registry is not None
+
+# Function to count the entities of the registry.
+def registry_size():
+    """
+    Returns the number of entities in the registry (0 when none is enabled).
+    """
+    return len(_registry["entities"]) if _registry is not None else 0
+
+# Function to drop the least recently used entities of a full registry.
+def evict_entities():
+    """
+    When the registry holds more than its limit, drops the least recently used entities
+    down to REGISTRY_EVICT_FRACTION below it, and marks the lookup index for rebuilding.
+
+    Returns:
+        int: The number of evicted entities.
+    """
+    entities, limit = _registry["entities"], _registry["max_entities"]
+    if len(entities) <= limit:
+        return 0
+    keep = int(limit * (1 - REGISTRY_EVICT_FRACTION))
+    evicted = len(entities) - keep
+    for _ in range(evicted):
+        entities.popitem(last=False)
+    _registry["index"] = None
+    logging.info("Evicted %s least recently used registry entities.", evicted)
+    return evicted
+
+# Function to return the lookup index of the registry, building it if needed.
+def registry_index():
+    """
+    Returns the token index of the registry's entities (see build_gazetteer) and a mapping
+    from each entity's normalized tokens to its types.
+    """
+    if _registry["index"] is None:
+        types = {}
+        for entity_type, entity in _registry["entities"]:
+            types.setdefault(place_tokens(entity), set()).add(entity_type)
+        _registry["index"] = (build_gazetteer(entity for _, entity in _registry["entities"]), types)
+    return _registry["index"]
+
+# Function to tell whether an entity may be shared with later documents.
+def is_registrable(entity_type, entity):
+    """
+    Returns True if the entity is long enough (REGISTRY_MIN_CHARS) to be masked across the
+    corpus, and, for a PERSON, shaped like a name (REGISTRY_NAME_PATTERN). Addresses must
+    contain a letter.
+    """
+    entity = entity.strip()
+    if len(entity) < REGISTRY_MIN_CHARS:
+        return False
+    if entity_type == "PERSON":
+        return REGISTRY_NAME_PATTERN.fullmatch(entity) is not None
+    return any(char.isalpha() for char in entity)
+
+# Function to add the entities of a document to the registry.
+def register_entities(entities):
+    """
+    Adds the PERSON and ADDRESS entities of a document to the registry, or marks them as
+    recently used if they are already in it, and evicts entities if it is full. Entities that
+    fail is_registrable are left out.
+
+    Args:
+        entities (dict): Entity types mapped to the entities found in a document.
+    """
+    if _registry is None:
+        return
+    registered, index = _registry["entities"], _registry["index"]
+    for entity_type in REGISTRY_TYPES:
+        for entity in entities.get(entity_type, ()):
+            key = (entity_type, entity)
+            if key in registered:
+                registered[key] += 1
+                registered.move_to_end(key)
+                continue
+            tokens = place_tokens(entity)
+            if not tokens or not is_registrable(entity_type, entity):
+                continue
+            registered[key] = 1
+            _registry["updates"][entity_type].append(entity)
+            if index is not None:
+                add_place_names(index[0], (entity,))
+                index[1].setdefault(tokens, set()).add(entity_type)
+    evict_entities()
+
+# Function to find the registered entities that occur in a text.
+def find_registered_entities(text):
+    """
+    Finds every registered entity that occurs in the text as whole tokens, in one pass over
+    its tokens (see find_places), and marks them as recently used.
+
+    Args:
+        text (str): The text to scan.
+
+    Returns:
+        dict: "PERSON" and "ADDRESS" mapped to the entities found, as they appear in the text
+        (empty lists when no registry is enabled).
+    """
+    found = {entity_type: [] for entity_type in REGISTRY_TYPES}
+    if not registry_size():
+        return found
+    index, types = registry_index()
+    for entity in set(find_places(text, index)):
+        for entity_type in types.get(place_tokens(entity), ()):
+            found[entity_type].append(entity)
+            key = (entity_type, entity)
+            if key in _registry["entities"]:
+                _registry["entities"].move_to_end(key)
+    return found
+
+# Function to collect the entities added since the last call.
+def take_registry_updates():
+    """
+    Returns the entities added to the registry since the last call and forgets them, so a
+    worker process can send its new entities to the parent's registry.
+
+    Returns:
+        dict: "PERSON" and "ADDRESS" mapped to the new entities.
+    """
+    if _registry is None:
+        return {entity_type: [] for entity_type in REGISTRY_TYPES}
+    updates = _registry["updates"]
+    _registry["updates"] = {entity_type: [] for entity_type in REGISTRY_TYPES}
+    return updates
+
+# Function to save and stop the registry at the end of a run.
+def close_entity_registry():
+    """
+    Writes the registry to its store, if it has one, and drops it.
+    """
+    if _registry is None:
+        return
+    save_registry_store()
+    logging.info("Entity registry closed with %s entities.", registry_size())
+    disable_entity_registry()
@@ -0,0 +1,306 @@
+import io
+import os
+import sys
+import json
+import time
+import stat
+import queue
+import ipaddress
+import logging
+import threading
+import socketserver
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Requests waiting for the batcher. When the queue is full, readers stop reading new requests
+# until there is room again, so producers are slowed down instead of memory growing.
+SERVICE_QUEUE_SIZE = 256
+
+# Maximum number of requests redacted (and sent through nlp.pipe) together.
+SERVICE_BATCH_SIZE = 32
+
+# Seconds the batcher waits for more requests after the first one of a batch arrives.
+SERVICE_MAX_WAIT = 0.005
+
+# Queue item that tells the batcher to finish the queued requests and stop.
+_STOP = object()
+
+# Function to tell whether a host name only listens on this machine.
+def is_loopback_host(host):
+    """
+    Returns True for "localhost" and loopback addresses such as 127.0.0.1 and ::1 (also in
+    brackets, as in "[::1]:8000").
+    """
+    host = host.strip("[]")
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# Function to parse the --serve address.
+def parse_service_address(address, allow_remote=False):
+    """
+    Tells which transport a --serve address selects.
+
+    The service has no authentication, so a TCP address must be a loopback host unless
+    allow_remote is set (--service-allow-remote).
+
+    Args:
+        address (str): "stdin" (or "-"), "HOST:PORT" for a local TCP socket, or the path of a Unix socket.
+        allow_remote (bool): Whether a TCP host other than a loopback one is accepted. Defaults to False.
+
+    Returns:
+        tuple: ("stdin", None), ("tcp", (host, port)) or ("unix", path).
+
+    Raises:
+        ValueError: If the address is a TCP address on a non-loopback host and allow_remote is False.
+    """
+    if address in ("stdin", "-"):
+        return "stdin", None
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        if not allow_remote and not is_loopback_host(host):
+            raise ValueError(f"The service would accept connections from other machines on '{host}'; "
+                             "use a loopback host such as 127.0.0.1, or pass --service-allow-remote.")
+        return "tcp", (host.strip("[]"), int(port))
+    return "unix", address
+
+# Function to tell whether a path is a Unix socket that can be replaced.
+def is_socket_path(path):
+    """
+    Returns True if path is an existing Unix socket (e.g. left behind by an earlier service)
+    and False if nothing exists there.
+
+    Raises:
+        ValueError: If something other than a socket exists at path, so --serve never deletes a
+            regular file or directory given by mistake.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return False
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"'{path}' exists and is not a Unix socket; --serve takes 'stdin', HOST:PORT or a socket path.")
+    return True
+
+# Server classes of the service. Their connection threads are daemon threads, so an interrupted
+# service does not wait for idle clients; subclasses keep the socketserver classes themselves unchanged.
+class ServiceUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class ServiceTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+# Function to wait for the next batch of requests.
+def collect_batch(requests, batch_size=SERVICE_BATCH_SIZE, max_wait=SERVICE_MAX_WAIT):
+    """
+    Blocks until a request arrives, then keeps collecting requests until batch_size of them
+    are gathered or max_wait seconds have passed.
+
+    Args:
+        requests (queue.Queue): The queue of (request, reply) items.
+        batch_size (int): The maximum batch size.
+        max_wait (float): Seconds to wait for more requests after the first.
+
+    Returns:
+        tuple: The list of (request, reply) items, and True if the stop item was reached.
+    """
+    item = requests.get()
+    if item is _STOP:
+        return [], True
+    batch = [item]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < batch_size:
+        remaining = deadline - time.monotonic()
+        try:
+            item = requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait()
+        except queue.Empty:
+            break
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+# Function to answer the requests of one batch.
+def answer_batch(batch, handle_batch):
+    """
+    Runs handle_batch over the requests of a batch and passes each response to its reply
+    function. If the handler fails, every request of the batch is answered with the error.
+
+    Args:
+        batch (list of tuple): (request, reply) items.
+        handle_batch (callable): Takes the list of request dictionaries and returns one response dictionary per request.
+    """
+    batch_requests = [request for request, _ in batch]
+    try:
+        responses = handle_batch(batch_requests)
+    except Exception as error:
+        logging.error("Failed to redact a batch of %s requests: %s", len(batch), error)
+        responses = [{"id": request.get("id"), "error": f"{type(error).__name__}: {error}"} for request in batch_requests]
+    for (_, reply), response in zip(batch, responses):
+        reply(response)
+
+# Function to run the batcher until it is told to stop.
+def run_batcher(requests, handle_batch, batch_size=SERVICE_BATCH_SIZE, max_wait=SERVICE_MAX_WAIT):
+    """
+    Takes batches from the request queue and answers them, one batch at a time, until
+    the stop item is reached. Requests queued before the stop item are still answered.
+
+    Args:
+        requests (queue.Queue): The queue of (request, reply) items.
+        handle_batch (callable): See answer_batch.
+        batch_size (int): The maximum batch size.
+        max_wait (float): Seconds to wait for more requests after the first of a batch.
+    """
+    stopping = False
+    while not stopping:
+        batch, stopping = collect_batch(requests, batch_size, max_wait)
+        if batch:
+            logging.debug("Redacting a batch of %s requests (%s queued).", len(batch), requests.qsize())
+            answer_batch(batch, handle_batch)
+
+# Function to queue the requests read from a stream of JSON lines.
+def enqueue_lines(lines, requests, write_response):
+    """
+    Parses each line as a JSON request and queues it with a reply function that writes the
+    response. Blocks while the queue is full. Lines that are not JSON objects are answered
+    with an error right away.
+
+    Args:
+        lines (iterable of str): The request lines.
+        requests (queue.Queue): The queue of (request, reply) items.
+        write_response (callable): Writes one response dictionary.
+
+    Returns:
+        list of threading.Event: One event per queued request, set once it is answered.
+    """
+    answered = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as error:
+            write_response({"id": None, "error": f"Invalid request: {error}"})
+            continue
+        done = threading.Event()
+        def reply(response, done=done):
+            write_response(response)
+            done.set()
+        requests.put((request, reply))
+        answered.append(done)
+    return answered
+
+# Function to build a reply writer for a text stream.
+def response_writer(stream):
+    """
+    Returns a function that writes a response dictionary to the stream as one JSON line.
+    Writes are serialized with a lock, and a closed stream is logged instead of raising.
+    """
+    lock = threading.Lock()
+    def write_response(response):
+        with lock:
+            try:
+                stream.write(json.dumps(response) + "\n")
+                stream.flush()
+            except (OSError, ValueError) as error:
+                logging.warning("Could not send response %s: %s", response.get("id"), error)
+    return write_response
+
+# Function to start the batcher thread.
+def start_batcher(handle_batch, batch_size=SERVICE_BATCH_SIZE, max_wait=SERVICE_MAX_WAIT, queue_size=SERVICE_QUEUE_SIZE):
+    """
+    Creates the bounded request queue and starts the batcher on a daemon thread.
+
+    Returns:
+        tuple: The request queue and the batcher thread.
+    """
+    requests = queue.Queue(maxsize=queue_size)
+    batcher = threading.Thread(target=run_batcher, args=(requests, handle_batch, batch_size, max_wait),
+                               name="redaction-batcher", daemon=True)
+    batcher.start()
+    return requests, batcher
+
+# Function to serve requests read from stdin.
+def serve_stdin(handle_batch, batch_size=SERVICE_BATCH_SIZE, max_wait=SERVICE_MAX_WAIT, queue_size=SERVICE_QUEUE_SIZE,
+                stdin=None, stdout=None):
+    """
+    Reads JSON requests from stdin, one per line, and writes one JSON response per line to
+    stdout, until stdin is closed.
+
+    Args:
+        handle_batch (callable): See answer_batch.
+        batch_size (int): The maximum batch size.
+        max_wait (float): Seconds to wait for more requests after the first of a batch.
+        queue_size (int): The maximum number of queued requests.
+        stdin (file, optional): The request stream. Defaults to sys.stdin.
+        stdout (file, optional): The response stream. Defaults to sys.stdout.
+    """
+    requests, batcher = start_batcher(handle_batch, batch_size, max_wait, queue_size)
+    enqueue_lines(stdin or sys.stdin, requests, response_writer(stdout or sys.stdout))
+    requests.put(_STOP)
+    batcher.join()
+
+# Function to build the handler class of socket connections.
+def connection_handler(requests):
+    """
+    Returns a socketserver handler that queues the JSON lines of a connection and writes the
+    responses back on it. The connection stays open until all of its requests are answered.
+    """
+    class ConnectionHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = io.TextIOWrapper(self.rfile, encoding='utf-8')
+            write_response = response_writer(io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True))
+            for done in enqueue_lines(lines, requests, write_response):
+                done.wait()
+    return ConnectionHandler
+
+# Function to serve requests over a local socket.
+def serve_socket(address, handle_batch, batch_size=SERVICE_BATCH_SIZE, max_wait=SERVICE_MAX_WAIT,
+                 queue_size=SERVICE_QUEUE_SIZE, ready=None, allow_remote=False):
+    """
+    Accepts connections on a Unix socket path or a local TCP address and serves JSON lines
+    on each of them, until interrupted. Requests from all connections share one queue, so
+    concurrent clients are batched together.
+
+    Args:
+        address (str): The socket address (see parse_service_address).
+        handle_batch (callable): See answer_batch.
+        batch_size (int): The maximum batch size.
+        max_wait (float): Seconds to wait for more requests after the first of a batch.
+        queue_size (int): The maximum number of queued requests.
+        ready (callable, optional): Called with the server once it accepts connections; calling
+            its shutdown method from another thread stops the service.
+        allow_remote (bool): Whether a non-loopback TCP host is accepted (see parse_service_address). Defaults to False.
+
+    Raises:
+        ValueError: If the address is rejected by parse_service_address, or names an existing
+            path that is not a Unix socket (see is_socket_path).
+    """
+    transport, target = parse_service_address(address, allow_remote)
+    if transport == "unix":
+        if is_socket_path(target):
+            os.unlink(target)
+        server_class = ServiceUnixServer
+    else:
+        server_class = ServiceTCPServer
+    requests, batcher = start_batcher(handle_batch, batch_size, max_wait, queue_size)
+    with server_class(target, connection_handler(requests)) as server:
+        logging.info("Redaction service listening on %s.", address)
+        sys.stderr.write(f"Redaction service listening on {address}\n")
+        if ready is not None:
+            ready(server)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Redaction service interrupted.")
+        finally:
+            requests.put(_STOP)
+            batcher.join()
+            if transport == "unix" and is_socket_path(target):
+                os.unlink(target)
@@ -0,0 +1,94 @@
+import logging
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Characters per shard. It stays below spaCy's default nlp.max_length (1,000,000), so every
+# shard can go through NER on its own.
+SHARD_CHARS = 500_000
+
+# Characters of the following text each shard also scans, so regex, title and gazetteer
+# matches that start in a shard but end in the next one are still found whole.
+SHARD_OVERLAP_CHARS = 2_000
+
+# Function to plan the shards of a document.
+def plan_shards(lines, shard_chars=SHARD_CHARS, overlap_chars=SHARD_OVERLAP_CHARS):
+    """
+    Splits a document, given as its lines, into consecutive shards of about shard_chars.
+
+    A shard ends after an empty line (a paragraph break) whenever there is one within
+    shard_chars, otherwise after the last line that fits, and never inside a line. The
+    context of a shard is the text after it, up to the first empty line past overlap_chars
+    (or overlap_chars when there is none), which it scans but does not own.
+
+    Args:
+        lines (list of str): The lines of the document, without line breaks.
+        shard_chars (int): The target shard size. Defaults to SHARD_CHARS.
+        overlap_chars (int): The minimum context size. Defaults to SHARD_OVERLAP_CHARS.
+
+    Returns:
+        list of tuple: (first line, end line, context end line) of each shard, as indexes into lines.
+    """
+    boundaries = []
+    start = 0
+    while start < len(lines):
+        size, end, last_break = 0, start, None
+        while end < len(lines) and (end == start or size + len(lines[end]) + 1 <= shard_chars):
+            size += len(lines[end]) + 1
+            end += 1
+            if not lines[end - 1]:
+                last_break = end
+        if end < len(lines) and last_break is not None and last_break > start:
+            end = last_break
+        boundaries.append(end)
+        start = end
+
+    shards, start = [], 0
+    for end in boundaries:
+        context_end, size = end, 0
+        while context_end < len(lines) and size < overlap_chars:
+            size += len(lines[context_end]) + 1
+            context_end += 1
+        while context_end < len(lines) and lines[context_end - 1] and size < 2 * overlap_chars:
+            size += len(lines[context_end]) + 1
+            context_end += 1
+        shards.append((start, end, context_end))
+        start = end
+    logging.debug("Planned %s shards over %s lines.", len(shards), len(lines))
+    return shards
+
+# Function to merge the matches of one regex type found in several shards.
+def merge_scan_matches(matches):
+    """
+    Merges (text, start, end) matches found in several shards like one scan over the whole
+    document would: in order of their start, leaving out a match that starts before the
+    end of the previous one.
+
+    Args:
+        matches (iterable of tuple): (text, start, end) matches with document offsets.
+
+    Returns:
+        list of str: The texts of the kept matches, in document order.
+    """
+    kept, last_end = [], 0
+    for text, start, end in sorted(matches, key=lambda match: (match[1], match[2])):
+        if start >= last_end:
+            kept.append(text)
+            last_end = end
+    return kept
+
+# Function to keep the matches that start in a shard's own text.
+def owned_matches(matches, own_chars, offset):
+    """
+    Keeps the (text, start, end) matches that start in the first own_chars characters and
+    shifts them to document offsets.
+
+    Args:
+        matches (iterable of tuple): (text, start, end) matches with shard offsets.
+        own_chars (int): Length of the shard's own text (its context follows it).
+        offset (int): Document offset of the shard.
+
+    Returns:
+        list of tuple: The owned matches with document offsets.
+    """
+    return [(text, start + offset, end + offset) for text, start, end in matches if start < own_chars]
@@ -0,0 +1,111 @@
+import json
+import logging
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Fields of one span record, in the order they are written.
+SPAN_FIELDS = ("start", "end", "type", "detector")
+
+# Suffix of the span index written next to each ".censored" output.
+SPAN_INDEX_SUFFIX = ".spans.jsonl"
+
+# Function to turn line-relative span records into document offsets.
+def line_spans_to_document(records, line_offsets):
+    """
+    Converts (line_index, start, end, type, detector) records into span dictionaries
+    with document offsets.
+
+    Args:
+        records (list of tuple): Records collected by redact_lines.
+        line_offsets (list of int): The document offset of the first character of each line.
+
+    Returns:
+        list of dict: The spans, sorted by start and end offsets.
+    """
+    spans = [{"start": line_offsets[line_index] + start, "end": line_offsets[line_index] + end,
+              "type": entity_type, "detector": detector}
+             for line_index, start, end, entity_type, detector in records]
+    spans.sort(key=lambda span: (span["start"], span["end"], span["type"], span["detector"]))
+    return spans
+
+# Function to compute the document offset of each line.
+def joined_line_offsets(lines, start=0):
+    """
+    Returns the offset of each line in "\\n".join(lines), shifted by start.
+
+    Args:
+        lines (list of str): The lines of the document.
+        start (int): The offset of the first line. Defaults to 0.
+
+    Returns:
+        list of int: The offset of every line.
+    """
+    offsets = []
+    for line in lines:
+        offsets.append(start)
+        start += len(line) + 1
+    return offsets
+
+# Function to write span records to a JSONL stream.
+def write_spans(f, spans):
+    """
+    Writes each span as one JSON object per line.
+
+    Args:
+        f (file object): The text stream to write to.
+        spans (iterable of dict): Spans with the SPAN_FIELDS keys.
+    """
+    for span in spans:
+        f.write(json.dumps({field: span[field] for field in SPAN_FIELDS}) + "\n")
+
+# Function to write a span index file.
+def write_span_index(path, spans):
+    """
+    Writes a span index: one {"start", "end", "type", "detector"} object per line.
+
+    The offsets refer to the redacted document (the ".censored" text), which has the same
+    length as the input with its line breaks normalized to "\\n". The index never contains
+    the masked text itself.
+
+    Args:
+        path (str): The file to write.
+        spans (iterable of dict): Spans with the SPAN_FIELDS keys.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        write_spans(f, spans)
+    logging.debug("Wrote span index '%s'.", path)
+
+# Function to read a span index file.
+def read_span_index(path):
+    """
+    Reads a span index written by write_span_index.
+
+    Args:
+        path (str): The span index file.
+
+    Returns:
+        list of dict: The spans, in file order.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Function to merge spans into sorted, non-overlapping offsets.
+def merge_spans(spans):
+    """
+    Merges overlapping or touching spans.
+
+    Args:
+        spans (iterable of dict or tuple): Spans with "start" and "end" keys, or (start, end) pairs.
+
+    Returns:
+        list of tuple: Sorted, non-overlapping (start, end) offsets.
+    """
+    offsets = sorted((span["start"], span["end"]) if isinstance(span, dict) else tuple(span[:2]) for span in spans)
+    merged = []
+    for start, end in offsets:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,264 @@
+import os
+import re
+import csv
+import json
+import bisect
+import logging
+import itertools
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Number of rows whose cells are detected together. Each column of a batch is scanned as one
+# text, and the free-text fields of a batch go through spaCy in one nlp.pipe call.
+STRUCTURED_BATCH_ROWS = 1000
+
+# Input formats of --structured. "text" redacts files as free text and "auto" picks the format
+# from each file's extension.
+STRUCTURED_FORMATS = ("text", "csv", "jsonl", "auto")
+
+# Extensions recognized by --structured auto.
+STRUCTURED_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Text placed between the cells of a column when they are scanned together. Detectors treat it
+# as a paragraph break, and spans that cross it are dropped.
+CELL_SEPARATOR = "\n\n"
+
+# Function to decide how a file is redacted.
+def structured_format(file_path, requested="text"):
+    """
+    Returns the format a file is redacted as: "csv", "jsonl" or "text".
+
+    Args:
+        file_path (str): The input file (a ".gz" suffix is ignored).
+        requested (str): The --structured option. Defaults to "text".
+    """
+    if requested != "auto":
+        return requested or "text"
+    stem = file_path[:-3] if file_path.endswith(".gz") else file_path
+    return STRUCTURED_EXTENSIONS.get(os.path.splitext(stem)[1].lower(), "text")
+
+# Function to read the records of a structured file.
+def read_structured_rows(f, structured):
+    """
+    Reads the header and rows of an open CSV or JSONL file lazily.
+
+    CSV files must start with a header row, which is returned as the field names; each row is a
+    list of strings. JSONL rows are the objects of the non-empty lines, and have no separate header.
+
+    Args:
+        f (file object): The text stream, opened with newline='' for CSV.
+        structured (str): "csv" or "jsonl".
+
+    Returns:
+        tuple: The field names (None for JSONL) and an iterator over the rows.
+
+    Raises:
+        ValueError: If a JSONL line is not a JSON object (raised when that row is reached).
+    """
+    if structured == "csv":
+        reader = csv.reader(f)
+        return next(reader, None), reader
+
+    def iter_objects():
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"line {line_number} is not valid JSON: {error}") from error
+            if not isinstance(row, dict):
+                raise ValueError(f"line {line_number} is not a JSON object")
+            yield row
+    return None, iter_objects()
+
+# Function to write the records of a structured file.
+def structured_row_writer(f, structured, fields):
+    """
+    Writes the header of a CSV output and returns a function that writes one row.
+
+    Args:
+        f (file object): The output text stream, opened with newline='' for CSV.
+        structured (str): "csv" or "jsonl".
+        fields (list of str or None): The CSV header, written unchanged.
+
+    Returns:
+        callable: Writes a row (a list for CSV, a dict for JSONL) in the input's field order.
+    """
+    if structured == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        if fields is not None:
+            writer.writerow(fields)
+        return writer.writerow
+    return lambda row: f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+# Function to cut rows into batches.
+def iter_row_batches(rows, batch_rows=STRUCTURED_BATCH_ROWS):
+    """
+    Yields lists of up to batch_rows rows, taken from the iterator as they are needed.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_rows))
+        if not batch:
+            return
+        yield batch
+
+# Function to name the path of a nested JSON value.
+def path_name(path):
+    """
+    Returns the name of a path of object keys and list indices, e.g. "contact.name" for
+    ("contact", "name") and "tags[0]" for ("tags", 0).
+    """
+    name = ""
+    for step in path:
+        if isinstance(step, int):
+            name += f"[{step}]"
+        else:
+            name += f".{step}" if name else str(step)
+    return name
+
+# Function to list the string leaves of a JSON value.
+def iter_string_leaves(value):
+    """
+    Yields the path and value of every string inside a JSON object, at any depth of nested
+    objects and lists, in document order.
+    """
+    stack = [((), value)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, str):
+            yield path, value
+        elif isinstance(value, dict):
+            stack.extend(((*path, key), child) for key, child in reversed(list(value.items())))
+        elif isinstance(value, list):
+            stack.extend(((*path, index), child) for index, child in reversed(list(enumerate(value))))
+
+# Function to tell whether a field is one of the free-text fields.
+def is_text_field(field, text_fields):
+    """
+    Returns True if the field name, or the name with its list indices left out, is in
+    text_fields, so "notes" covers every "notes[i]" and "contacts.name" every "contacts[i].name".
+    """
+    if field is None:
+        return False
+    return field in text_fields or re.sub(r"\[\d+\]", "", field) in text_fields
+
+# Function to list the columns of a batch.
+def column_keys(batch, fields, structured):
+    """
+    Returns the columns of a batch as (key, field name) pairs, where the key indexes a row (see
+    get_cell): the column position for CSV (covering rows longer than the header), and for JSONL
+    the path of every string in the rows, in nested objects and lists too (named as by path_name),
+    in order of appearance.
+    """
+    if structured == "csv":
+        fields = fields or []
+        width = max(len(row) for row in batch)
+        return [(key, fields[key] if key < len(fields) else None) for key in range(width)]
+    keys = {}
+    for row in batch:
+        for path, _ in iter_string_leaves(row):
+            if path not in keys:
+                keys[path] = path_name(path)
+    return list(keys.items())
+
+# Function to read one cell of a row.
+def get_cell(row, key):
+    """
+    Returns the cell of a row at a key from column_keys, or None if the row has no such cell.
+    """
+    if not isinstance(row, dict):
+        return row[key] if key < len(row) else None
+    value = row
+    for step in key:
+        if isinstance(step, int) and isinstance(value, list) and step < len(value):
+            value = value[step]
+        elif not isinstance(step, int) and isinstance(value, dict) and step in value:
+            value = value[step]
+        else:
+            return None
+    return value
+
+# Function to replace one cell of a row.
+def set_cell(row, key, value):
+    """
+    Replaces the cell of a row at a key from column_keys (which get_cell found).
+    """
+    if not isinstance(row, dict):
+        row[key] = value
+        return
+    for step in key[:-1]:
+        row = row[step]
+    row[key[-1]] = value
+
+# Function to collect the string cells of one column.
+def column_cells(batch, key):
+    """
+    Returns the positions in the batch of the rows whose cell in this column is a non-empty
+    string, and those cells. Numbers, booleans, nulls and missing cells are left out.
+    """
+    positions, cells = [], []
+    for position, row in enumerate(batch):
+        value = get_cell(row, key)
+        if isinstance(value, str) and value:
+            positions.append(position)
+            cells.append(value)
+    return positions, cells
+
+# Function to join the cells of a column into one text.
+def join_cells(cells):
+    """
+    Joins cells with CELL_SEPARATOR.
+
+    Returns:
+        tuple: The joined text and the offset of each cell in it.
+    """
+    offsets, position = [], 0
+    for cell in cells:
+        offsets.append(position)
+        position += len(cell) + len(CELL_SEPARATOR)
+    return CELL_SEPARATOR.join(cells), offsets
+
+# Function to give spans of a joined column back to its cells.
+def split_cell_spans(spans, offsets, cells):
+    """
+    Sorts spans found in the text returned by join_cells by the cell they fall in.
+
+    Args:
+        spans (iterable of tuple): (start, end, value) in the joined text; value is passed through.
+        offsets (list of int): The cell offsets returned by join_cells.
+        cells (list of str): The cells.
+
+    Returns:
+        list of list: For each cell, its (start, end, value) spans with offsets in the cell. Spans
+        that run past the end of their cell are dropped.
+    """
+    by_cell = [[] for _ in cells]
+    for start, end, value in spans:
+        index = bisect.bisect_right(offsets, start) - 1
+        cell_start = offsets[index]
+        if end - cell_start <= len(cells[index]):
+            by_cell[index].append((start - cell_start, end - cell_start, value))
+    return by_cell
+
+# Function to keep the line breaks of a cell out of its masked spans.
+def split_at_line_breaks(cell, spans):
+    """
+    Cuts sorted (start, end) spans around the line breaks of a multi-line cell, so masking keeps
+    the cell's lines as they were, as the line-based redaction of free text does.
+    """
+    if "\n" not in cell:
+        return spans
+    parts = []
+    for start, end in spans:
+        line_break = cell.find("\n", start, end)
+        while line_break >= 0:
+            if line_break > start:
+                parts.append((start, line_break))
+            start = line_break + 1
+            line_break = cell.find("\n", start, end)
+        if end > start:
+            parts.append((start, end))
+    return parts
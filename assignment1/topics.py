@@ -0,0 +1,116 @@
+import os
+import json
+import logging
+from functools import lru_cache
+from assignment1.helper import get_related_words
+from assignment1.models import get_wordnet
+
+# Set up logging for this module.
+logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# WordNet version that cached expansions are looked up under. NLTK ships WordNet 3.0; set the
+# REDACTOR_WORDNET_VERSION environment variable when another version is installed.
+WORDNET_VERSION = os.environ.get('REDACTOR_WORDNET_VERSION', '3.0')
+
+# Number of concepts whose expansion is kept in memory.
+CONCEPT_CACHE_SIZE = 1024
+
+# On-disk expansion stores read in this process, keyed by path.
+_concept_stores = {}
+
+# Function to read an on-disk expansion store.
+def load_concept_store(cache_path):
+    """
+    Loads the on-disk expansion store once per process.
+
+    The store is a JSON object mapping a WordNet version to an object that maps each
+    concept to its sorted list of related words. A missing or unreadable file is treated
+    as an empty store.
+
+    Args:
+        cache_path (str): The path of the store.
+
+    Returns:
+        dict: The store contents.
+    """
+    if cache_path not in _concept_stores:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                _concept_stores[cache_path] = json.load(f)
+        except (OSError, ValueError) as error:
+            logging.info("Starting a new concept cache at '%s' (%s).", cache_path, error)
+            _concept_stores[cache_path] = {}
+    return _concept_stores[cache_path]
+
+# Function to write an on-disk expansion store.
+def save_concept_store(cache_path, store):
+    """
+    Writes the expansion store to a temporary file and moves it into place, so a reader
+    never sees a partly written file.
+
+    Args:
+        cache_path (str): The path of the store.
+        store (dict): The store contents.
+    """
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(store, f, indent=1, sort_keys=True)
+    os.replace(temp_path, cache_path)
+
+# Function to expand one concept, memoized in memory and optionally on disk.
+@lru_cache(maxsize=CONCEPT_CACHE_SIZE)
+def expand_concept(concept, cache_path=None):
+    """
+    Returns the words related to a concept, querying WordNet at most once per process.
+
+    Results are kept in an in-process LRU cache. When cache_path is given, the on-disk
+    store is checked first under WORDNET_VERSION, so a warm store needs neither NLTK nor
+    WordNet. Expansions computed from WordNet are added to the store under the version
+    reported by the loaded corpus.
+
+    Args:
+        concept (str): The concept given with --concept.
+        cache_path (str, optional): The path of the on-disk store. Defaults to None.
+
+    Returns:
+        tuple of str: The sorted related words.
+    """
+    store = load_concept_store(cache_path) if cache_path else None
+    if store is not None and concept in store.get(WORDNET_VERSION, {}):
+        logging.debug("Concept '%s' expanded from the cache at '%s'.", concept, cache_path)
+        return tuple(store[WORDNET_VERSION][concept])
+
+    related_words = tuple(sorted(get_related_words(concept)))
+    if store is not None:
+        version = get_wordnet().get_version()
+        if version != WORDNET_VERSION:
+            logging.warning("Installed WordNet is version %s but cached expansions are read for %s; "
+                            "set REDACTOR_WORDNET_VERSION to reuse them.", version, WORDNET_VERSION)
+        store.setdefault(version, {})[concept] = list(related_words)
+        save_concept_store(cache_path, store)
+    return related_words
+
+# Function to expand several concepts into one list of related words.
+def expand_concepts(concepts, cache_path=None):
+    """
+    Expands every concept and joins the related words, in concept order.
+
+    Args:
+        concepts (iterable of str): The concepts given with --concept.
+        cache_path (str, optional): The path of the on-disk store. Defaults to None.
+
+    Returns:
+        list of str: The related words of all concepts.
+    """
+    related_words = []
+    for concept in concepts:
+        related_words.extend(expand_concept(concept, cache_path))
+    return related_words
+
+# Function to forget all cached expansions of this process.
+def clear_concept_cache():
+    """
+    Clears the in-process LRU cache and the loaded on-disk stores.
+    """
+    expand_concept.cache_clear()
+    _concept_stores.clear()
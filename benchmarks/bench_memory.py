@@ -0,0 +1,124 @@
+"""
+Memory benchmark for writing redacted output.
+
+Builds a large document from sample.txt, detects its entities once (regex, titles and the
+gazetteer, so spaCy is not needed), and then traces the redaction and the write of the
+output with tracemalloc for two writers:
+
+- "per_line": the line-by-line approach redactor.py used before: each line is copied when its
+  pyap addresses are masked and again by apply_redaction, topic redaction joins, masks and cuts
+  the lines again, and the output is joined into one string before it is written.
+- "spans": redaction_mask_spans collects the merged spans of the whole document and the output
+  is masked while it is written (write_text_file with spans), without building it in memory.
+
+Both outputs must be identical. The peak traced memory and the wall time of each writer are
+printed as JSON.
+
+Usage:
+    python benchmarks/bench_memory.py --size-mb 5 --concept project call
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from redactor import (apply_redaction, combine_detections, compile_entity_matcher, compile_topic_matcher,
+                      extract_titles_and_names, extract_using_regex, find_address_spans, find_places,
+                      joined_line_offsets, mask_spans, merge_spans, redaction_mask_spans, spans_by_line,
+                      topic_mask_spans, write_text_file)
+
+# Function to build a document of the requested size from a template file.
+def build_document(template_path, size_bytes):
+    """
+    Repeats the template text until the document reaches about size_bytes characters, ending
+    at a line break.
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read().rstrip("\n") + "\n\n"
+    return template * (size_bytes // len(template) + 1)
+
+# Function to redact line by line, as redactor.py did before the span writer.
+def write_per_line(text, entities, args, topics, output_path):
+    """
+    Redacts the document one line at a time and writes the joined result.
+    """
+    lines = text.splitlines()
+    matcher = compile_entity_matcher(entities, {"PERSON": args.names, "DATE": args.dates, "PHONE": args.phones, "ADDRESS": args.address})
+    address_parts = spans_by_line(find_address_spans("\n".join(lines)), joined_line_offsets(lines), lines)
+    redacted_lines = []
+    for line_index, line in enumerate(lines):
+        if line_index in address_parts:
+            line = mask_spans(line, merge_spans(address_parts[line_index]))
+        redacted_lines.append(apply_redaction(line, entities, redact_names=args.names, redact_dates=args.dates,
+                                              redact_phones=args.phones, redact_address=args.address, matcher=matcher))
+    if topics:
+        redacted_text = "\n".join(redacted_lines)
+        redacted_text = mask_spans(redacted_text, topic_mask_spans(redacted_text, compile_topic_matcher(tuple(topics))))
+        position = 0
+        for i, line in enumerate(redacted_lines):
+            redacted_lines[i] = redacted_text[position:position + len(line)]
+            position += len(line) + 1
+    write_text_file(output_path, "\n".join(redacted_lines))
+
+# Function to redact with merged spans and mask while writing.
+def write_spans(text, entities, args, topics, output_path):
+    """
+    Collects the spans to mask over the whole document and masks them while writing.
+    """
+    joined, mask = redaction_mask_spans(text.splitlines(), entities, args, topics=topics)
+    write_text_file(output_path, joined, spans=mask)
+
+# Function to trace one writer.
+def trace_writer(writer, text, entities, args, topics, output_path):
+    """
+    Runs the writer under tracemalloc.
+
+    Returns:
+        dict: The peak traced memory in MB and the wall time in seconds.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    writer(text, entities, args, topics, output_path)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_mb": peak / 2 ** 20, "seconds": seconds}
+
+# Function to run the benchmark.
+def main(args):
+    """
+    Traces both writers on the generated document and prints the results as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    logging.disable(logging.CRITICAL)
+    text = build_document(args.template, int(args.size_mb * 1024 * 1024))
+    entities = combine_detections(extract_using_regex(text), extract_titles_and_names(text), {"PERSON": [], "GPE": []}, find_places(text))
+    redact_args = argparse.Namespace(names=True, dates=True, phones=True, address=True, concept_word_boundary=False)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = {}
+        for writer in (write_per_line, write_spans):
+            name = writer.__name__[len("write_"):]
+            outputs[name] = os.path.join(directory, name + ".censored")
+            results[name] = trace_writer(writer, text, entities, redact_args, args.concept, outputs[name])
+        with open(outputs["per_line"], encoding="utf-8") as f, open(outputs["spans"], encoding="utf-8") as g:
+            if f.read() != g.read():
+                sys.exit("the per-line and span writers disagree")
+    results["peak_reduction"] = 1 - results["spans"]["peak_mb"] / results["per_line"]["peak_mb"]
+    print(json.dumps({"size_mb": args.size_mb, "concept": args.concept, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory used by the per-line and span-based redaction writers.")
+    parser.add_argument("--template", default=os.path.join(REPO_ROOT, "sample.txt"), help="Text repeated to build the document")
+    parser.add_argument("--size-mb", type=float, default=5, help="Size of the generated document in megabytes")
+    parser.add_argument("--concept", nargs="*", default=[], help="Related words redacted at sentence level (already expanded)")
+    main(parser.parse_args())
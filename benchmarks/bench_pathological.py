@@ -0,0 +1,89 @@
+"""
+Pathological-input benchmark for the regex entity extractor.
+
+Each generator below builds a document that used to make (or could make) one of the
+patterns backtrack heavily. The benchmark times extract_using_regex and the hardened
+extractor on every document and reports the limit counters.
+
+Usage:
+    python benchmarks/bench_pathological.py --size 20000
+    python benchmarks/bench_pathological.py --size 6 --legacy-address
+
+--legacy-address also times the original ADDRESS pattern, whose nested quantifier grows
+exponentially with the number of words (about 0.2s at 6 words and 10s at 8); keep --size
+small when using it.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from assignment1.pattern_matcher import (extract_using_regex, extract_using_regex_hardened,
+                                         get_regex_limit_counters)
+
+# The ADDRESS pattern as it was before the street-name part was rewritten.
+LEGACY_ADDRESS_PATTERN = re.compile(
+    r'\b\d+\s(?:[A-Za-z]+\s?)+(?:St|Street|Ave|Avenue|Blvd|Boulevard|Rd|Road|Lane|Ln|Drive|Dr|Plaza|Way|Terrace|Court|Square|Loop|Parkway|Str)\b'
+)
+
+# Generators of pathological documents, keyed by name. Each takes a repetition count.
+PATHOLOGICAL_INPUTS = {
+    # A house number followed by many words and no street suffix (OCR'd tables).
+    "address_without_suffix": lambda n: "12 " + "word " * n + "!",
+    # The same without spaces between letters and words, as in minified logs.
+    "address_glued_words": lambda n: "12 " + "ab" * n + "!",
+    # Titles followed by a long run of capitalised words.
+    "title_name_run": lambda n: "Dear " + "Name " * n + "!",
+    # Capitalised word pairs that all look like names.
+    "person_pairs": lambda n: "Alpha Beta " * n,
+    # A long dotted local part with no "@".
+    "email_without_at": lambda n: "a." * n,
+    # Digit runs that look like the start of phone numbers.
+    "digit_runs": lambda n: "123 456 " * n,
+}
+
+# Function to time a callable once.
+def timed(function, *args, **kwargs):
+    """
+    Calls the function and returns the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+# Function to run the benchmark.
+def main(args):
+    """
+    Times the extractors on every pathological input and prints the results as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    logging.disable(logging.CRITICAL)
+    report = {}
+    for name, generator in PATHOLOGICAL_INPUTS.items():
+        text = generator(args.size)
+        get_regex_limit_counters(reset=True)
+        entry = {
+            "chars": len(text),
+            "extract_using_regex": timed(extract_using_regex, text),
+            "hardened": timed(extract_using_regex_hardened, text, time_limit=args.time_limit),
+            "limits_hit": get_regex_limit_counters(reset=True),
+        }
+        if args.legacy_address:
+            entry["legacy_address"] = timed(LEGACY_ADDRESS_PATTERN.findall, text)
+        report[name] = entry
+    print(json.dumps({"size": args.size, "seconds": report}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark regex extraction on pathological inputs.")
+    parser.add_argument("--size", type=int, default=20000, help="Repetition count passed to every generator")
+    parser.add_argument("--time-limit", type=float, default=5.0, help="Time limit for the hardened extractor")
+    parser.add_argument("--legacy-address", action="store_true", help="Also time the original ADDRESS pattern")
+    main(parser.parse_args())
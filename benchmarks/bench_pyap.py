@@ -0,0 +1,98 @@
+"""
+Benchmark for pyap address detection.
+
+Builds a document of the requested number of lines from sample.txt and times the old
+per-line pass (one pyap.parse call per line) against the document-level find_address_spans,
+and reports how many addresses each one finds.
+
+Usage:
+    python benchmarks/bench_pyap.py --lines 100000 --repeat 1
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+import pyap
+from assignment1.addresses import find_address_spans, PYAP_BLOCK_CHARS
+
+# Function to build a document with the requested number of lines from a template file.
+def build_lines(template_path, line_count):
+    """
+    Repeats the template's lines until there are line_count of them.
+
+    Args:
+        template_path (str): Path of the text used as the building block.
+        line_count (int): Number of lines to produce.
+
+    Returns:
+        list of str: The lines of the generated document.
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read().splitlines()
+    copies = line_count // len(template) + 1
+    return (template * copies)[:line_count]
+
+# Function to run pyap once per line, like the redactor used to.
+def per_line_addresses(lines):
+    """
+    Calls pyap.parse on every line and returns the number of addresses found.
+    """
+    return sum(len(pyap.parse(line, country='US')) for line in lines)
+
+# Function to run pyap over the whole document.
+def per_document_addresses(lines, block_chars):
+    """
+    Calls find_address_spans once on the joined lines and returns the number of addresses found.
+    """
+    return len(find_address_spans("\n".join(lines), block_chars=block_chars))
+
+# Function to time one pass.
+def time_pass(run, repeat):
+    """
+    Runs the pass several times and returns the best wall time in seconds and its result.
+
+    Args:
+        run (callable): The pass to time, called without arguments.
+        repeat (int): Number of runs.
+
+    Returns:
+        tuple: The fastest run in seconds and the number of addresses found.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = run()
+        timings.append(time.perf_counter() - start)
+    return min(timings), found
+
+# Function to run the benchmark.
+def main(args):
+    """
+    Times both passes on the generated document and prints the results as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    logging.disable(logging.CRITICAL)
+    lines = build_lines(args.template, args.lines)
+    results = {}
+    for name, run in (("per_line", lambda: per_line_addresses(lines)),
+                      ("per_document", lambda: per_document_addresses(lines, args.block_chars))):
+        seconds, found = time_pass(run, args.repeat)
+        results[name] = {"seconds": seconds, "addresses": found}
+    results["speedup"] = results["per_line"]["seconds"] / results["per_document"]["seconds"]
+    print(json.dumps({"lines": args.lines, "block_chars": args.block_chars, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-line against document-level pyap address detection.")
+    parser.add_argument("--template", default=os.path.join(REPO_ROOT, "sample.txt"), help="Text whose lines are repeated to build the document")
+    parser.add_argument("--lines", type=int, default=100_000, help="Number of lines in the generated document")
+    parser.add_argument("--block-chars", type=int, default=PYAP_BLOCK_CHARS, help="Characters passed to pyap at once in the document-level pass")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timed runs per pass")
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark for the regex entity extractor.
+
+Builds a document by repeating sample.txt-style text up to the requested size and times
+extract_using_regex, with and without offsets (finditer and findall with the precompiled
+patterns), against the per-type reference extract_using_regex_per_type.
+
+Usage:
+    python benchmarks/bench_regex.py --size-mb 10 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from assignment1.pattern_matcher import extract_using_regex, extract_using_regex_per_type
+
+# Function to build a document of the requested size from a template file.
+def build_document(template_path, size_bytes):
+    """
+    Repeats the template text until the document reaches size_bytes characters.
+
+    Args:
+        template_path (str): Path of the text used as the building block.
+        size_bytes (int): Target size of the document in characters.
+
+    Returns:
+        str: The generated document.
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read()
+    copies = size_bytes // len(template) + 1
+    return (template * copies)[:size_bytes]
+
+# Function to time one extractor.
+def time_extractor(extractor, text, repeat):
+    """
+    Runs the extractor several times and returns the best wall time in seconds.
+
+    Args:
+        extractor (callable): The function to time.
+        text (str): The document passed to it.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: The fastest run in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extractor(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+# Function to run the benchmark.
+def main(args):
+    """
+    Times the extractors on the generated document and prints the results as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    logging.disable(logging.CRITICAL)
+    text = build_document(args.template, int(args.size_mb * 1024 * 1024))
+    if extract_using_regex(text) != extract_using_regex_per_type(text):
+        sys.exit("extract_using_regex and per-type extraction disagree")
+    extractors = {"extract_using_regex": extract_using_regex,
+                  "extract_using_regex_with_spans": lambda text: extract_using_regex(text, with_spans=True),
+                  "extract_using_regex_per_type": extract_using_regex_per_type}
+    results = {}
+    for name, extractor in extractors.items():
+        seconds = time_extractor(extractor, text, args.repeat)
+        results[name] = {"seconds": seconds, "mb_per_second": args.size_mb / seconds}
+    print(json.dumps({"size_mb": args.size_mb, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the regex entity extractor.")
+    parser.add_argument("--template", default=os.path.join(REPO_ROOT, "sample.txt"), help="Text repeated to build the document")
+    parser.add_argument("--size-mb", type=float, default=10, help="Size of the generated document in megabytes")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per extractor")
+    main(parser.parse_args())
@@ -0,0 +1,186 @@
+"""
+Load generator for the redaction service.
+
+Starts `redactor.py --serve` on a Unix socket (or uses a running service given with --address),
+opens one connection per simulated client, and has every client send email-sized requests
+one after another. Each request's latency is measured from sending it to reading its response,
+and the p50 and p99 latencies and the throughput are printed as JSON.
+
+With --cli-runs, one-shot `redactor.py` invocations on a single request's text are timed too,
+to show the start-up cost the service avoids.
+
+Usage:
+    python benchmarks/bench_service.py --clients 8 --requests 2000
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Function to build the request texts from a template file.
+def build_texts(template_path):
+    """
+    Splits the template into paragraphs, each of which is sent as one request.
+
+    Args:
+        template_path (str): Path of the text used as the building block.
+
+    Returns:
+        list of str: The non-empty paragraphs.
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return [paragraph.strip() for paragraph in f.read().split("\n\n") if paragraph.strip()]
+
+# Function to start the service and wait until it accepts connections.
+def start_service(socket_path, flags, timeout=120.0):
+    """
+    Starts redactor.py --serve on a Unix socket in a subprocess.
+
+    Args:
+        socket_path (str): The socket path.
+        flags (list of str): Extra redactor.py flags (e.g. ["--names", "--dates"]).
+        timeout (float): Seconds to wait for the socket to appear.
+
+    Returns:
+        subprocess.Popen: The running service.
+
+    Raises:
+        RuntimeError: If the service exits or does not start listening in time.
+    """
+    process = subprocess.Popen([sys.executable, "redactor.py", "--serve", socket_path] + flags, cwd=REPO_ROOT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with code {process.returncode}.")
+        if os.path.exists(socket_path):
+            return process
+        time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("The service did not start listening in time.")
+
+# Function to connect to the service.
+def connect(address):
+    """
+    Opens a connection to a Unix socket path or a HOST:PORT address.
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.create_connection((host, int(port)))
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(address)
+    return client
+
+# Function to run one simulated client.
+def run_client(address, texts, count, offset, latencies, errors):
+    """
+    Sends count requests over one connection, each after the previous response arrived,
+    and records the latency of every request.
+
+    Args:
+        address (str): The service address.
+        texts (list of str): The request texts, used round-robin starting at offset.
+        count (int): Number of requests to send.
+        offset (int): Position of the first text.
+        latencies (list of float): Receives the latency of each request in seconds.
+        errors (list of str): Receives the error of each failed request.
+    """
+    with connect(address) as client:
+        responses = client.makefile("r", encoding="utf-8")
+        for number in range(count):
+            request = {"id": f"{offset}-{number}", "text": texts[(offset + number) % len(texts)]}
+            start = time.perf_counter()
+            client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            response = json.loads(responses.readline())
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                errors.append(response["error"])
+
+# Function to compute a percentile.
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of the values (fraction between 0 and 1).
+    """
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))]
+
+# Function to time one-shot redactor.py runs.
+def time_cli_runs(text, flags, runs):
+    """
+    Runs redactor.py on a file holding one request's text and returns the wall times.
+    """
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "request.txt")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "redactor.py", "--input", input_path, "--output", os.path.join(directory, "out")] + flags,
+                           cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+# Function to run the benchmark.
+def main(args):
+    """
+    Runs the clients against the service and prints the latency percentiles as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    texts = build_texts(args.template)
+    flags = ["--names", "--dates", "--phones", "--address"] + args.service_flags
+    with tempfile.TemporaryDirectory() as directory:
+        process = None
+        address = args.address
+        if address is None:
+            address = os.path.join(directory, "redactor.sock")
+            process = start_service(address, flags)
+        try:
+            # Warm-up request, so the percentiles describe a warm service.
+            run_client(address, texts, 1, 0, [], [])
+            latencies, errors = [], []
+            per_client = args.requests // args.clients
+            clients = [threading.Thread(target=run_client, args=(address, texts, per_client, index * per_client, latencies, errors))
+                       for index in range(args.clients)]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    results = {
+        "clients": args.clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "requests_per_second": len(latencies) / elapsed,
+    }
+    if args.cli_runs:
+        timings = time_cli_runs(texts[0], flags[:4], args.cli_runs)
+        results["cli_p50_ms"] = percentile(timings, 0.50) * 1000
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the latency of the redaction service under concurrent load.")
+    parser.add_argument("--template", default=os.path.join(REPO_ROOT, "sample.txt"), help="Text whose paragraphs are sent as requests")
+    parser.add_argument("--address", help="Address of a running service (Unix socket path or HOST:PORT); by default one is started")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests")
+    parser.add_argument("--cli-runs", type=int, default=0, help="Also time this many one-shot redactor.py runs on one request")
+    parser.add_argument("--service-flags", nargs=argparse.REMAINDER, default=[], help="Extra flags for the started service, e.g. --service-batch-size 16")
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+"""
+Startup-time benchmark for redactor.py.
+
+Measures, in a fresh interpreter for every run:
+    - import: time to import the redactor module.
+    - first_file: time from the start of the import until the first file has been
+      redacted and written (this includes loading the spaCy model).
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --input sample.txt --names --dates
+
+Results are printed as JSON so they can be tracked across commits.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Code executed in the child interpreter; it prints the measured latencies as JSON.
+CHILD_SCRIPT = '''
+import sys, time, json, argparse
+start = time.perf_counter()
+import redactor
+imported = time.perf_counter()
+args = argparse.Namespace(input=sys.argv[1], output=sys.argv[2], names={names}, dates={dates},
+                          phones={phones}, address={address}, concept=None, stats="stdout")
+redactor.main(args)
+done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first_file": done - start}}))
+'''
+
+# Function to run a single measurement in a fresh interpreter.
+def run_once(input_path, flags):
+    """
+    Runs one cold start in a subprocess and returns its measured latencies.
+
+    Args:
+        input_path (str): File (or glob pattern) passed to redactor.main as --input.
+        flags (dict): Redaction flags (names, dates, phones, address).
+
+    Returns:
+        dict: Seconds spent until import finished and until the first file was written.
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        script = CHILD_SCRIPT.format(**flags)
+        completed = subprocess.run([sys.executable, '-c', script, input_path, output_dir + os.sep],
+                                   cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# Function to run the benchmark and summarise the results.
+def main(args):
+    """
+    Runs the startup benchmark several times and prints median and max latencies as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+    """
+    flags = {"names": args.names, "dates": args.dates, "phones": args.phones, "address": args.address}
+    runs = [run_once(args.input, flags) for _ in range(args.runs)]
+    summary = {}
+    for key in ("import", "first_file"):
+        values = [run[key] for run in runs]
+        summary[key] = {"median": statistics.median(values), "max": max(values)}
+    print(json.dumps({"runs": args.runs, "input": args.input, "seconds": summary}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and import-to-first-file latency of redactor.py.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold starts to measure")
+    parser.add_argument("--input", default="sample.txt", help="Input file pattern for the first-file measurement")
+    parser.add_argument("--names", action="store_true", help="Redact names")
+    parser.add_argument("--dates", action="store_true", help="Redact dates")
+    parser.add_argument("--phones", action="store_true", help="Redact phone numbers")
+    parser.add_argument("--address", action="store_true", help="Redact addresses")
+    main(parser.parse_args())
@@ -0,0 +1,296 @@
+"""
+Benchmark and regression suite for the redaction pipeline.
+
+Generates synthetic corpora at several entity densities, document sizes and file counts, and
+measures for each combination:
+
+    - regex: extract_using_regex over the document.
+    - titles: extract_titles_and_names over the document.
+    - apply_redaction: masking the document's regex entities with a prebuilt matcher.
+    - topics: hide_terms_in_sentences with a fixed list of topic words.
+    - ner: the spaCy NER step (extract_ner_entities_batch).
+    - main: redactor.main end to end over a directory of generated files.
+
+Every measurement records the best wall time of --repeat runs, the throughput in characters per
+second and the peak memory traced by tracemalloc in one extra run. The NER and end-to-end cases
+need the spaCy model; when it cannot be loaded they are recorded as skipped.
+
+The results are written as JSON to --save. With --compare, the results are compared with a saved
+baseline, and every case whose throughput dropped or whose peak memory grew by more than
+--threshold (a fraction, default 0.10) is reported as a regression; the exit status is 1 if there
+is any.
+
+Usage:
+    python benchmarks/bench_suite.py --save benchmarks/baseline.json
+    python benchmarks/bench_suite.py --compare benchmarks/baseline.json --threshold 0.15
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from redactor import (apply_redaction, compile_entity_matcher, extract_ner_entities_batch, extract_titles_and_names,
+                      extract_using_regex, get_nlp, hide_terms_in_sentences)
+import redactor
+
+# Version of the results format, so a baseline from an incompatible suite is not compared.
+RESULTS_VERSION = 1
+
+# Share of the generated sentences that carry an entity, per density name.
+ENTITY_DENSITIES = {"low": 0.05, "medium": 0.25, "high": 0.6}
+
+# Words the filler sentences are made of.
+FILLER_WORDS = ("the", "project", "report", "meeting", "budget", "team", "review", "plan", "needs", "final",
+                "approval", "before", "after", "schedule", "office", "numbers", "were", "sent", "to", "with")
+
+# Topic words used for the topics case.
+TOPIC_WORDS = ("budget", "approval", "schedule")
+
+# Building blocks of the generated entities.
+FIRST_NAMES = ("Alice", "Michael", "Sophia", "Liam", "Olivia", "Noah", "Emma", "James")
+LAST_NAMES = ("Carter", "Nguyen", "Patel", "Garcia", "Smith", "Johnson", "Brown", "Lee")
+STREETS = ("Maple St", "Cedar Ave", "Broadway", "Oak Rd", "Pine Ln")
+CITIES = (("Seattle", "WA"), ("New York", "NY"), ("Austin", "TX"), ("Denver", "CO"))
+
+# Function to generate one sentence that carries an entity.
+def entity_sentence(rng):
+    """
+    Returns a sentence mentioning a name, date, phone number, email or address.
+    """
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"Mr. {last} met {first} {last} at the office."
+    if kind == 1:
+        return f"The review is due on {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/20{rng.randint(10, 30)}."
+    if kind == 2:
+        return f"Call {first} at {rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)} today."
+    if kind == 3:
+        return f"Write to {first.lower()}.{last.lower()}@example.com with the numbers."
+    city, state = rng.choice(CITIES)
+    return f"Send it to {rng.randint(10, 9999)} {rng.choice(STREETS)}, {city}, {state} {rng.randint(10000, 99999)}."
+
+# Function to generate a synthetic document.
+def generate_document(size_chars, density, seed=0):
+    """
+    Generates paragraphs of filler sentences, a share of which carry an entity, until the
+    document reaches size_chars characters.
+
+    Args:
+        size_chars (int): Target size in characters.
+        density (float): Share of sentences that carry an entity (see ENTITY_DENSITIES).
+        seed (int): Seed of the generator, so the same arguments give the same document.
+
+    Returns:
+        str: The document.
+    """
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < size_chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            if rng.random() < density:
+                sentences.append(entity_sentence(rng))
+            else:
+                words = rng.choices(FILLER_WORDS, k=rng.randint(6, 14))
+                sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+# Function to write a synthetic corpus to a directory.
+def generate_corpus(directory, file_count, size_chars, density, seed=0):
+    """
+    Writes file_count generated documents of size_chars characters to directory.
+
+    Returns:
+        int: The total number of characters written.
+    """
+    total = 0
+    for number in range(file_count):
+        text = generate_document(size_chars, density, seed=seed + number)
+        with open(os.path.join(directory, f"doc{number:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        total += len(text)
+    return total
+
+# Function to measure one case.
+def measure(function, chars, repeat):
+    """
+    Times function (called without arguments) repeat times, then runs it once more under
+    tracemalloc.
+
+    Returns:
+        dict: The best "seconds", the "chars_per_second" for the given number of characters and the "peak_mb".
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seconds = min(timings)
+    return {"seconds": seconds, "chars_per_second": chars / seconds if seconds else None, "peak_mb": peak / 2 ** 20}
+
+# Function to load the spaCy model if it is available.
+def load_nlp():
+    """
+    Returns the spaCy pipeline, or the reason it cannot be loaded as a string.
+    """
+    try:
+        return get_nlp()
+    except (ImportError, OSError) as error:
+        return f"{type(error).__name__}: {error}"
+
+# Function to run the document-level cases.
+def run_document_cases(sizes, densities, repeat, nlp):
+    """
+    Measures the regex, titles, apply_redaction, topics and NER cases on generated documents.
+
+    Returns:
+        dict: Case keys ("<case>/size=<size>/density=<density>") mapped to their measurements.
+    """
+    results = {}
+    for size in sizes:
+        for density in densities:
+            text = generate_document(size, ENTITY_DENSITIES[density])
+            entities = {key: found for key, found in extract_using_regex(text).items() if key != "EMAIL"}
+            entities["PERSON"] = entities["PERSON"] + extract_titles_and_names(text)
+            matcher = compile_entity_matcher(entities, dict.fromkeys(entities, True))
+            cases = {
+                "regex": lambda: extract_using_regex(text),
+                "titles": lambda: extract_titles_and_names(text),
+                "apply_redaction": lambda: apply_redaction(text, entities, True, True, True, True, matcher=matcher),
+                "topics": lambda: hide_terms_in_sentences(text, list(TOPIC_WORDS)),
+                "ner": lambda: extract_ner_entities_batch([text], nlp=nlp, batch_size=1),
+            }
+            for case, function in cases.items():
+                key = f"{case}/size={size}/density={density}"
+                if case == "ner" and isinstance(nlp, str):
+                    results[key] = {"skipped": nlp}
+                    continue
+                sys.stderr.write(f"Measuring {key}\n")
+                results[key] = measure(function, len(text), repeat)
+    return results
+
+# Function to run the end-to-end cases.
+def run_main_cases(file_counts, size, densities, repeat, nlp):
+    """
+    Measures redactor.main over generated corpora of each file count and density.
+
+    Returns:
+        dict: Case keys ("main/files=<count>/size=<size>/density=<density>") mapped to their measurements.
+    """
+    results = {}
+    for file_count in file_counts:
+        for density in densities:
+            key = f"main/files={file_count}/size={size}/density={density}"
+            if isinstance(nlp, str):
+                results[key] = {"skipped": nlp}
+                continue
+            with tempfile.TemporaryDirectory() as directory:
+                input_dir = os.path.join(directory, "input")
+                os.mkdir(input_dir)
+                chars = generate_corpus(input_dir, file_count, size, ENTITY_DENSITIES[density])
+                args = argparse.Namespace(input=os.path.join(input_dir, "*.txt"), output=os.path.join(directory, "output") + os.sep,
+                                          names=True, dates=True, phones=True, address=True, concept=None, stats="stdout")
+                def run_main():
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        redactor.main(args)
+                sys.stderr.write(f"Measuring {key}\n")
+                results[key] = measure(run_main, chars, repeat)
+    return results
+
+# Function to compare results with a baseline.
+def compare_results(baseline, current, threshold):
+    """
+    Finds the cases whose throughput dropped or whose peak memory grew by more than threshold.
+
+    Cases missing from either side, or skipped in either, are not compared.
+
+    Args:
+        baseline (dict): Saved results.
+        current (dict): New results.
+        threshold (float): Allowed relative change, e.g. 0.1 for 10%.
+
+    Returns:
+        list of dict: One entry per regression, with the case, the metric, both values and the relative change.
+    """
+    regressions = []
+    for key, new in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None or "skipped" in old or "skipped" in new:
+            continue
+        if old["chars_per_second"] and new["chars_per_second"]:
+            change = new["chars_per_second"] / old["chars_per_second"] - 1
+            if change < -threshold:
+                regressions.append({"case": key, "metric": "chars_per_second", "baseline": old["chars_per_second"],
+                                    "current": new["chars_per_second"], "change": change})
+        if old["peak_mb"]:
+            change = new["peak_mb"] / old["peak_mb"] - 1
+            if change > threshold:
+                regressions.append({"case": key, "metric": "peak_mb", "baseline": old["peak_mb"],
+                                    "current": new["peak_mb"], "change": change})
+    return regressions
+
+# Function to run the suite.
+def main(args):
+    """
+    Runs the suite, saves and compares the results as requested, and prints them as JSON.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+
+    Returns:
+        int: 1 if --compare found a regression, 0 otherwise.
+    """
+    logging.disable(logging.CRITICAL)
+    nlp = load_nlp()
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {**run_document_cases(args.sizes, args.densities, args.repeat, nlp),
+                    **run_main_cases(args.files, args.main_size, args.densities, args.repeat, nlp)},
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    status = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("version") != RESULTS_VERSION:
+            sys.exit(f"{args.compare} was written by an incompatible version of the suite")
+        results["regressions"] = compare_results(baseline, results, args.threshold)
+        status = 1 if results["regressions"] else 0
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the redaction pipeline and compare the results with a baseline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Document sizes in characters")
+    parser.add_argument("--densities", nargs="+", choices=list(ENTITY_DENSITIES), default=["low", "high"], help="Entity densities")
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 20], help="File counts of the end-to-end corpora")
+    parser.add_argument("--main-size", type=int, default=50_000, help="Size in characters of each end-to-end file")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (the best one is kept)")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with this saved JSON file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative throughput drop or memory growth reported as a regression")
+    sys.exit(main(parser.parse_args()))
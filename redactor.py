@@ -1,23 +1,41 @@
+import io
 import os
 import argparse
 import sys
+import time
+import bisect
+import contextlib
+import itertools
+import multiprocessing
 import warnings
 import pyap
 import re
-import spacy
 from assignment1.pattern_matcher import *
 from assignment1.helper import *
-import us
-import pycountry
+from assignment1.entity_matcher import *
+from assignment1.models import *
+from assignment1.ner import *
+from assignment1.metrics import *
+from assignment1.gazetteer import *
+from assignment1.topics import *
+from assignment1.incremental import *
+from assignment1.span_index import *
+from assignment1.addresses import *
+from assignment1.prefilter import *
+from assignment1.service import *
+from assignment1.discovery import *
+from assignment1.output_writer import *
+from assignment1.sharding import *
+from assignment1.registry import *
+from assignment1.pipeline import *
+from assignment1.structured import *
+from assignment1.profiling import *
 import logging
 
 # Set up the logging to record debug information to 'docs/codelogger.log'.
 logging.basicConfig(filename='docs/codelogger.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-import nltk
-nltk.download('wordnet')
 
-# Load the Spacy NLP model.
-nlp = spacy.load("en_core_web_md")
+# The spaCy and WordNet models are loaded lazily on first use (see assignment1/models.py).
 
 # Function to find US addresses in text using the Pyap library.
 def find_addresses_with_pyap(text):
@@ -35,7 +53,7 @@ def find_addresses_with_pyap(text):
         list of str: A list of addresses found in the input text.
     """
     found_addresses = pyap.parse(text, country='US')
-    logging.debug(f"Found addresses with pyap: {found_addresses}")
+    logging.debug("Found addresses with pyap: %s", found_addresses)
     return [str(address) for address in found_addresses]
 
 # Function to print and log extraction details at various stages.
@@ -53,19 +71,19 @@ def print_debug_info(stage, names=None, dates=None, phones=None, addresses=None)
     This function prints the provided information to the console and logs it using the logging module.
     """
     print(f"\n--- {stage} ---")
-    logging.debug(f"Stage: {stage}")
+    logging.debug("Stage: %s", stage)
     if names is not None:
         print(f"Persons: {names}")
-        logging.debug(f"Persons: {names}")
+        logging.debug("Persons: %s", names)
     if dates is not None:
         print(f"Dates: {dates}")
-        logging.debug(f"Dates: {dates}")
+        logging.debug("Dates: %s", dates)
     if phones is not None:
         print(f"Phones: {phones}")
-        logging.debug(f"Phones: {phones}")
+        logging.debug("Phones: %s", phones)
     if addresses is not None:
         print(f"Addresses: {addresses}")
-        logging.debug(f"Addresses: {addresses}")
+        logging.debug("Addresses: %s", addresses)
 
 # Function to format and log statistics about the redaction process.
 def format_entity_stats(file, args, names, dates, phones, addresses):
@@ -84,7 +102,7 @@ def format_entity_stats(file, args, names, dates, phones, addresses):
         str: A formatted string with the file name and the number of occurrences for each specified entity type.
     """
     stats_output = f"File: {file}\nEntity type : Number of occurrences\n\n"
-    logging.info(f"Formatting stats for file: {file}")
+    logging.info("Formatting stats for file: %s", file)
     if args.names:
         stats_output += f"PERSON : {len(names)}\n"
     if args.dates:
@@ -97,74 +115,108 @@ def format_entity_stats(file, args, names, dates, phones, addresses):
     stats_output += "\n"
     return stats_output
 
-# Main function to redact sensitive information based on specified arguments.
-def redact_sensitive_info(text_input, args, topics=None):
+# Function to detect sensitive entities in a text.
+def detect_entities(full_text, args, ner_entities=None, sources=None):
     """
-    Redacts sensitive information from the given text input based on specified arguments.
+    Detects names, dates, phone numbers and addresses in the given text.
+
     Parameters:
-    text_input (str): The input text or file path containing the text to be redacted.
-    args (Namespace): Arguments specifying which types of information to redact (names, dates, phones, addresses).
-    topics (list, optional): List of topics for additional redaction. Defaults to None.
+    full_text (str): The text to analyse.
+    args (Namespace): Arguments controlling detection (e.g. hardened regex limits).
+    ner_entities (dict, optional): PERSON and GPE entities already computed for this text by
+        extract_ner_entities_batch. When given, the SpaCy step is skipped. Defaults to None.
+    sources (dict, optional): If given, (entity type, entity) is mapped in it to the first detector that
+        reported the entity ("regex", "email", "title", "ner", "gazetteer" or "registry"). Defaults to None.
     Returns:
-    tuple: A tuple containing the redacted text, and lists of found names, dates, phones, and addresses.
+    dict: "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to the deduplicated lists of entities found.
     The function performs the following steps:
-    1. Reads the input text from a file or directly from the provided string.
-    2. Uses regex to extract names, dates, phone numbers, addresses, and emails.
-    3. Extracts names from email addresses and titles.
-    4. Uses SpaCy NLP to extract geographical and personal names.
-    5. Normalizes tokens to identify additional addresses.
-    6. Combines results from regex and SpaCy extractions.
-    7. Optionally processes topics for redaction.
-    8. Applies redaction to each line in the text based on the specified arguments.
-    Debug information is printed at various stages to aid in tracing the extraction and redaction process.
+    1. Uses regex to extract names, dates, phone numbers, addresses, and emails.
+    2. Extracts names from email addresses and titles.
+    3. Looks up normalized tokens and multi-word place names in the gazetteer to identify additional addresses,
+       and the names and addresses earlier documents of the run found in the entity registry.
+    4. Uses SpaCy NLP to extract geographical and personal names (skipped with --entity-registry-skip-ner
+       when the entity registry finds entities in the text).
+    5. Combines results from regex and SpaCy extractions, and adds them to the entity registry.
     """
-    # Open file if path exists or split input text into lines.
-    if os.path.exists(text_input):
-        with open(text_input, 'r', encoding='utf-8') as f:
-            lines_in_text = f.readlines()
-    else:
-        lines_in_text = text_input.splitlines()
+    # Perform regex-based extraction of entities (with size and time limits in hardened mode).
+    with stage_timer("regex"):
+        if getattr(args, "hardened_regex", False):
+            regex_results = extract_using_regex_hardened(
+                full_text,
+                max_chars=getattr(args, "regex_max_chars", HARDENED_MAX_CHARS),
+                time_limit=getattr(args, "regex_time_limit", HARDENED_TIME_LIMIT)
+            )
+        else:
+            regex_results = extract_using_regex(full_text)
 
-    full_text = "\n".join(lines_in_text)
+    # Extract names based on titles like 'Mr.', 'Ms.', etc.
+    with stage_timer("titles"):
+        names_from_titles = extract_titles_and_names(full_text)
+
+    # Look up states, countries and user-supplied places in the process-wide gazetteer index, and the
+    # entities of earlier documents in the entity registry (empty unless --entity-registry is set).
+    with stage_timer("gazetteer"):
+        gazetteer_places = find_places(full_text)
+        registry_entities = find_registered_entities(full_text)
+
+    # Use Spacy NLP to extract names and addresses (only the NER components run, and with
+    # --prefilter only over the paragraphs the cheap checks accept). With --entity-registry-skip-ner,
+    # the registry's exact matches stand in for NER in a document where it finds entities; a
+    # document without registry hits still goes through NER, so new names keep being found.
+    if (ner_entities is None and getattr(args, "entity_registry_skip_ner", False)
+            and any(registry_entities.values())):
+        ner_entities = {"PERSON": [], "GPE": []}
+    if ner_entities is None:
+        with stage_timer("ner"):
+            ner_entities = extract_ner_entities_for_args([full_text], args, batch_size=1)[0]
 
-    # Perform regex-based extraction of entities.
-    regex_results = extract_using_regex(full_text)
+    entities = combine_detections(regex_results, names_from_titles, ner_entities, gazetteer_places, sources=sources,
+                                  registry_entities=registry_entities)
+    register_entities(entities)
+    return entities
+
+# Function to combine the results of every detector into one entity set.
+def combine_detections(regex_results, names_from_titles, ner_entities, gazetteer_places, sources=None, registry_entities=None):
+    """
+    Combines what the regex, title, NER and gazetteer detectors found into deduplicated entity lists.
+
+    Parameters:
+    regex_results (dict): Entity types mapped to the strings found by extract_using_regex.
+    names_from_titles (list of str): Names found by extract_titles_and_names.
+    ner_entities (dict): PERSON and GPE entities found by NER.
+    gazetteer_places (list of str): Places found by find_places.
+    sources (dict, optional): If given, (entity type, entity) is mapped in it to the first detector that
+        reported the entity ("regex", "email", "title", "ner", "gazetteer" or "registry"). Defaults to None.
+    registry_entities (dict, optional): PERSON and ADDRESS entities found by find_registered_entities. Defaults to None.
+    Returns:
+    dict: "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to the deduplicated lists of entities found.
+    """
     found_names, found_dates, found_phones, found_addresses, found_emails = [], regex_results.get("DATE", []), regex_results.get("PHONE", []), regex_results.get("ADDRESS", []), regex_results.get("EMAIL", [])
 
     # Extract names from emails and add to the list of found names.
     email_names = [email.split('@')[0] for email in found_emails]
     found_names.extend(email_names)
-
-    # Extract names based on titles like 'Mr.', 'Ms.', etc.
-    names_from_titles = extract_titles_and_names(full_text)
     found_names.extend(names_from_titles)
 
     # Debug information after regex extraction.
     #print_debug_info("Regex Extraction", names=found_names, dates=found_dates, phones=found_phones, addresses=found_addresses)
 
-    # Prepare location data for further entity extraction.
-    state_abbrs = [state.abbr for state in us.states.STATES]   
-    state_names = [state.name for state in us.states.STATES] 
-    countries_names = [country.name for country in pycountry.countries]
-    countries_names_code = [country.alpha_2 for country in pycountry.countries]
-
-    # Use Spacy NLP to extract names and addresses.
-    spacy_names, spacy_dates, spacy_addresses = [], [], []
-    doc = nlp(full_text)
-    for entity in doc.ents:
-        if entity.label_ == 'GPE':
-            spacy_addresses.append(entity.text)
-        elif entity.label_ == 'PERSON':
-            spacy_names.append(entity.text)
-
-    # Normalize and check tokens for additional addresses.
-    tokens = full_text.split()
-    for token in tokens:
-        token_normalized = token.strip('.,')
-        if token_normalized in state_abbrs and len(token_normalized) == 2:
-            spacy_addresses.append(token_normalized)
-        elif token_normalized in state_names or token_normalized in countries_names or token_normalized in countries_names_code or token_normalized == 'USA':
-            spacy_addresses.append(token_normalized)
+    spacy_names, spacy_dates, spacy_addresses = list(ner_entities["PERSON"]), [], list(ner_entities["GPE"])
+    spacy_addresses.extend(gazetteer_places)
+    registry_entities = registry_entities or {"PERSON": [], "ADDRESS": []}
+    spacy_names.extend(registry_entities["PERSON"])
+    spacy_addresses.extend(registry_entities["ADDRESS"])
+
+    # Remember which detector reported each entity first, for the span index.
+    if sources is not None:
+        for detector, entity_type, found in (("regex", "DATE", found_dates), ("regex", "PHONE", found_phones),
+                                             ("regex", "ADDRESS", found_addresses), ("email", "PERSON", email_names),
+                                             ("title", "PERSON", names_from_titles), ("ner", "PERSON", ner_entities["PERSON"]),
+                                             ("ner", "ADDRESS", ner_entities["GPE"]), ("gazetteer", "ADDRESS", gazetteer_places),
+                                             ("registry", "PERSON", registry_entities["PERSON"]),
+                                             ("registry", "ADDRESS", registry_entities["ADDRESS"])):
+            for entity in found:
+                sources.setdefault((entity_type, entity), detector)
 
     # Debug information after SpaCy NER extraction.
     #print_debug_info("SpaCy NER Extraction", names=spacy_names, dates=spacy_dates, addresses=spacy_addresses)
@@ -178,35 +230,618 @@ def redact_sensitive_info(text_input, args, topics=None):
     # Debug information after combining results from all extraction methods.
     #print_debug_info("Combined Extraction (Regex + NER + pyap)", names=combined_names, dates=combined_dates, phones=combined_phones, addresses=combined_addresses)
 
+    return {"PERSON": combined_names, "DATE": combined_dates, "PHONE": combined_phones, "ADDRESS": combined_addresses}
+
+# Function to expand redaction topics into their related words.
+def expand_topics(topics, cache_path=None):
+    """
+    Expands each topic into its related words using WordNet.
+
+    Expansions are memoized for the rest of the process (and in the on-disk store at
+    cache_path, if given), so WordNet is queried once per run rather than once per file.
+
+    Parameters:
+    topics (list or None): The topics given with --concept.
+    cache_path (str, optional): The on-disk expansion store given with --concept-cache. Defaults to None.
+    Returns:
+    list or None: The flattened list of related words, or None if no topics were given.
+    """
+    if topics is None:
+        return None
+    with stage_timer("topics"):
+        return expand_concepts(topics, cache_path=cache_path)
+
+# Function to find the offsets redaction masks in a list of lines.
+def redaction_mask_spans(lines_in_text, entities, args, topics=None, span_records=None, sources=None, text=None):
+    """
+    Finds every span redaction masks, as offsets into the lines joined with line breaks, without
+    building any redacted text: the pyap addresses, the entity occurrences on each line (found on
+    the line with its addresses masked) and the topic sentences are collected and merged once.
+
+    Parameters:
+    lines_in_text (list of str): The lines to redact.
+    entities (dict): The entities returned by detect_entities.
+    args (Namespace): Arguments specifying which types of information to redact.
+    topics (list, optional): Related words (already expanded) for sentence-level redaction. Defaults to None.
+    span_records (list, optional): If given, a (line_index, start, end, type, detector) record is appended
+        to it for every occurrence of every entity type, pyap address and topic sentence, whether or not
+        that type is redacted in this run, so a span index can serve other configurations. Defaults to None.
+    sources (dict, optional): The detectors filled in by detect_entities. Entities missing from it
+        (e.g. read from the incremental cache) are recorded with the detector "unknown". Defaults to None.
+    text (str, optional): The lines already joined with line breaks, if the caller has them. Defaults to None.
+    Returns:
+    tuple: The joined text, and the sorted, non-overlapping (start, end) offsets to mask in it.
+    """
+    # Compile the entity matcher once per document and reuse it for every line.
+    entity_matcher = compile_entity_matcher(entities, {"PERSON": args.names, "DATE": args.dates, "PHONE": args.phones, "ADDRESS": args.address})
+    indexing = span_records is not None
+    if indexing:
+        # One matcher per type, so the spans of each type are complete on their own.
+        type_matchers = {entity_type: compile_matcher(found) for entity_type, found in entities.items()}
+        sources = sources or {}
+
+    if text is None:
+        text = "\n".join(lines_in_text)
+    line_offsets = joined_line_offsets(lines_in_text)
+
+    # Find pyap addresses once over the whole text, so addresses wrapping across lines are found too.
+    address_parts = {}
+    pyap_start = time.perf_counter()
+    if args.address or indexing:
+        address_spans = find_address_spans(text, block_chars=getattr(args, "pyap_block_chars", PYAP_BLOCK_CHARS))
+        address_parts = spans_by_line(address_spans, line_offsets, lines_in_text)
+    pyap_seconds = time.perf_counter() - pyap_start
+
+    # Collect the spans of each line, scanning it in place in the joined text, and time the masking stage.
+    mask = []
+    start = time.perf_counter()
+    for line_index, line in enumerate(lines_in_text):
+        line_start = line_offsets[line_index]
+        line_end = line_start + len(line)
+        if indexing:
+            for entity_type, type_matcher in type_matchers.items():
+                for span_start, span_end in find_spans(type_matcher, text, line_start, line_end):
+                    span_records.append((line_index, span_start - line_start, span_end - line_start, entity_type,
+                                         sources.get((entity_type, text[span_start:span_end]), "unknown")))
+        line_addresses = address_parts.get(line_index, [])
+        if indexing:
+            span_records.extend((line_index, span_start, span_end, "ADDRESS", "pyap") for span_start, span_end in line_addresses)
+        if line_addresses and args.address:
+            # Entities are matched on the line with its addresses already masked.
+            line_addresses = merge_spans(line_addresses)
+            masked_line = mask_spans(line, line_addresses)
+            mask.extend((line_start + span_start, line_start + span_end)
+                        for span_start, span_end in line_addresses + find_spans(entity_matcher, masked_line))
+        else:
+            mask.extend(find_spans(entity_matcher, text, line_start, line_end))
+
+    # Find the sentences containing topic words. Sentences are segmented once over the whole
+    # entity-masked document, so a sentence spanning several lines is redacted on each of them.
+    topic_start = time.perf_counter()
+    if topics:
+        topic_matcher = compile_topic_matcher(tuple(topics), getattr(args, "concept_word_boundary", False))
+        mask = merge_spans(mask)
+        topic_spans = topic_mask_spans(mask_spans(text, mask), topic_matcher)
+        if indexing:
+            for span_start, span_end in topic_spans:
+                line_index = bisect.bisect_right(line_offsets, span_start) - 1
+                span_records.append((line_index, span_start - line_offsets[line_index],
+                                     span_end - line_offsets[line_index], "TOPIC", "wordnet"))
+        mask.extend(topic_spans)
+    topic_seconds = time.perf_counter() - topic_start
+    mask = merge_spans(mask)
+    add_stage_time("pyap", pyap_seconds)
+    add_stage_time("topics", topic_seconds)
+    add_stage_time("redaction", time.perf_counter() - start - topic_seconds)
+    return text, mask
+
+# Function to redact a list of lines with already detected entities.
+def redact_lines(lines_in_text, entities, args, topics=None, span_records=None, sources=None):
+    """
+    Applies redaction to each line using the detected entities.
+
+    Parameters:
+    lines_in_text (list of str): The lines to redact.
+    entities (dict): The entities returned by detect_entities.
+    args (Namespace): Arguments specifying which types of information to redact.
+    topics (list, optional): Related words (already expanded) for sentence-level redaction. Defaults to None.
+    span_records (list, optional): Receives the span records, see redaction_mask_spans. Defaults to None.
+    sources (dict, optional): The detectors filled in by detect_entities. Defaults to None.
+    Returns:
+    list of str: The redacted lines, each as long as the input line.
+    """
+    text, mask = redaction_mask_spans(lines_in_text, entities, args, topics=topics, span_records=span_records, sources=sources)
+    with stage_timer("redaction"):
+        redacted_text = mask_spans(text, mask)
+        # Masking keeps the length of the text, so the lines are cut back at their original offsets.
+        redacted_text_lines = []
+        position = 0
+        for line in lines_in_text:
+            redacted_text_lines.append(redacted_text[position:position + len(line)])
+            position += len(line) + 1
+    return redacted_text_lines
+
+# Main function to redact sensitive information based on specified arguments.
+def redact_sensitive_info(text_input, args, topics=None, ner_entities=None, entities=None, spans=None, read_file=True):
+    """
+    Redacts sensitive information from the given text input based on specified arguments.
+    Parameters:
+    text_input (str): The input text or file path containing the text to be redacted.
+    args (Namespace): Arguments specifying which types of information to redact (names, dates, phones, addresses).
+    topics (list, optional): List of topics for additional redaction. Defaults to None.
+    ner_entities (dict, optional): PERSON and GPE entities already computed for this text by
+        extract_ner_entities_batch. When given, the SpaCy step is skipped. Defaults to None.
+    entities (dict, optional): Entities already detected in this text (e.g. read from the incremental
+        entity cache). When given, detection is skipped entirely. Defaults to None.
+    spans (list, optional): If given, every detected span is appended to it as a {"start", "end", "type",
+        "detector"} dictionary with offsets into the redacted text (see write_span_index). Defaults to None.
+    read_file (bool, optional): If False, text_input is always treated as text, even if it names an
+        existing file (the service uses this for text sent by clients). Defaults to True.
+    Returns:
+    tuple: A tuple containing the redacted text, and lists of found names, dates, phones, and addresses.
+    The function performs the following steps:
+    1. Reads the input text from a file or directly from the provided string.
+    2. Detects entities with regex, title and email heuristics, SpaCy NER and location lists (detect_entities).
+    3. Optionally expands topics for redaction (expand_topics).
+    4. Finds the spans to mask on each line based on the specified arguments (redaction_mask_spans) and masks them in one pass.
+    Debug information is printed at various stages to aid in tracing the extraction and redaction process.
+    """
+    text, mask, entities = redact_document(text_input, args, topics=topics, ner_entities=ner_entities, entities=entities,
+                                           spans=spans, read_file=read_file)
+    with stage_timer("redaction"):
+        redacted_text = mask_spans(text, mask)
+    return redacted_text, entities["PERSON"], entities["DATE"], entities["PHONE"], entities["ADDRESS"]
+
+# Function to detect the entities of a document and find what to mask.
+def redact_document(text_input, args, topics=None, ner_entities=None, entities=None, spans=None, read_file=True):
+    """
+    Does everything redact_sensitive_info does except building the redacted text: the text is
+    returned with the offsets to mask, so a caller can write the output with write_masked (or
+    write_output(..., spans=...)) without holding the redacted copy in memory.
+
+    Parameters:
+    The same as redact_sensitive_info.
+    Returns:
+    tuple: The text (its lines joined with line breaks), the sorted, non-overlapping (start, end)
+    offsets to mask in it, and the entities ("PERSON", "DATE", "PHONE" and "ADDRESS" lists).
+    """
+    # Open file if path exists or split input text into lines.
+    if read_file and os.path.exists(text_input):
+        with open(text_input, 'r', encoding='utf-8') as f:
+            lines_in_text = f.readlines()
+    else:
+        lines_in_text = text_input.splitlines()
+
+    full_text = "\n".join(lines_in_text)
+
+    sources = {} if spans is not None else None
+    if entities is None:
+        entities = detect_entities(full_text, args, ner_entities=ner_entities, sources=sources)
+
     # Process topics for redaction if specified.
-    if topics is not None:
-        from pandas.core.common import flatten
-        topics = list(flatten([get_related_words(topic) for topic in topics]))
+    topics = expand_topics(topics, cache_path=getattr(args, "concept_cache", None))
+
+    span_records = [] if spans is not None else None
+    text, mask = redaction_mask_spans(lines_in_text, entities, args, topics=topics, span_records=span_records, sources=sources,
+                                      text=full_text)
+    if spans is not None:
+        spans.extend(line_spans_to_document(span_records, joined_line_offsets(lines_in_text)))
+    return text, mask, entities
+
+# Function to tell whether a document should be redacted in shards.
+def use_shards(text, args):
+    """
+    Tells whether redact_sensitive_info_sharded should handle a document: --shards is above 1,
+    the document is longer than one shard, and this is not a daemonic pool worker (which
+    cannot start processes of its own).
+
+    Parameters:
+    text (str): The document.
+    args (Namespace): Arguments with the shard settings.
+    Returns:
+    bool: True if the document should be sharded.
+    """
+    return (getattr(args, "shards", 1) > 1 and len(text) > getattr(args, "shard_chars", SHARD_CHARS)
+            and not multiprocessing.current_process().daemon)
+
+# Function to detect the entities of one shard in a worker process.
+def detect_shard(task):
+    """
+    Runs the regex, title, NER and gazetteer detectors over one shard.
+
+    Regex, titles and the gazetteer scan the shard together with its context and keep the matches
+    that start in the shard's own text, so matches crossing into the next shard are found whole.
+    NER runs over the shard's own text.
+
+    Parameters:
+    task (tuple): The shard text followed by its context, the length of the shard's own text,
+        the document offset of the shard, and the command-line arguments.
+    Returns:
+    dict: "regex" (entity types mapped to (text, start, end) matches), "titles" and "places" (lists of
+    (text, start, end) matches), all with document offsets; "ner" (the NER entities); and the regex
+    "limits" and "prefilter" counters incremented in this process.
+    """
+    text, own_chars, offset, args = task
+    get_regex_limit_counters(reset=True)
+    get_prefilter_counters(reset=True)
+    if getattr(args, "hardened_regex", False):
+        regex_results = extract_using_regex_hardened(text, max_chars=getattr(args, "regex_max_chars", HARDENED_MAX_CHARS),
+                                                     time_limit=getattr(args, "regex_time_limit", HARDENED_TIME_LIMIT),
+                                                     with_spans=True)
+    else:
+        regex_results = extract_using_regex(text, with_spans=True)
+    return {
+        "regex": {key: owned_matches(matches, own_chars, offset) for key, matches in regex_results.items()},
+        "titles": owned_matches(extract_titles_and_names(text, with_spans=True), own_chars, offset),
+        "places": owned_matches(find_places(text, with_spans=True), own_chars, offset),
+        "ner": extract_ner_entities_for_args([text[:own_chars]], args, batch_size=1)[0],
+        "limits": get_regex_limit_counters(reset=True),
+        "prefilter": get_prefilter_counters(reset=True),
+    }
+
+# Function to redact the lines of one shard in a worker process.
+def redact_shard(task):
+    """
+    Redacts one shard's lines with the entities detected over the whole document.
+
+    Parameters:
+    task (tuple): The shard's lines, the entities, the command-line arguments, the expanded topics,
+        whether to record spans, and the detectors of the entities.
+    Returns:
+    tuple: The redacted lines, and the (line_index, start, end, type, detector) span records
+    relative to the shard (None when spans are not recorded).
+    """
+    lines, entities, args, topics, indexing, sources = task
+    span_records = [] if indexing else None
+    redacted_lines = redact_lines(lines, entities, args, topics=topics, span_records=span_records, sources=sources)
+    return redacted_lines, span_records
+
+# Function to redact a large document in shards on several processes.
+def redact_sensitive_info_sharded(text_input, args, topics=None, spans=None):
+    """
+    Redacts a large document like redact_sensitive_info, using args.shards processes.
+
+    The document is cut into paragraph-aligned shards (see plan_shards). Every shard is run through
+    the detectors in parallel (detect_shard), the matches are merged into one entity set for the whole
+    document as a single scan would have found them, and the shards are then redacted in parallel with
+    that set (redact_shard), so an entity found in one shard is masked in every other.
+
+    The output is the same as redact_sensitive_info's except where NER, which only sees one shard at a
+    time, labels text near a shard boundary differently, where a regex or title match is longer than
+    the overlap, where a topic sentence continues past a shard that had to be cut without a paragraph
+    break, and in --hardened-regex mode, whose limits then apply per shard.
+
+    Parameters:
+    text_input (str): The document text.
+    args (Namespace): Arguments specifying what to redact and the shard settings.
+    topics (list, optional): List of topics for additional redaction. Defaults to None.
+    spans (list, optional): If given, receives the detected spans as in redact_sensitive_info. Defaults to None.
+    Returns:
+    tuple: A tuple containing the redacted text, and lists of found names, dates, phones, and addresses.
+    """
+    lines_in_text = text_input.splitlines()
+    line_offsets = joined_line_offsets(lines_in_text)
+    shards = plan_shards(lines_in_text, getattr(args, "shard_chars", SHARD_CHARS),
+                         getattr(args, "shard_overlap_chars", SHARD_OVERLAP_CHARS))
+    logging.info("Redacting %s characters in %s shards on %s processes.", len(text_input), len(shards), args.shards)
+
+    detection_tasks = (("\n".join(lines_in_text[start:context_end]), len("\n".join(lines_in_text[start:end])),
+                        line_offsets[start], args) for start, end, context_end in shards)
+    with multiprocessing.Pool(processes=args.shards, initializer=init_worker, initargs=(getattr(args, "places", None) or (),)) as pool:
+        detection_start = time.perf_counter()
+        regex_matches, titles, places = {key: [] for key in ENTITY_PATTERNS}, [], []
+        ner_entities = {"PERSON": set(), "GPE": set()}
+        for result in pool.imap(detect_shard, detection_tasks):
+            for key, matches in result["regex"].items():
+                regex_matches[key].extend(matches)
+            titles.extend(result["titles"])
+            places.extend(result["places"])
+            for label, found in result["ner"].items():
+                ner_entities[label].update(found)
+            for key, value in result["limits"].items():
+                REGEX_LIMIT_COUNTERS[key] += value
+            for key, value in result["prefilter"].items():
+                PREFILTER_COUNTERS[key] += value
+
+        # Merge the shards' matches in document order, as one scan over the whole text would report them.
+        regex_results = {key: merge_scan_matches(matches) for key, matches in regex_matches.items()}
+        names_from_titles = merge_scan_matches(titles)
+        gazetteer_places = [place for place, _, _ in sorted(places, key=lambda match: match[1:])]
+        sources = {} if spans is not None else None
+        entities = combine_detections(regex_results, names_from_titles, ner_entities, gazetteer_places, sources=sources,
+                                      registry_entities=find_registered_entities(text_input))
+        register_entities(entities)
+        add_stage_time("ner", time.perf_counter() - detection_start)
+
+        topics = expand_topics(topics, cache_path=getattr(args, "concept_cache", None))
+
+        redaction_start = time.perf_counter()
+        redaction_tasks = ((lines_in_text[start:end], entities, args, topics, spans is not None, sources)
+                           for start, end, _ in shards)
+        redacted_text_lines, span_records = [], []
+        for (start, _, _), (shard_lines, shard_records) in zip(shards, pool.imap(redact_shard, redaction_tasks)):
+            redacted_text_lines.extend(shard_lines)
+            if shard_records:
+                span_records.extend((line_index + start, *record) for line_index, *record in shard_records)
+        add_stage_time("redaction", time.perf_counter() - redaction_start)
+
+    if spans is not None:
+        spans.extend(line_spans_to_document(span_records, line_offsets))
+
+    return "\n".join(redacted_text_lines), entities["PERSON"], entities["DATE"], entities["PHONE"], entities["ADDRESS"]
+
+# Number of characters read per chunk in streaming mode.
+STREAM_CHUNK_CHARS = 1_000_000
+# Number of trailing lines carried over from one chunk into the next in streaming mode.
+STREAM_OVERLAP_LINES = 5
+# Maximum number of distinct entities remembered across chunks in streaming mode.
+STREAM_MAX_KNOWN_ENTITIES = 100_000
 
-    # Apply redaction to each line in the text.
-    redacted_text_lines = []
-    for line in lines_in_text:
+# Function to read a file as line segments of bounded size.
+def iter_line_segments(f, max_chars):
+    """
+    Reads an open text file line by line without ever holding more than max_chars of one line.
+
+    Args:
+        f (file): The open text file.
+        max_chars (int): The maximum size of a segment; longer lines are split into several segments.
+
+    Yields:
+        tuple: The segment text without its newline, and True if the segment ends a line.
+    """
+    while True:
+        segment = f.readline(max_chars)
+        if not segment:
+            return
+        if segment.endswith('\n'):
+            yield segment[:-1], True
+        else:
+            yield segment, False
+
+# Function to group line segments into chunks that end at sentence or line boundaries.
+def iter_chunks(f, chunk_chars):
+    """
+    Groups the segments of an open text file into chunks of roughly chunk_chars characters.
+
+    Once a chunk is large enough it is cut after the next line that ends a sentence (or is
+    blank). If no such line comes before the chunk reaches twice its size, it is cut at the
+    next line boundary, and a single line longer than that is cut wherever it has to be.
+
+    Args:
+        f (file): The open text file.
+        chunk_chars (int): The target chunk size in characters.
+
+    Yields:
+        list of tuple: The (segment, ends_line) pairs of each chunk.
+    """
+    chunk, size = [], 0
+    for segment, ends_line in iter_line_segments(f, chunk_chars):
+        chunk.append((segment, ends_line))
+        size += len(segment) + 1
+        if size < chunk_chars:
+            continue
+        ends_sentence = ends_line and (not segment.strip() or segment.rstrip().endswith(('.', '!', '?')))
+        if ends_sentence or (ends_line and size >= 2 * chunk_chars) or size >= 3 * chunk_chars:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+# Function to redact a large file chunk by chunk with bounded memory.
+def redact_file_streaming(file_path, output_path, args, topics=None, chunk_chars=STREAM_CHUNK_CHARS,
+                          overlap_lines=STREAM_OVERLAP_LINES, max_known_entities=STREAM_MAX_KNOWN_ENTITIES,
+                          span_index_path=None):
+    """
+    Redacts a file without loading it into memory and writes the output incrementally.
+
+    The file is read in chunks (see iter_chunks). Entities are detected on each chunk plus the
+    last overlap_lines lines of the previous chunk, which are held back and written with the
+    next chunk. Each window (the carried lines and the chunk) is masked with the entities found
+    in it, and the carried lines keep the spans found for them in the previous window too, so an
+    address or topic sentence crossing the split is masked on both sides. Entities found in
+    earlier chunks are remembered (up to max_known_entities) and also masked in later chunks.
+    Entities that first appear in a later chunk cannot be masked in text that has already been
+    written. The output has the same line layout as redact_sensitive_info.
+
+    Parameters:
+    file_path (str): The file to redact.
+    output_path (str): The file the redacted text is written to.
+    args (Namespace): Arguments specifying which types of information to redact.
+    topics (list, optional): List of topics for additional redaction. Defaults to None.
+    chunk_chars (int): Target number of characters per chunk.
+    overlap_lines (int): Number of lines carried over from one chunk into the next.
+    max_known_entities (int): Maximum number of distinct entities remembered across chunks. It does
+        not limit what is masked in the window an entity is found in.
+    span_index_path (str, optional): If given, the span index of the output is written to this file as
+        the chunks are written. Defaults to None.
+    Returns:
+    dict: "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to the lists of distinct entities remembered.
+    """
+    topics = expand_topics(topics, cache_path=getattr(args, "concept_cache", None))
+    known_entities = {"PERSON": set(), "DATE": set(), "PHONE": set(), "ADDRESS": set()}
+    known_count = 0
+    sources = {} if span_index_path else None
+    carry, carry_masks, carry_records = [], {}, []
+    pending_newline = False
+    written = 0
+
+    # Function to find the spans to mask on each segment of a window, with the window as context.
+    def window_masks(segments, entities, window_sources):
+        lines = [segment for segment, _ in segments]
+        span_records = [] if span_index_path else None
+        _, mask = redaction_mask_spans(lines, entities, args, topics=topics, span_records=span_records, sources=window_sources)
+        return spans_by_line(mask, joined_line_offsets(lines), lines), span_records or []
+
+    # Function to write masked segments, keeping the "\n".join layout of the whole-file path.
+    def write_segments(out, segments, masks, span_records):
+        nonlocal pending_newline, written
+        with stage_timer("redaction"):
+            redacted = [mask_spans(segment, merge_spans(masks.get(index, []))) for index, (segment, _) in enumerate(segments)]
+        with stage_timer("write"):
+            segment_offsets = []
+            for text, (_, ends_line) in zip(redacted, segments):
+                if pending_newline:
+                    out.write('\n')
+                    written += 1
+                segment_offsets.append(written)
+                out.write(text)
+                written += len(text)
+                pending_newline = ends_line
+            if span_records:
+                write_spans(span_out, line_spans_to_document(sorted(set(span_records)), segment_offsets))
+
+    os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open_text(file_path))
+        out = stack.enter_context(open_text(output_path, 'w'))
+        span_out = stack.enter_context(open(span_index_path, 'w', encoding='utf-8')) if span_index_path else None
+        chunks = iter_chunks(f, chunk_chars)
+        while True:
+            with stage_timer("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            window = carry + chunk
+            window_text = ''.join(segment + ('\n' if ends_line else '') for segment, ends_line in window)
+            window_sources = {} if sources is not None else None
+            # The window is masked with everything found in it; only the entities remembered for
+            # later chunks are capped, so the cap never leaves an entity unmasked where it was found.
+            window_entities = {entity_type: set(found) for entity_type, found in known_entities.items()}
+            for entity_type, found in detect_entities(window_text, args, sources=window_sources).items():
+                window_entities[entity_type].update(found)
+                for entity in found:
+                    if entity not in known_entities[entity_type] and known_count < max_known_entities:
+                        known_entities[entity_type].add(entity)
+                        known_count += 1
+                        if sources is not None:
+                            sources[(entity_type, entity)] = window_sources.get((entity_type, entity), "unknown")
+                        if known_count == max_known_entities:
+                            logging.warning("Streaming redaction of '%s' reached %s known entities; later ones are only "
+                                            "masked in the chunk they are found in.", file_path, max_known_entities)
+            masks, span_records = window_masks(window, window_entities,
+                                               {**window_sources, **sources} if sources is not None else None)
+            # The carried segments keep the spans found with the previous window as context, so an
+            # address or sentence crossing the previous split stays masked on both sides.
+            for index, spans in carry_masks.items():
+                masks.setdefault(index, []).extend(spans)
+            span_records.extend(carry_records)
+
+            split = max(len(window) - overlap_lines, 0)
+            write_segments(out, window[:split], masks, [record for record in span_records if record[0] < split])
+            carry = window[split:]
+            carry_masks = {index - split: spans for index, spans in masks.items() if index >= split}
+            carry_records = [(record[0] - split, *record[1:]) for record in span_records if record[0] >= split]
+        write_segments(out, carry, carry_masks, carry_records)
+
+    return {entity_type: list(found) for entity_type, found in known_entities.items()}
+
+# Function to redact the cells of one column of a batch of rows.
+def redact_cells(cells, args, text_field=False, topic_matcher=None):
+    """
+    Detects and masks the entities of each cell of a column, running each detector once over
+    the column's cells joined together (see join_cells) instead of once per cell.
+
+    Every cell goes through the regex detectors. The cells of a free-text field (--text-fields)
+    also go through the title, gazetteer and pyap detectors, spaCy NER in one nlp.pipe call and
+    topic redaction. Each cell is masked only with the entities found in it, so a cell never
+    grows or shrinks and delimiters are never masked.
+
+    Parameters:
+    cells (list of str): The string cells of the column, in row order.
+    args (Namespace): Arguments specifying which types of information to redact.
+    text_field (bool, optional): True for a free-text field. Defaults to False.
+    topic_matcher (re.Pattern, optional): The compiled topic matcher applied to free-text fields. Defaults to None.
+    Returns:
+    list of tuple: For each cell, the masked cell and its entities ("PERSON", "DATE", "PHONE" and "ADDRESS" lists).
+    """
+    text, offsets = join_cells(cells)
+    with stage_timer("regex"):
+        regex_results = [{key: [] for key in ENTITY_PATTERNS} for _ in cells]
+        for key, found in extract_using_regex(text, with_spans=True).items():
+            for index, cell_spans in enumerate(split_cell_spans(((start, end, entity) for entity, start, end in found), offsets, cells)):
+                regex_results[index][key] = [entity for _, _, entity in cell_spans]
+
+    names_from_titles, places, address_spans = [[] for _ in cells], [[] for _ in cells], [[] for _ in cells]
+    ner_entities = [{"PERSON": [], "GPE": []} for _ in cells]
+    if text_field:
+        with stage_timer("titles"):
+            titles = extract_titles_and_names(text, with_spans=True)
+            names_from_titles = [[name for _, _, name in cell_spans] for cell_spans in
+                                 split_cell_spans(((start, end, name) for name, start, end in titles), offsets, cells)]
+        with stage_timer("ner"):
+            ner_entities = extract_ner_entities_for_args(cells, args, batch_size=len(cells),
+                                                         n_process=getattr(args, "n_process", 1) or 1)
+        with stage_timer("gazetteer"):
+            places = [[place for _, _, place in cell_spans] for cell_spans in
+                      split_cell_spans(((start, end, place) for place, start, end in find_places(text, with_spans=True)), offsets, cells)]
         if args.address:
-            pyap_addresses = find_addresses_with_pyap(line)
-            if pyap_addresses:
-                for address in pyap_addresses:
-                    line = line.replace(address, '█' * len(address))
-
-        redacted_line = apply_redaction(
-            line,
-            {"PERSON": combined_names, "DATE": combined_dates, "PHONE": combined_phones, "ADDRESS": combined_addresses},
-            redact_names=args.names,
-            redact_dates=args.dates,
-            redact_phones=args.phones,
-            redact_address=args.address,
-            redact_topics=topics
-        )
-        redacted_text_lines.append(redacted_line)
-
-    return "\n".join(redacted_text_lines), combined_names, combined_dates, combined_phones, combined_addresses
+            with stage_timer("pyap"):
+                spans = find_address_spans(text, block_chars=getattr(args, "pyap_block_chars", PYAP_BLOCK_CHARS))
+                address_spans = split_cell_spans(((start, end, None) for start, end in spans), offsets, cells)
+
+    settings = {"PERSON": args.names, "DATE": args.dates, "PHONE": args.phones, "ADDRESS": args.address}
+    results = []
+    with stage_timer("redaction"):
+        for index, cell in enumerate(cells):
+            entities = combine_detections(regex_results[index], names_from_titles[index], ner_entities[index], places[index])
+            terms = [entity for entity_type, found in entities.items() if settings[entity_type] for entity in found]
+            mask = merge_spans(term_spans(cell, terms) + [(start, end) for start, end, _ in address_spans[index]])
+            if text_field and topic_matcher is not None:
+                mask = merge_spans(mask + topic_mask_spans(mask_spans(cell, mask), topic_matcher))
+            results.append((mask_spans(cell, split_at_line_breaks(cell, mask)), entities))
+    return results
+
+# Function to redact a CSV or JSONL file row by row.
+def redact_structured_file(file_path, output_path, args, structured, topics=None):
+    """
+    Redacts a CSV or JSONL file a batch of rows at a time (--structured-batch-rows), writing
+    each batch as soon as it is redacted, so memory is bounded by the batch size and the work
+    grows with the number of rows.
+
+    The output keeps the input's schema: the CSV header and the field order, the number of
+    cells of every row and all non-string JSON values are written unchanged, and only string
+    cells are masked (see redact_cells). Strings nested in JSON objects and lists are detected too,
+    as columns named by their path (e.g. "contact.name" or "tags[0]"). Only the fields named with
+    --text-fields go through NER (see is_text_field).
+
+    Parameters:
+    file_path (str): The CSV or JSONL file (".gz" inputs are decompressed).
+    output_path (str): Where the redacted rows are written, in the same format.
+    args (Namespace): Arguments specifying which types of information to redact.
+    structured (str): "csv" or "jsonl".
+    topics (list, optional): List of topics redacted in free-text fields. Defaults to None.
+    Returns:
+    dict: "PERSON", "DATE", "PHONE" and "ADDRESS" mapped to the distinct entities found in the file.
+    """
+    text_fields = set(getattr(args, "text_fields", None) or ())
+    batch_rows = getattr(args, "structured_batch_rows", STRUCTURED_BATCH_ROWS)
+    topics = expand_topics(topics, cache_path=getattr(args, "concept_cache", None))
+    topic_matcher = compile_topic_matcher(tuple(topics), getattr(args, "concept_word_boundary", False)) if topics else None
+    found_entities = {entity_type: set() for entity_type in ("PERSON", "DATE", "PHONE", "ADDRESS")}
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open_text(file_path, 'r', newline='') as f, open_text(output_path, 'w', newline='') as out:
+        fields, rows = read_structured_rows(f, structured)
+        write_row = structured_row_writer(out, structured, fields)
+        for batch in iter_row_batches(rows, batch_rows):
+            for key, field in column_keys(batch, fields, structured):
+                positions, cells = column_cells(batch, key)
+                if not cells:
+                    continue
+                for position, (cell, entities) in zip(positions, redact_cells(cells, args, is_text_field(field, text_fields), topic_matcher)):
+                    set_cell(batch[position], key, cell)
+                    for entity_type, found in entities.items():
+                        found_entities[entity_type].update(found)
+            with stage_timer("write"):
+                for row in batch:
+                    write_row(row)
+
+    return {entity_type: list(found) for entity_type, found in found_entities.items()}
 
 # Function to extract names based on titles from the text.
-def extract_titles_and_names(text):
+def extract_titles_and_names(text, with_spans=False):
     """
     Extracts titles and names from the given text.
     This function searches for patterns in the text that match common titles 
@@ -215,6 +850,8 @@ def extract_titles_and_names(text):
     are then extracted and returned as a list.
     Args:
         text (str): The input text from which to extract titles and names.
+        with_spans (bool): If True, each name is returned with the (start, end) offsets of the whole
+            title match, as a (name, start, end) tuple. Defaults to False.
     Returns:
         list: A list of names extracted from the text, excluding the titles.
     """
@@ -225,12 +862,643 @@ def extract_titles_and_names(text):
         re.IGNORECASE
     )
     
-    title_name_matches = title_name_pattern.findall(text)
+    title_name_matches = list(title_name_pattern.finditer(text))
     
-    names_from_titles = [' '.join(filter(None, match[1:])).strip() for match in title_name_matches]
-    logging.debug(f"Extracted names from titles: {names_from_titles}")
+    names_from_titles = [' '.join(filter(None, match.groups()[1:])).strip() for match in title_name_matches]
+    if with_spans:
+        names_from_titles = [(name, match.start(), match.end()) for name, match in zip(names_from_titles, title_name_matches)]
+    logging.debug("Extracted names from titles: %s", names_from_titles)
     return names_from_titles
 
+# Function to read a text file.
+def read_text_file(file_path):
+    """
+    Reads and returns the full content of a UTF-8 text file, decompressing it if its name ends with ".gz".
+
+    Args:
+        file_path (str): Path of the file to read.
+
+    Returns:
+        str: The file content.
+    """
+    with open_text(file_path) as f:
+        return f.read()
+
+# Function to name the outputs of an input file.
+def output_paths(index, file_path, args):
+    """
+    Returns where the outputs of an input file are written.
+
+    By default the outputs are named after the file name and the stats file after the file's
+    position in the input list (sample_stats<index>.txt). With --stable-names they are named
+    after the file's path relative to the input pattern's directory (<path>.censored and
+    <path>.stats.txt, in matching subdirectories), so they do not change when other files
+    are added or removed. With --gzip-output the ".censored" output is gzip-compressed.
+
+    Args:
+        index (int): 1-based position of the file in the input list.
+        file_path (str): Path of the input file.
+        args (Namespace): Command-line arguments with the output directory and naming options.
+
+    Returns:
+        tuple: The ".censored" path, the stats path (None with --stats-aggregate) and the span
+        index path (None without --span-index).
+    """
+    stable = getattr(args, "stable_names", False)
+    stem = output_stem(file_path, discovery_root(args.input) if stable else None)
+    output_path = os.path.join(args.output, stem + ".censored" + (GZIP_SUFFIX if getattr(args, "gzip_output", False) else ""))
+    if getattr(args, "stats_aggregate", None):
+        stats_file_path = None
+    elif stable:
+        stats_file_path = os.path.join(args.output, stem + ".stats.txt")
+    else:
+        stats_file_path = os.path.join(args.output, f"sample_stats{index}.txt")
+    span_index_path = os.path.join(args.output, stem + SPAN_INDEX_SUFFIX) if getattr(args, "span_index", False) else None
+    return output_path, stats_file_path, span_index_path
+
+# Function to redact a single file and write its outputs.
+def process_file(index, file_path, args, original_text=None, ner_entities=None, previous_entry=None, content_hash=None):
+    """
+    Redacts one input file and writes its ".censored" output and stats file.
+
+    In incremental mode (args.incremental), a file whose content, detectors and settings
+    match its manifest entry from the previous run is skipped. If only its position in the
+    input list changed, just its sample_stats<index>.txt file is written again, from the
+    statistics kept in the manifest. Otherwise the entities cached for the same content are
+    reused, so only the masking runs again. CSV and JSONL inputs
+    (see --structured) are redacted row by row with redact_structured_file.
+
+    Outputs are named by output_paths and written with write_output, so they go through the
+    writer thread when main has started one.
+
+    Args:
+        index (int): 1-based position of the file in the input list, used to name the stats file.
+        file_path (str): Path of the file to redact.
+        args (Namespace): Command-line arguments with the output directory and redaction options.
+        original_text (str, optional): The file content, if it has already been read. Defaults to None.
+        ner_entities (dict, optional): NER results already computed for the file. Defaults to None.
+        previous_entry (dict, optional): The file's manifest entry from the previous run. Defaults to None.
+        content_hash (str, optional): The file's file_hash, if the caller has already computed it. Defaults to None.
+
+    Returns:
+        str or None: The formatted statistics for the file. For a file skipped as unchanged, the
+        statistics recorded in its manifest entry (None if the entry has none).
+    """
+    file_name = os.path.basename(file_path)
+    output_path, stats_file_path, span_index_path = output_paths(index, file_path, args)
+    # With stable names the outputs do not depend on the position, so it is left out of the manifest.
+    position = None if getattr(args, "stable_names", False) else index
+
+    incremental = getattr(args, "incremental", False)
+    structured = structured_format(file_path, getattr(args, "structured", "text"))
+    cached_entities = None
+    if incremental:
+        if content_hash is None:
+            content_hash = file_hash(file_path)
+        detectors, settings = detector_versions(args), redaction_settings(args)
+        unchanged = is_unchanged(previous_entry, content_hash, detectors, settings)
+        if unchanged and stats_file_path and stats_file_path not in previous_entry.get("outputs", []):
+            # The file only moved in the input list: write its statistics under the new
+            # sample_stats name, or process it again if the entry predates stored statistics.
+            unchanged = "stats" in previous_entry
+            if unchanged:
+                write_output(stats_file_path, previous_entry["stats"])
+                PENDING_MANIFEST_ENTRIES.append((os.path.abspath(file_path),
+                                                 manifest_entry(position, content_hash, detectors, settings,
+                                                                [path for path in (output_path, stats_file_path, span_index_path) if path],
+                                                                stats=previous_entry["stats"])))
+        if unchanged:
+            logging.info("Skipped unchanged file '%s'.", file_name)
+            return previous_entry.get("stats")
+        if not getattr(args, "stream", False) and structured == "text":
+            cached_entities = load_cached_entities(args.output, content_hash, detectors)
+
+    begin_file_metrics(file_name)
+
+    if structured != "text":
+        # Redact CSV and JSONL files cell by cell, a batch of rows at a time.
+        entities = redact_structured_file(file_path, output_path, args, structured, topics=args.concept)
+        names, dates, phones, addresses = entities["PERSON"], entities["DATE"], entities["PHONE"], entities["ADDRESS"]
+    elif getattr(args, "stream", False):
+        # Stream the file through the redactor in chunks instead of loading it whole.
+        entities = redact_file_streaming(file_path, output_path, args, topics=args.concept,
+                                         chunk_chars=getattr(args, "chunk_chars", STREAM_CHUNK_CHARS),
+                                         span_index_path=span_index_path)
+        names, dates, phones, addresses = entities["PERSON"], entities["DATE"], entities["PHONE"], entities["ADDRESS"]
+    else:
+        if original_text is None:
+            with stage_timer("read"):
+                original_text = read_text_file(file_path)
+
+        spans = [] if span_index_path else None
+        if ner_entities is None and cached_entities is None and use_shards(original_text, args):
+            # Detect and redact a document too large for one process in parallel shards.
+            redacted_content, names, dates, phones, addresses = redact_sensitive_info_sharded(original_text, args, topics=args.concept,
+                                                                                              spans=spans)
+            mask = None
+        else:
+            # The output is masked while it is written, so the redacted text is never built as a whole.
+            redacted_content, mask, entities = redact_document(original_text, args, topics=args.concept, ner_entities=ner_entities,
+                                                               entities=cached_entities, spans=spans)
+            names, dates, phones, addresses = entities["PERSON"], entities["DATE"], entities["PHONE"], entities["ADDRESS"]
+        if incremental and cached_entities is None:
+            store_cached_entities(args.output, content_hash, detectors,
+                                  {"PERSON": names, "DATE": dates, "PHONE": phones, "ADDRESS": addresses})
+
+        with stage_timer("write"):
+            write_output(output_path, redacted_content, spans=mask)
+            if span_index_path:
+                span_lines = io.StringIO()
+                write_spans(span_lines, spans)
+                write_output(span_index_path, span_lines.getvalue())
+
+    logging.info("File '%s' processed and saved to '%s'", file_name, args.output)
+
+    stats_output = format_entity_stats(file_name, args, names, dates, phones, addresses)
+    if stats_file_path:
+        with stage_timer("write"):
+            write_output(stats_file_path, stats_output)
+    end_file_metrics()
+    if incremental:
+        PENDING_MANIFEST_ENTRIES.append((os.path.abspath(file_path),
+                                         manifest_entry(position, content_hash, detectors, settings,
+                                                        [path for path in (output_path, stats_file_path, span_index_path) if path],
+                                                        stats=stats_output)))
+
+    # if args.stats == "stderr":
+    #     sys.stderr.write("Printing stats to stderr\n")
+    #     sys.stderr.write(stats_output)
+    # elif args.stats == "stdout":
+    #     sys.stdout.write("Printing stats to stdout\n")
+    #     sys.stdout.write(stats_output)
+    return stats_output
+
+# Function to read the entity registry settings from the arguments.
+def registry_settings(args):
+    """
+    Returns the (size limit, store path) the entity registry is enabled with, or None when
+    neither --entity-registry nor --entity-registry-store is given.
+    """
+    store_path = getattr(args, "entity_registry_store", None)
+    if not (getattr(args, "entity_registry", False) or store_path):
+        return None
+    return getattr(args, "entity_registry_size", REGISTRY_MAX_ENTITIES), store_path
+
+# Function run once in every worker process of the pool.
+def init_worker(place_files=(), registry=None):
+    """
+    Prepares a worker process: suppresses warnings, loads the spaCy model once and builds
+    the gazetteer (with any user-supplied place lists), so every file the worker handles
+    reuses the same pipeline and index.
+
+    Args:
+        place_files (iterable of str): Paths of place lists given with --places.
+        registry (tuple, optional): The size limit and store path of the entity registry, which the
+            worker starts from the store. Defaults to None (no registry).
+    """
+    warnings.filterwarnings("ignore")
+    get_nlp()
+    for place_file in place_files:
+        extend_gazetteer(load_place_list(place_file))
+    if registry is not None:
+        enable_entity_registry(*registry)
+
+# Function to process one queued file inside a worker process.
+def run_file_task(task):
+    """
+    Processes one (index, file_path, args, previous_entry) task and reports the outcome.
+
+    Any exception is caught and returned instead of raised, so a bad file does not
+    stop the rest of the batch.
+
+    Args:
+        task (tuple): The 1-based file index, the file path, the command-line arguments, and the
+                      file's manifest entry from the previous run (None outside incremental mode).
+
+    Returns:
+        dict: The file "path"; the "error" message (None on success); the regex "limits" and
+              "prefilter" counters incremented while processing the file; the entities it added to the
+              worker's entity "registry" (see take_registry_updates); the file's stage timings
+              ("metrics") and new manifest "entry" (both None on failure or when the file was
+              skipped, except that a skipped file which moved in the input list has an entry);
+              and its formatted "stats" (None on failure).
+    """
+    index, file_path, args, previous_entry = task
+    get_regex_limit_counters(reset=True)
+    get_prefilter_counters(reset=True)
+    result = {"path": file_path, "error": None, "metrics": None, "entry": None, "stats": None}
+    try:
+        result["stats"] = process_file(index, file_path, args, previous_entry=previous_entry)
+    except Exception as error:
+        logging.error("Failed to process '%s': %s", file_path, error)
+        end_file_metrics()
+        COLLECTED_FILE_METRICS.clear()
+        result["error"] = f"{type(error).__name__}: {error}"
+    else:
+        result["metrics"] = COLLECTED_FILE_METRICS.pop() if COLLECTED_FILE_METRICS else None
+        result["entry"] = PENDING_MANIFEST_ENTRIES.pop() if PENDING_MANIFEST_ENTRIES else None
+    result["limits"] = get_regex_limit_counters(reset=True)
+    result["prefilter"] = get_prefilter_counters(reset=True)
+    result["registry"] = take_registry_updates()
+    return result
+
+# Function to report how often the hardened regex extractor hit its limits.
+def report_regex_limits(counters):
+    """
+    Logs and prints to stderr how many documents hit a regex size or time limit.
+
+    Args:
+        counters (dict): Limit kind (e.g. "time_limit") mapped to the number of documents that hit it.
+    """
+    for limit, count in counters.items():
+        if count:
+            logging.warning("Regex %s hit on %s document(s).", limit.replace('_', ' '), count)
+            sys.stderr.write(f"Regex {limit.replace('_', ' ')} hit on {count} document(s)\n")
+
+# Function to report what the prefilter cascade kept away from NER.
+def report_prefilter(args, counters):
+    """
+    Logs and prints to stderr how many paragraphs each prefilter stage accepted, how many
+    reached NER, and in recall-check mode how many NER entities the cascade would have missed.
+
+    Args:
+        args (Namespace): Command-line arguments (prefilter and prefilter_recall_check).
+        counters (dict): The counters returned by get_prefilter_counters.
+    """
+    if getattr(args, "prefilter", None) is None or not counters["paragraphs"]:
+        return
+    lines = [f"Prefilter sent {counters['ner_paragraphs']} of {counters['paragraphs']} paragraph(s) to NER, "
+             f"skipping {counters['skipped_chars']} character(s)"]
+    for stage in ordered_stages(args.prefilter):
+        checked, hits = counters[f"{stage}_checked"], counters[f"{stage}_hits"]
+        lines.append(f"Prefilter stage {stage}: {hits} of {checked} paragraph(s) accepted ({hits / checked if checked else 0:.1%})")
+    if getattr(args, "prefilter_recall_check", False):
+        total, missed = counters["recall_entities"], counters["recall_missed"]
+        lines.append(f"Prefilter recall: {total - missed} of {total} NER entities kept ({(total - missed) / total if total else 1:.1%})")
+    for line in lines:
+        logging.info(line)
+        sys.stderr.write(line + "\n")
+
+# Function to write the per-stage timings when --metrics is given.
+def report_metrics(args, records):
+    """
+    Writes the per-file stage timings to args.metrics, if it is set.
+
+    Args:
+        args (Namespace): Command-line arguments with the metrics path and format.
+        records (list of dict): Records returned by end_file_metrics.
+    """
+    metrics_path = getattr(args, "metrics", None)
+    if metrics_path:
+        write_metrics(metrics_path, records, getattr(args, "metrics_format", "json"))
+
+# Function to tell whether a file still needs entity detection in incremental mode.
+def needs_detection(index, file_path, args, previous_entry, content_hash=None):
+    """
+    Returns False if the file will be skipped as unchanged or its entities are cached,
+    so batched NER is only run for the files that need it.
+
+    Args:
+        index (int): 1-based position of the file in the input list.
+        file_path (str): Path of the file.
+        args (Namespace): Command-line arguments.
+        previous_entry (dict or None): The file's manifest entry from the previous run.
+        content_hash (str, optional): The file's file_hash, if the caller has already computed it. Defaults to None.
+
+    Returns:
+        bool: Whether entities have to be detected for the file.
+    """
+    if not getattr(args, "incremental", False):
+        return True
+    content_hash, detectors = content_hash or file_hash(file_path), detector_versions(args)
+    if is_unchanged(previous_entry, content_hash, detectors, redaction_settings(args)):
+        return False
+    return load_cached_entities(args.output, content_hash, detectors) is None
+
+# Function to record the files processed in incremental mode.
+def update_manifest(args, manifest, entries):
+    """
+    Adds the new manifest entries and writes the manifest, if incremental mode is on.
+
+    Args:
+        args (Namespace): Command-line arguments with the output directory.
+        manifest (dict): The manifest read at the start of the run.
+        entries (list of tuple): (absolute input path, manifest entry) pairs of the files processed.
+    """
+    if getattr(args, "incremental", False):
+        manifest.update(entries)
+        save_manifest(args.output, manifest)
+
+# Flags a service request may set for itself; the others come from the service's command line.
+SERVICE_REQUEST_FLAGS = ("names", "dates", "phones", "address", "concept")
+
+# Function to build the arguments of one service request.
+def request_args(args, request):
+    """
+    Returns a copy of the service arguments with the request's own flags applied.
+
+    Args:
+        args (Namespace): The command-line arguments the service was started with.
+        request (dict): The request; "names", "dates", "phones" and "address" are booleans and
+            "concept" is a list of topics (or null). Missing flags keep the command-line value.
+
+    Returns:
+        Namespace: The arguments for the request.
+
+    Raises:
+        ValueError: If a flag has the wrong type.
+    """
+    values = vars(args).copy()
+    for flag in SERVICE_REQUEST_FLAGS:
+        if flag not in request:
+            continue
+        value = request[flag]
+        if flag == "concept":
+            if value is not None and not (isinstance(value, list) and all(isinstance(topic, str) for topic in value)):
+                raise ValueError("'concept' must be a list of strings or null")
+        elif not isinstance(value, bool):
+            raise ValueError(f"'{flag}' must be true or false")
+        values[flag] = value
+    return argparse.Namespace(**values)
+
+# Function to count the entities of the enabled types.
+def entity_counts(entities, args):
+    """
+    Returns the number of entities found of each type enabled in args, e.g. {"PERSON": 2, "DATE": 1}.
+    """
+    return {entity_type: len(entities[entity_type]) for entity_type, enabled in
+            (("PERSON", args.names), ("DATE", args.dates), ("PHONE", args.phones), ("ADDRESS", args.address)) if enabled}
+
+# Function to redact a batch of service requests.
+def redact_requests(requests, args):
+    """
+    Redacts the texts of a batch of service requests, running NER over all of them in one
+    nlp.pipe call.
+
+    Args:
+        requests (list of dict): Requests with an "id", the "text" to redact and optional flags
+            (see request_args).
+        args (Namespace): The command-line arguments the service was started with.
+
+    Returns:
+        list of dict: One response per request, in order: its "id", the "redacted" text and the
+        number of entities found of each enabled type ("counts"), or its "id" and an "error".
+    """
+    responses = [None] * len(requests)
+    prepared = []
+    for position, request in enumerate(requests):
+        try:
+            if not isinstance(request.get("text"), str):
+                raise ValueError("'text' must be a string")
+            prepared.append((position, request, request_args(args, request)))
+        except ValueError as error:
+            responses[position] = {"id": request.get("id"), "error": f"Invalid request: {error}"}
+
+    texts = ["\n".join(request["text"].splitlines()) for _, request, _ in prepared]
+    batch_entities = extract_ner_entities_for_args(texts, args, batch_size=max(len(texts), 1)) if texts else []
+    for (position, request, redaction_args), ner_entities in zip(prepared, batch_entities):
+        try:
+            redacted, names, dates, phones, addresses = redact_sensitive_info(
+                request["text"], redaction_args, topics=redaction_args.concept, ner_entities=ner_entities, read_file=False)
+        except Exception as error:
+            logging.error("Failed to redact request %s: %s", request.get("id"), error)
+            responses[position] = {"id": request.get("id"), "error": f"{type(error).__name__}: {error}"}
+            continue
+        counts = entity_counts({"PERSON": names, "DATE": dates, "PHONE": phones, "ADDRESS": addresses}, redaction_args)
+        responses[position] = {"id": request.get("id"), "redacted": redacted, "counts": counts}
+    return responses
+
+# Function to run the redactor as a long-running service.
+def serve(args, ready=None):
+    """
+    Loads the models once and answers redaction requests until stdin is closed or the
+    socket service is interrupted.
+
+    Requests are JSON objects, one per line, such as {"id": 1, "text": "...", "names": true}.
+    Requests from all clients share one bounded queue; up to --service-batch-size of them are
+    redacted together, so their NER runs in one nlp.pipe call. When the queue is full, no more
+    requests are read until there is room.
+
+    Args:
+        args (Namespace): Command-line arguments with the --serve address, the service limits
+            and the default redaction flags.
+        ready (callable, optional): Passed to serve_socket. Defaults to None.
+
+    Raises:
+        ValueError: If --serve is a non-loopback TCP address without --service-allow-remote, or an
+            existing path that is not a Unix socket.
+    """
+    # Check the address before loading the models, so a rejected one fails at once.
+    allow_remote = getattr(args, "service_allow_remote", False)
+    transport, target = parse_service_address(args.serve, allow_remote)
+    if transport == "unix":
+        is_socket_path(target)
+    # Warm the models, so the first request does not pay for loading them.
+    get_nlp()
+    get_address_parser()
+    get_gazetteer()
+    expand_topics(args.concept, cache_path=getattr(args, "concept_cache", None))
+
+    def handle_batch(requests):
+        return redact_requests(requests, args)
+    batch_size = getattr(args, "service_batch_size", SERVICE_BATCH_SIZE)
+    max_wait = getattr(args, "service_max_wait", SERVICE_MAX_WAIT * 1000) / 1000
+    queue_size = getattr(args, "service_queue_size", SERVICE_QUEUE_SIZE)
+    if transport == "stdin":
+        serve_stdin(handle_batch, batch_size, max_wait, queue_size)
+    else:
+        serve_socket(args.serve, handle_batch, batch_size, max_wait, queue_size, ready=ready, allow_remote=allow_remote)
+
+# Library interface for redacting texts from Python code.
+class Redactor:
+    """
+    Redacts texts passed from Python code, configured once with the same options as the
+    command line (e.g. Redactor(names=True, dates=True, concept=["budget"])).
+
+    The topics are expanded and the models loaded when the redactor is created, and
+    redact_many runs NER over up to batch_size texts at a time with one nlp.pipe call. The
+    gazetteer and compiled matchers are shared by every call. Inputs are always treated as
+    text, never as file paths.
+
+    Each result is a dictionary with the redacted "text", the "spans" that were masked
+    ({"start", "end", "type", "detector"} dictionaries, see write_span_index), the number of
+    entities of each enabled type ("counts") and the "entities" themselves.
+    """
+    # Function to configure the redactor.
+    def __init__(self, names=False, dates=False, phones=False, address=False, concept=None, batch_size=64, **options):
+        """
+        Args:
+            names, dates, phones, address (bool): The entity types to redact. Default to False.
+            concept (list of str, optional): Topics whose sentences are redacted. Defaults to None.
+            batch_size (int): Texts sent through spaCy together by redact_many. Defaults to 64.
+            **options: Other command-line options by their argument name, such as prefilter,
+                hardened_regex or concept_cache.
+        """
+        self.args = argparse.Namespace(names=names, dates=dates, phones=phones, address=address, concept=concept, **options)
+        self.batch_size = batch_size
+        get_gazetteer()
+        expand_topics(concept, cache_path=options.get("concept_cache"))
+
+    # Function to redact one text.
+    def redact(self, text):
+        """
+        Redacts one text and returns its result (see the class docstring).
+        """
+        return next(self.redact_many([text]))
+
+    # Function to redact many texts lazily.
+    def redact_many(self, texts):
+        """
+        Redacts the texts in order, taking up to batch_size of them from the iterable at a time,
+        so a long or endless iterable is redacted with bounded memory.
+
+        Args:
+            texts (iterable of str): The texts to redact.
+
+        Yields:
+            dict: The result of each text (see the class docstring).
+        """
+        texts = iter(texts)
+        while True:
+            batch = list(itertools.islice(texts, self.batch_size))
+            if not batch:
+                return
+            batch_entities = extract_ner_entities_for_args(["\n".join(text.splitlines()) for text in batch], self.args,
+                                                           batch_size=len(batch))
+            for text, ner_entities in zip(batch, batch_entities):
+                spans = []
+                joined, mask, entities = redact_document(text, self.args, topics=self.args.concept, ner_entities=ner_entities,
+                                                         spans=spans, read_file=False)
+                yield {"text": mask_spans(joined, mask), "spans": spans, "counts": entity_counts(entities, self.args),
+                       "entities": entities}
+
+# Function to redact a batch of files whose NER runs together.
+def process_batch(batch, args, n_process=1):
+    """
+    Runs NER over a batch of files already read with one nlp.pipe call, and redacts each.
+
+    Args:
+        batch (list of tuple): (index, file_path, previous_entry, text, read_seconds, content_hash) of each file.
+        args (Namespace): Command-line arguments.
+        n_process (int): Number of processes spaCy uses for the batch. Defaults to 1.
+
+    Returns:
+        list: The formatted statistics returned by process_file for each file.
+    """
+    ner_start = time.perf_counter()
+    batch_entities = extract_ner_entities_for_args(["\n".join(text.splitlines()) for _, _, _, text, _, _ in batch], args,
+                                                   batch_size=len(batch), n_process=n_process)
+    ner_end = time.perf_counter()
+    stats = []
+    for (i, file_path, previous_entry, text, read_seconds, content_hash), ner_entities in zip(batch, batch_entities):
+        stats.append(process_file(i, file_path, args, original_text=text, ner_entities=ner_entities, previous_entry=previous_entry,
+                                  content_hash=content_hash))
+        # NER ran for the whole batch, so each file is charged an equal share.
+        COLLECTED_FILE_METRICS[-1]["stages"]["read"] += read_seconds
+        COLLECTED_FILE_METRICS[-1]["stages"]["ner"] += (ner_end - ner_start) / len(batch)
+    return stats
+
+# Function to add a file's statistics to the --stats-aggregate file.
+def aggregate_stats(args, stats_output):
+    """
+    Appends the statistics of a file to the --stats-aggregate file, if it is set. Files skipped
+    in incremental mode pass the statistics kept in their manifest entry, so the aggregate
+    always covers every input.
+    """
+    aggregate_path = getattr(args, "stats_aggregate", None)
+    if aggregate_path and stats_output:
+        write_output(aggregate_path, stats_output, mode='a')
+
+# Function to report how busy each stage of the in-process pipeline was.
+def report_utilization(args, summary):
+    """
+    Logs the utilization of the read, redact and write stages, and prints it to stderr with
+    --utilization.
+
+    Args:
+        args (Namespace): Command-line arguments.
+        summary (dict): The summary returned by pipeline_utilization.
+    """
+    line = format_utilization(summary)
+    logging.info(line)
+    if getattr(args, "utilization", False):
+        sys.stderr.write(line + "\n")
+
+# Function to finish a --profile run.
+def report_profile(args, records):
+    """
+    Stops the profile started by main and writes it to the --profile directory (see
+    write_profile), printing the slowest documents to stderr.
+
+    Args:
+        args (Namespace): Command-line arguments (profile and profile_top).
+        records (list of dict): The per-file stage timings of the run.
+    """
+    profile = stop_profile()
+    if profile is None:
+        return
+    report = write_profile(args.profile, profile, records, getattr(args, "profile_top", PROFILE_TOP_DOCUMENTS))
+    sys.stderr.write(report)
+
+# Function to run the serial and batched paths as a read, redact and write pipeline.
+def process_files_in_process(files, args, manifest):
+    """
+    Redacts the files in this process, one at a time or in NER batches (--batch-size), while
+    a reader thread finds and reads the next files (up to --read-queue-size ahead) and the
+    writer thread writes the outputs of earlier files (up to --output-queue-size behind).
+    The utilization of each stage is reported at the end (see report_utilization).
+
+    Args:
+        files (iterable of str): The input files, consumed lazily.
+        args (Namespace): Command-line arguments.
+        manifest (dict): The manifest read at the start of the run.
+
+    Returns:
+        list of tuple: The (path, error) pairs of the outputs that could not be written.
+    """
+    batch_size = getattr(args, "batch_size", 1) or 1
+    n_process = getattr(args, "n_process", 1) or 1
+    batched = batch_size > 1 and not getattr(args, "stream", False)
+    # Streamed, CSV and JSONL files are read by process_file itself, so the reader only lists them.
+    # In incremental mode the reader also hashes each file, once, for needs_detection and process_file.
+    structured = getattr(args, "structured", "text")
+    incremental = getattr(args, "incremental", False)
+    def read_file(file_path):
+        content_hash = file_hash(file_path) if incremental else None
+        if getattr(args, "stream", False) or structured_format(file_path, structured) != "text":
+            return None, content_hash
+        return read_text_file(file_path), content_hash
+    pipeline_stats = new_pipeline_stats()
+    start = time.perf_counter()
+    start_output_writer(getattr(args, "output_queue_size", OUTPUT_QUEUE_SIZE))
+    try:
+        pending = []
+        inputs = read_ahead(files, read_file, getattr(args, "read_queue_size", READ_QUEUE_SIZE), pipeline_stats)
+        for i, (file_path, (text, content_hash), read_seconds) in enumerate(inputs, start=1):
+            previous_entry = manifest.get(os.path.abspath(file_path))
+            # Files skipped as unchanged or with cached entities do not need NER and are not batched.
+            if batched and text is not None and needs_detection(i, file_path, args, previous_entry, content_hash):
+                pending.append((i, file_path, previous_entry, text, read_seconds, content_hash))
+                if len(pending) == batch_size:
+                    for stats_output in process_batch(pending, args, n_process):
+                        aggregate_stats(args, stats_output)
+                    pending = []
+                continue
+            timed_files = len(COLLECTED_FILE_METRICS)
+            stats_output = process_file(i, file_path, args, original_text=text, previous_entry=previous_entry,
+                                        content_hash=content_hash)
+            # Skipped files have no timing record to charge the read to.
+            if len(COLLECTED_FILE_METRICS) > timed_files and text is not None:
+                COLLECTED_FILE_METRICS[-1]["stages"]["read"] += read_seconds
+            aggregate_stats(args, stats_output)
+        if pending:
+            for stats_output in process_batch(pending, args, n_process):
+                aggregate_stats(args, stats_output)
+    finally:
+        write_errors = stop_output_writer()
+    report_utilization(args, pipeline_utilization(time.perf_counter() - start, pipeline_stats, get_output_writer_stats()))
+    return write_errors
+
 # Main function to process files and apply redactions.
 def main(args):
     """
@@ -239,64 +1507,179 @@ def main(args):
         args (Namespace): Command-line arguments containing input directory, output directory,
                           redaction options, and stats output preferences.
     Workflow:
-        1. Suppresses warnings.
-        2. Lists files to process from the input directory.
+        1. Suppresses warnings, adds any --places lists to the gazetteer and expands the --concept topics once.
+           With --serve, the redactor runs as a service instead (see serve) and no files are listed.
+        2. Finds the files to process lazily (iter_files), so processing starts while large or
+           recursive directories are still being read; "-" reads the list of files from stdin.
         3. Creates the output directory if it doesn't exist.
-        4. For each file:
-            a. Reads the file content.
+        4. For each file (in a pool of worker processes when args.workers > 1):
+            a. Reads the file content (decompressing ".gz" inputs), on a reader thread ahead of its
+               redaction outside worker mode (see process_files_in_process).
             b. Redacts sensitive information (names, dates, phones, addresses, and topics).
-            c. Saves the redacted content to the output directory with a ".censored" extension.
+            c. Saves the redacted content to the output directory with a ".censored" extension
+               (on a background writer thread outside worker mode, see output_paths for the names).
             d. Logs the processing status.
-            e. Generates and saves statistics about the redacted entities.
+            e. Generates and saves statistics about the redacted entities, per file or appended
+               to the --stats-aggregate file.
             f. Optionally prints statistics to stderr or stdout based on user preference.
+        5. Files that failed (in worker mode) and outputs that could not be written are reported on
+           stderr without stopping the batch.
+        6. In hardened regex mode, the number of documents that hit a regex limit is reported on stderr.
+        7. With --metrics, the time spent in each pipeline stage is written per file and in aggregate.
+        8. With --prefilter, the paragraphs each cheap check sent to NER (and the recall against full NER
+           with --prefilter-recall-check) are reported on stderr.
+        9. With --incremental, unchanged files are skipped, cached entities are reused for files whose
+           settings changed, and the manifest in the output directory is updated.
+        10. With --entity-registry, names and addresses found in earlier files are also masked in later
+            ones, and with --entity-registry-store the registry is loaded at the start and saved at the end.
+        11. Outside worker mode, the utilization of the read, redact and write stages is logged, and
+            printed on stderr with --utilization.
+        12. With --profile, the run is profiled and the profile, the sampled stacks and the slowest
+            documents with their stage timings are written to the given directory.
     """
     warnings.filterwarnings("ignore")
-    files_to_process = list_files(args.input)
+    log_level = getattr(args, "log_level", None)
+    if log_level:
+        logging.getLogger().setLevel(log_level)
+    COLLECTED_FILE_METRICS.clear()
+    place_files = getattr(args, "places", None) or []
+    for place_file in place_files:
+        extend_gazetteer(load_place_list(place_file))
+    registry = registry_settings(args)
+    if registry is not None:
+        enable_entity_registry(*registry)
+        if getattr(args, "entity_registry_skip_ner", False):
+            warning = ("--entity-registry-skip-ner: NER is skipped for files in which the registry finds entities, "
+                       "so names in those files that no earlier file found and no other detector catches are not masked.")
+            logging.warning(warning)
+            sys.stderr.write(warning + "\n")
+    if getattr(args, "serve", None):
+        serve(args)
+        close_entity_registry()
+        return
+    if getattr(args, "profile", None):
+        start_profile(getattr(args, "profile_interval", PROFILE_INTERVAL_MS))
+    # Expand the topics once up front; every file (and every forked worker) reuses the expansion.
+    expand_topics(args.concept, cache_path=getattr(args, "concept_cache", None))
+    files_to_process = iter_files(args.input)
 
-    # Create output directory if it doesn't exist.
+    # Create output directory if it doesn't exist, and start the aggregated stats file afresh
+    # (files skipped in incremental mode append the statistics kept in the manifest).
     if not os.path.exists(args.output):
         os.mkdir(args.output)
+    if getattr(args, "stats_aggregate", None):
+        write_text_file(args.stats_aggregate, "")
 
-    # Process each file, apply redactions, and save the results.
-    for i, file_path in enumerate(files_to_process, start=1):
-        with open(file_path, "r", encoding="utf-8") as f:
-            original_text = f.read()
-
-        redacted_content, names, dates, phones, addresses = redact_sensitive_info(original_text, args, topics=args.concept)
-        file_name = os.path.basename(file_path)
-
-        with open(os.path.join(args.output, file_name + ".censored"), "w", encoding="utf-8") as f:
-            f.write(redacted_content)
-
-        logging.info(f"File '{file_name}' processed and saved to '{args.output}'")
-
-        stats_file_path = os.path.join(args.output, f"sample_stats{i}.txt")
-        
-        stats_output = format_entity_stats(file_name, args, names, dates, phones, addresses)
-        with open(stats_file_path, "w", encoding="utf-8") as stats_file:
-            stats_file.write(stats_output)
+    # In incremental mode, each file is compared with its entry from the previous run.
+    incremental = getattr(args, "incremental", False)
+    manifest = load_manifest(args.output) if incremental else {}
+    PENDING_MANIFEST_ENTRIES.clear()
 
-        # if args.stats == "stderr":
-        #     sys.stderr.write("Printing stats to stderr\n")
-        #     sys.stderr.write(stats_output)
-        # elif args.stats == "stdout":
-        #     sys.stdout.write("Printing stats to stdout\n")
-        #     sys.stdout.write(stats_output)
+    workers = getattr(args, "workers", 1) or 1
+    get_regex_limit_counters(reset=True)
+    get_prefilter_counters(reset=True)
+    if workers <= 1:
+        failures = process_files_in_process(files_to_process, args, manifest)
+        for file_path, error in failures:
+            sys.stderr.write(f"Failed to write {file_path}: {error}\n")
+        report_regex_limits(get_regex_limit_counters(reset=True))
+        report_prefilter(args, get_prefilter_counters(reset=True))
+        report_metrics(args, COLLECTED_FILE_METRICS)
+        update_manifest(args, manifest, PENDING_MANIFEST_ENTRIES)
+        close_entity_registry()
+        report_profile(args, COLLECTED_FILE_METRICS)
+        return
 
+    # Hand the files to a pool of workers as they are found; each worker loads the model once in init_worker.
+    tasks = ((i, file_path, args, manifest.get(os.path.abspath(file_path)))
+             for i, file_path in enumerate(files_to_process, start=1))
+    processed = 0
+    failures = []
+    file_metrics = []
+    manifest_entries = []
+    limit_counters = dict.fromkeys(REGEX_LIMIT_COUNTERS, 0)
+    prefilter_counters = dict.fromkeys(PREFILTER_COUNTERS, 0)
+    with multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=(place_files, registry)) as pool:
+        for result in pool.imap_unordered(run_file_task, tasks):
+            processed += 1
+            if result["error"] is not None:
+                failures.append((result["path"], result["error"]))
+            if result["metrics"] is not None:
+                file_metrics.append(result["metrics"])
+            if result["entry"] is not None:
+                manifest_entries.append(result["entry"])
+            aggregate_stats(args, result["stats"])
+            for limit, count in result["limits"].items():
+                limit_counters[limit] += count
+            for counter, count in result["prefilter"].items():
+                prefilter_counters[counter] += count
+            # Collect the workers' new entities in the parent's registry, which is the one saved.
+            register_entities(result["registry"])
 
-        
+    logging.info("Processed %s of %s files with %s workers.", processed - len(failures), processed, workers)
+    for file_path, error in failures:
+        sys.stderr.write(f"Failed to process {file_path}: {error}\n")
+    report_regex_limits(limit_counters)
+    report_prefilter(args, prefilter_counters)
+    report_metrics(args, file_metrics)
+    update_manifest(args, manifest, manifest_entries)
+    close_entity_registry()
+    report_profile(args, file_metrics)
 
 # Argument parsing and main function call.
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Redact sensitive information from text files.")
-    parser.add_argument("--input", help="Input file pattern", required=False, default="text_files/*.txt")
+    parser.add_argument("--input", help="Input file pattern ('**' matches any directories, '-' reads one path per line from stdin)", required=False, default="text_files/*.txt")
     parser.add_argument("--names", action="store_true", help="Redact names")
     parser.add_argument("--dates", action="store_true", help="Redact dates")
     parser.add_argument("--phones", action="store_true", help="Redact phone numbers")
     parser.add_argument("--address", action="store_true", help="Redact addresses")
     parser.add_argument("--concept", nargs="*", help="Topics to redact")
+    parser.add_argument("--concept-word-boundary", action="store_true", help="Only redact sentences where a --concept related word appears as a whole word")
+    parser.add_argument("--concept-cache", help="JSON file storing WordNet expansions of --concept terms across runs")
     parser.add_argument("--output", help="Output directory", required=False, default="files/")
     parser.add_argument("--stats", default="stdout", help="Output for statistics")
+    parser.add_argument("--stats-aggregate", help="Append the statistics of every file to this one file instead of writing a stats file per input")
+    parser.add_argument("--stable-names", action="store_true", help="Name outputs after each input's path relative to the --input directory instead of its position")
+    parser.add_argument("--gzip-output", action="store_true", help="Write gzip-compressed .censored.gz outputs (.gz inputs are always decompressed)")
+    parser.add_argument("--structured", choices=STRUCTURED_FORMATS, default="text", help="Redact inputs as CSV or JSONL records ('auto' picks the format from each file's extension)")
+    parser.add_argument("--text-fields", nargs="+", default=None, help="Free-text fields of CSV or JSONL records that go through NER, titles, places, pyap and topics")
+    parser.add_argument("--structured-batch-rows", type=int, default=STRUCTURED_BATCH_ROWS, help="Rows of a CSV or JSONL file detected together")
+    parser.add_argument("--read-queue-size", type=int, default=READ_QUEUE_SIZE, help="Maximum number of files read ahead of the one being redacted")
+    parser.add_argument("--utilization", action="store_true", help="Print how busy the read, redact and write stages were to stderr")
+    parser.add_argument("--output-queue-size", type=int, default=OUTPUT_QUEUE_SIZE, help="Maximum number of outputs waiting for the writer thread")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes used to redact files in parallel")
+    parser.add_argument("--batch-size", type=int, default=1, help="Number of files sent through spaCy NER together with nlp.pipe")
+    parser.add_argument("--n-process", type=int, default=1, help="Number of processes spaCy uses for each NER batch")
+    parser.add_argument("--stream", action="store_true", help="Redact each file in chunks with bounded memory and write the output incrementally")
+    parser.add_argument("--chunk-chars", type=int, default=STREAM_CHUNK_CHARS, help="Characters read per chunk in streaming mode")
+    parser.add_argument("--hardened-regex", action="store_true", help="Scan with per-document size and time limits for regex extraction")
+    parser.add_argument("--regex-max-chars", type=int, default=HARDENED_MAX_CHARS, help="Maximum characters scanned by regex per document in hardened mode")
+    parser.add_argument("--regex-time-limit", type=float, default=HARDENED_TIME_LIMIT, help="Maximum seconds of regex scanning per document in hardened mode")
+    parser.add_argument("--places", action="append", help="File of extra place names to redact with --address, one per line (can be repeated)")
+    parser.add_argument("--span-index", action="store_true", help="Also write <file>.spans.jsonl with the offset, type and detector of every detected span")
+    parser.add_argument("--incremental", action="store_true", help="Skip files unchanged since the last run and reuse cached entities when only the flags change")
+    parser.add_argument("--metrics", help="Write per-stage timings for each file to this path ('-' for stdout)")
+    parser.add_argument("--profile", help="Profile the run and write the cProfile statistics, collapsed stacks and slowest documents to this directory")
+    parser.add_argument("--profile-top", type=int, default=PROFILE_TOP_DOCUMENTS, help="Number of documents in the --profile slowest-documents report")
+    parser.add_argument("--profile-interval", type=float, default=PROFILE_INTERVAL_MS, help="Milliseconds between two --profile stack samples")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json", help="Format of the --metrics output")
+    parser.add_argument("--prefilter", nargs="*", choices=list(PREFILTER_STAGES), help="Only run NER on paragraphs accepted by these cheap checks (default: capitalized)")
+    parser.add_argument("--prefilter-recall-check", action="store_true", help="Also run full NER, report the entities the --prefilter cascade misses, and keep the full results")
+    parser.add_argument("--serve", help="Run as a service with warm models, reading JSON line requests from 'stdin', a Unix socket path or HOST:PORT")
+    parser.add_argument("--service-batch-size", type=int, default=SERVICE_BATCH_SIZE, help="Maximum number of service requests redacted together")
+    parser.add_argument("--service-max-wait", type=float, default=SERVICE_MAX_WAIT * 1000, help="Milliseconds the service waits to fill a batch")
+    parser.add_argument("--service-allow-remote", action="store_true", help="Let --serve listen on a HOST:PORT other than a loopback address; the service has no authentication")
+    parser.add_argument("--service-queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Maximum number of queued service requests before reading pauses")
+    parser.add_argument("--shards", type=int, default=1, help="Number of processes a file longer than --shard-chars is split across")
+    parser.add_argument("--shard-chars", type=int, default=SHARD_CHARS, help="Target size of each shard in characters (shards end at paragraph breaks)")
+    parser.add_argument("--shard-overlap-chars", type=int, default=SHARD_OVERLAP_CHARS, help="Characters after each shard also scanned for matches crossing into the next one")
+    parser.add_argument("--entity-registry", action="store_true", help="Also mask in every file the names and addresses found in earlier files of the run")
+    parser.add_argument("--entity-registry-size", type=int, default=REGISTRY_MAX_ENTITIES, help="Maximum number of entities the registry holds (least recently used ones are evicted)")
+    parser.add_argument("--entity-registry-store", help="File the registry is loaded from and saved to, so it carries over between runs (implies --entity-registry)")
+    parser.add_argument("--entity-registry-skip-ner", action="store_true", help="Skip spaCy NER for files in which the registry finds entities and rely on its exact matches there; new names in those files that only NER would find are missed")
+    parser.add_argument("--pyap-block-chars", type=int, default=PYAP_BLOCK_CHARS, help="Maximum characters passed to pyap at once when detecting addresses")
+    parser.add_argument("--log-level", default="DEBUG", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Level of messages written to docs/codelogger.log")
 
     args = parser.parse_args()
 
@@ -2,6 +2,9 @@
 import os.path
 import sys
 import pytest
+import argparse
+import json
+import time
 
 from assignment1.helper import *
 from assignment1.pattern_matcher import *
@@ -10,6 +13,19 @@ from redactor import *
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'assignment1')))
 
 
+class StubEntity:
+    """A minimal stand-in for a spaCy entity span."""
+    def __init__(self, text, label_):
+        self.text = text
+        self.label_ = label_
+
+
+class StubDoc:
+    """A minimal stand-in for a spaCy Doc; it reports "Grant" as a PERSON wherever it occurs."""
+    def __init__(self, text):
+        self.ents = [StubEntity("Grant", "PERSON")] if "Grant" in text else []
+
+
 
 def test_extract_using_regex():
     """
@@ -108,15 +124,857 @@ def test_hide_terms_in_sentences():
 
 
 
+def test_apply_redaction_longest_match():
+    """
+    Test that apply_redaction resolves overlapping entities the same way every time.
+
+    "New York" and "New" are both listed as addresses. The longer entity must win, so
+    the whole of "New York" is masked and the rest of the sentence is kept.
+    """
+    text = "Alice moved to New York."
+    entities = {'PERSON': ['Alice'], 'ADDRESS': ['New', 'New York']}
+    redacted_text = apply_redaction(text, entities, redact_names=True, redact_address=True)
+    assert redacted_text == "█████ moved to ████████."
+
+
+
+def test_redact_with_injected_model():
+    """
+    Test that redact_sensitive_info uses a model injected into the registry.
+
+    A lightweight stub replaces the spaCy pipeline, so no model has to be loaded.
+    The stub reports "Grant" as a PERSON, which must be masked in the output.
+    """
+    register_model('nlp', StubDoc)
+    try:
+        args = argparse.Namespace(names=True, dates=False, phones=False, address=False)
+        redacted_text, names, _, _, _ = redact_sensitive_info("Grant called yesterday.", args)
+    finally:
+        clear_models()
+    assert 'Grant' in names
+    assert redacted_text == "█████ called yesterday."
+
+
+
+
+def test_main_workers_match_serial(tmp_path):
+    """
+    Test that main produces the same outputs with a process pool as with the serial path.
 
+    Two readable files and one file that is not valid UTF-8 are processed with --workers 2.
+    The bad file must not stop the batch, and the outputs of the good files must be
+    identical to those written by the serial path.
+    """
+    import multiprocessing
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("the stub model is only inherited by forked workers")
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "a.txt").write_text("Grant met Alice on 01/02/2024.", encoding="utf-8")
+    (input_dir / "b.txt").write_text("Call Grant at 658-856-4967.", encoding="utf-8")
+    (input_dir / "c.txt").write_bytes(b"\xff\xfe broken")
+
+    register_model('nlp', StubDoc)
+    try:
+        outputs = {}
+        for workers in (1, 2):
+            output_dir = tmp_path / f"out{workers}"
+            args = argparse.Namespace(input=str(input_dir / "[ab].txt") if workers == 1 else str(input_dir / "*.txt"),
+                                      output=str(output_dir) + os.sep, names=True, dates=True, phones=True,
+                                      address=False, concept=None, stats="stdout", workers=workers)
+            main(args)
+            outputs[workers] = {name: (output_dir / name).read_text(encoding="utf-8")
+                                for name in ("a.txt.censored", "b.txt.censored")}
+    finally:
+        clear_models()
+    assert outputs[1] == outputs[2]
+    assert "Grant" not in outputs[2]["a.txt.censored"]
+
+
+
+def test_extract_ner_entities_batch():
+    """
+    Test the batched NER path with a small rule-based pipeline.
 
+    The pipeline has an entity ruler, which sets doc.ents, and a sentencizer, which NER
+    does not need. Only the sentencizer must be disabled, and every input text must get
+    its own PERSON and GPE lists.
+    """
+    import spacy
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns([{"label": "PERSON", "pattern": "Grant"}, {"label": "GPE", "pattern": "Florida"}])
 
+    assert ner_disabled_pipes(nlp) == ["sentencizer"]
+    results = extract_ner_entities_batch(["Grant lives in Florida.", "Nothing here."], nlp=nlp, batch_size=2)
+    assert results == [{"PERSON": ["Grant"], "GPE": ["Florida"]}, {"PERSON": [], "GPE": []}]
 
 
 
+def test_extract_using_regex_spans():
+    """
+    Test that the extractor matches per-type extraction and reports offsets.
 
+    PERSON and ADDRESS matches overlap in this text ("Mercer St" is part of the address),
+    so both must be reported, exactly as separate re.findall calls would.
+    """
+    text = "Albert Einstein lived at 112 Mercer St, Princeton, NJ 08540 until 01/02/1955."
+    result = extract_using_regex(text, with_spans=True)
+    assert {key: [value[0] for value in values] for key, values in result.items()} == extract_using_regex_per_type(text)
+    for entity, start, end in result['ADDRESS']:
+        assert text[start:end] == entity
+    assert 'Mercer St' in [value[0] for value in result['PERSON']]
+
+
+
+def test_extract_using_regex_hardened():
+    """
+    Test the hardened regex extractor on normal and pathological input.
+
+    On ordinary text it must find the same entities as extract_using_regex. A house number
+    followed by thousands of words without a street suffix must not match an address, a
+    long dotted run without "@" must not take quadratic time in the EMAIL pattern, and a
+    document over the size limit must be truncated and counted.
+    """
+    text = "Call 658-856-4967 on 01/02/2024.\n\nVisit 112 Mercer St, Princeton, NJ 08540."
+    assert extract_using_regex_hardened(text, block_chars=40) == extract_using_regex(text)
 
+    pathological = "12 " + "word " * 5000 + "!"
+    assert extract_using_regex(pathological)['ADDRESS'] == []
 
+    dotted = "a." * 20000
+    start = time.perf_counter()
+    assert extract_using_regex(dotted)['EMAIL'] == []
+    assert extract_using_regex_hardened(dotted)['EMAIL'] == []
+    assert time.perf_counter() - start < 1.0
+    assert extract_using_regex("Write to " + "x" * 70 + "@mail.com or jo.doe@mail.example.com.")['EMAIL'] == ["jo.doe@mail.example.com"]
 
+    get_regex_limit_counters(reset=True)
+    extract_using_regex_hardened(pathological, max_chars=100)
+    assert get_regex_limit_counters(reset=True) == {"size_limit": 1, "time_limit": 0}
 
 
+
+def test_redact_file_streaming(tmp_path):
+    """
+    Test that streaming redaction writes the same output as the whole-file path.
+
+    The chunk size is tiny, so the file is split into many chunks with carried-over lines,
+    and a long line is split into several segments. A name that only appears in the first
+    chunk must still be masked when it appears again in a later chunk.
+    """
+    text = "Grant called on 01/02/2024.\n\nHe left a note.\n" + "filler line.\n" * 20 + "x" * 150 + "\nGrant again.\n"
+    input_path = tmp_path / "big.txt"
+    input_path.write_text(text, encoding="utf-8")
+    args = argparse.Namespace(names=True, dates=True, phones=False, address=False)
+
+    register_model('nlp', StubDoc)
+    try:
+        expected, _, _, _, _ = redact_sensitive_info(text, args)
+        entities = redact_file_streaming(str(input_path), str(tmp_path / "big.censored"), args, chunk_chars=60, overlap_lines=2)
+    finally:
+        clear_models()
+    assert (tmp_path / "big.censored").read_text(encoding="utf-8") == expected
+    assert "Grant" in entities["PERSON"] and "01/02/2024" in entities["DATE"]
+
+def test_redact_file_streaming_known_entity_cap(tmp_path):
+    """
+    Test that streaming redaction masks every detected entity even past max_known_entities.
+
+    Only one entity may be remembered, yet every date must be masked in the chunk it is found
+    in, and an address wrapping across the line where a window is split must be masked on
+    both of its lines.
+    """
+    dates = [f"01/0{day}/2024" for day in range(1, 8)]
+    text = "".join(f"Called on {date} today\n" for date in dates)
+    text += "We moved to 225 E. John Carpenter Freeway\nSuite 1500 Irving, Texas 75062.\nDone.\n"
+    input_path = tmp_path / "big.txt"
+    input_path.write_text(text, encoding="utf-8")
+    args = argparse.Namespace(names=True, dates=True, phones=False, address=True)
+
+    register_model('nlp', StubDoc)
+    try:
+        entities = redact_file_streaming(str(input_path), str(tmp_path / "big.censored"), args, chunk_chars=60,
+                                         overlap_lines=1, max_known_entities=1)
+    finally:
+        clear_models()
+    output = (tmp_path / "big.censored").read_text(encoding="utf-8")
+    assert len(entities["DATE"]) == 1
+    for detected in dates + ["Freeway", "Irving"]:
+        assert detected not in output
+    assert output.endswith("Done.")
+
+
+
+def test_stage_metrics(tmp_path):
+    """
+    Test that process_file records per-stage timings and that both output formats render them.
+
+    One file is processed with the stub model. Its record must have a time for every stage,
+    and the JSON and Prometheus outputs must contain the file and the aggregate totals.
+    """
+    input_path = tmp_path / "a.txt"
+    input_path.write_text("Grant called on 01/02/2024.", encoding="utf-8")
+    args = argparse.Namespace(names=True, dates=True, phones=False, address=False, concept=None,
+                              stats="stdout", output=str(tmp_path / "out") + os.sep)
+    os.mkdir(args.output)
+
+    COLLECTED_FILE_METRICS.clear()
+    register_model('nlp', StubDoc)
+    try:
+        process_file(1, str(input_path), args)
+    finally:
+        clear_models()
+    record = COLLECTED_FILE_METRICS.pop()
+    assert record["file"] == "a.txt"
+    assert set(record["stages"]) == set(PIPELINE_STAGES)
+    assert record["stages"]["ner"] > 0 and record["total"] >= sum(record["stages"].values())
+
+    report = json.loads(format_metrics_json([record]))
+    assert report["aggregate"]["files"] == 1 and report["files"][0]["file"] == "a.txt"
+    prometheus = format_metrics_prometheus([record])
+    assert "redactor_files_total 1" in prometheus
+    assert 'redactor_file_stage_seconds{file="a.txt",stage="regex"}' in prometheus
+
+
+
+def test_find_places_multiword_and_extension():
+    """
+    Test the gazetteer index on single-token, multi-token and user-supplied place names.
+
+    "New York" and "United Kingdom" are only found as multi-word names. A place added with
+    extend_gazetteer must be found too, and reset_gazetteer must drop it again.
+    """
+    text = "She moved from New York, NY to the United Kingdom, then to Springfield."
+    places = find_places(text)
+    assert "New York" in places and "NY" in places and "United Kingdom" in places
+    assert "Springfield" not in places
+    try:
+        extend_gazetteer(["Springfield", "Lake Tahoe"])
+        places = find_places(text + " Lake  Tahoe.")
+        assert "Springfield" in places and "Lake  Tahoe" in places
+    finally:
+        reset_gazetteer()
+    assert "Springfield" not in find_places(text)
+
+
+
+class StubWordNet:
+    """
+    WordNet stand-in that counts its queries and knows no synsets.
+    """
+    queries = 0
+
+    @classmethod
+    def synsets(cls, concept):
+        cls.queries += 1
+        return []
+
+    @staticmethod
+    def get_version():
+        return WORDNET_VERSION
+
+
+def test_expand_concepts_cache(tmp_path):
+    """
+    Test that concept expansion is memoized in memory and read from the on-disk store.
+
+    A warm store answers without querying WordNet. A concept missing from the store is
+    queried once, written to the store, and served from memory afterwards.
+    """
+    cache_path = str(tmp_path / "concepts.json")
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({WORDNET_VERSION: {"call": ["phone", "ring"]}}, f)
+
+    clear_concept_cache()
+    register_model('wordnet', StubWordNet)
+    try:
+        assert expand_concepts(["call"], cache_path=cache_path) == ["phone", "ring"]
+        assert StubWordNet.queries == 0
+        for _ in range(3):
+            expand_concepts(["unknown"], cache_path=cache_path)
+        assert StubWordNet.queries == 1
+    finally:
+        clear_models()
+        clear_concept_cache()
+    with open(cache_path, encoding="utf-8") as f:
+        assert json.load(f)[WORDNET_VERSION] == {"call": ["phone", "ring"], "unknown": []}
+
+
+
+def test_hide_topic_sentences_across_lines():
+    """
+    Test that topic redaction segments sentences over the whole document.
+
+    The sentence mentioning the phone spans two lines, so its part of both lines is masked
+    while the other sentences are kept. With word boundaries, "ring" must not
+    match inside "string".
+    """
+    args = argparse.Namespace(names=False, dates=False, phones=False, address=False)
+    lines = ["Mr. Lee wrote a letter. Then the PHONE", "rang twice. He left."]
+    entities = {"PERSON": [], "DATE": [], "PHONE": [], "ADDRESS": []}
+    redacted_lines = redact_lines(lines, entities, args, topics=["telephone", "phone"])
+    assert redacted_lines == ["Mr. Lee wrote a letter. " + "█" * 14, "█" * 11 + " He left."]
+
+    matcher = compile_topic_matcher(("ring",), word_boundary=True)
+    assert hide_topic_sentences("A string. A ring.", matcher) == "A string. " + "█" * 7
+
+
+
+def test_main_incremental(tmp_path):
+    """
+    Test that incremental runs skip unchanged files and reuse cached entities.
+
+    The second run with the same flags must not call the model at all. A run with a new
+    flag must rewrite the output from the cached entities, again without NER, and an edited
+    file must be detected again.
+    """
+    calls = []
+
+    def counting_model(text):
+        calls.append(text)
+        return StubDoc(text)
+
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "a.txt").write_text("Grant met Alice on 01/02/2024.", encoding="utf-8")
+    output_dir = str(tmp_path / "out") + os.sep
+    args = argparse.Namespace(input=str(input_dir / "*.txt"), output=output_dir, names=True, dates=False,
+                              phones=False, address=False, concept=None, stats="stdout", incremental=True)
+
+    register_model('nlp', counting_model)
+    try:
+        main(args)
+        assert len(calls) == 1
+        main(args)
+        assert len(calls) == 1
+
+        args.dates = True
+        main(args)
+        assert len(calls) == 1
+        assert "01/02/2024" not in (tmp_path / "out" / "a.txt.censored").read_text(encoding="utf-8")
+
+        (input_dir / "a.txt").write_text("Grant left.", encoding="utf-8")
+        main(args)
+        assert len(calls) == 2
+
+        # A new file listed first moves a.txt to position 2: only its stats file is rewritten.
+        censored = (tmp_path / "out" / "a.txt.censored").stat().st_mtime_ns
+        (input_dir / "0.txt").write_text("Nothing here.", encoding="utf-8")
+        main(args)
+        assert len(calls) == 3
+        assert (tmp_path / "out" / "a.txt.censored").stat().st_mtime_ns == censored
+        assert "a.txt" in (tmp_path / "out" / "sample_stats2.txt").read_text(encoding="utf-8")
+        main(args)
+        assert len(calls) == 3
+    finally:
+        clear_models()
+    manifest = load_manifest(output_dir)
+    assert sorted(manifest) == [os.path.abspath(input_dir / "0.txt"), os.path.abspath(input_dir / "a.txt")]
+    assert manifest[os.path.abspath(input_dir / "a.txt")]["index"] == 2
+
+
+def test_incremental_stats_aggregate(tmp_path):
+    """
+    Test that files skipped by an incremental run stay in the --stats-aggregate file.
+
+    The second run skips both files, so their statistics must come from the manifest, and the
+    aggregate must match the first run's.
+    """
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "a.txt").write_text("Grant met Alice.", encoding="utf-8")
+    (input_dir / "b.txt").write_text("Nobody here.", encoding="utf-8")
+    aggregate = tmp_path / "all_stats.txt"
+    args = argparse.Namespace(input=str(input_dir / "*.txt"), output=str(tmp_path / "out") + os.sep, names=True,
+                              dates=False, phones=False, address=False, concept=None, stats="stdout",
+                              incremental=True, stats_aggregate=str(aggregate))
+
+    register_model('nlp', StubDoc)
+    try:
+        main(args)
+        first = aggregate.read_text(encoding="utf-8")
+        main(args)
+    finally:
+        clear_models()
+    assert "a.txt" in first and "b.txt" in first
+    assert aggregate.read_text(encoding="utf-8") == first
+
+
+
+def test_span_index_reapplied(tmp_path):
+    """
+    Test that a span index written once reproduces differently configured redactions.
+
+    Spans are collected with only names enabled, written and read back. Masking the original
+    text from the index with names and dates enabled must give the same output as a direct run
+    with those flags, and every span must carry its type and detector.
+    """
+    text = "Grant called on 01/02/2024.\nMr. Lee answered at 658-856-4967 today."
+    spans = []
+    register_model('nlp', StubDoc)
+    try:
+        args = argparse.Namespace(names=True, dates=False, phones=False, address=False)
+        redact_sensitive_info(text, args, spans=spans)
+        args = argparse.Namespace(names=True, dates=True, phones=False, address=False)
+        expected, _, _, _, _ = redact_sensitive_info(text, args)
+    finally:
+        clear_models()
+
+    index_path = str(tmp_path / "a.txt") + SPAN_INDEX_SUFFIX
+    write_span_index(index_path, spans)
+    spans = read_span_index(index_path)
+    assert {"start": 0, "end": 5, "type": "PERSON", "detector": "ner"} in spans
+    assert {(span["type"], span["detector"]) for span in spans} >= {("DATE", "regex"), ("PHONE", "regex"), ("PERSON", "title")}
+    assert apply_redaction(text, None, redact_names=True, redact_dates=True, spans=spans) == expected
+
+def test_find_address_spans_across_lines():
+    """
+    Test that pyap addresses are found once per document, including one wrapping across lines.
+
+    Both addresses must be reported with their exact original offsets, and redact_lines must
+    mask the wrapped one on both of its lines while leaving the rest of the text alone.
+    """
+    lines = ["I live at 225 E. John Carpenter Freeway, Suite 1500 Irving, Texas 75062 and",
+             "work at 1 Main Street", "Springfield, IL 62701 ok", "", "No address here."]
+    text = "\n".join(lines)
+    found = [text[start:end] for start, end in find_address_spans(text)]
+    assert found == ["225 E. John Carpenter Freeway, Suite 1500 Irving, Texas 75062",
+                     "1 Main Street\nSpringfield, IL 62701"]
+
+    args = argparse.Namespace(names=False, dates=False, phones=False, address=True)
+    entities = {"PERSON": [], "DATE": [], "PHONE": [], "ADDRESS": []}
+    redacted = redact_lines(lines, entities, args)
+    assert redacted[1] == "work at " + "█" * len("1 Main Street")
+    assert redacted[2] == "█" * len("Springfield, IL 62701") + " ok"
+    assert redacted[4] == "No address here."
+
+def test_find_address_spans_normalization_mismatch(monkeypatch):
+    """
+    Test that addresses are still found when pyap normalizes a block differently than expected.
+
+    With the normalized copy made unmappable, find_address_spans must fall back to searching
+    the block for each address's text and report the same spans as the offset mapping.
+    """
+    import assignment1.addresses as addresses
+    text = "work at 1 Main Street\nSpringfield, IL 62701 ok\n\nor 1 Main Street, Springfield, IL 62701."
+    expected = [text[start:end] for start, end in find_address_spans(text)]
+    assert expected == ["1 Main Street\nSpringfield, IL 62701", "1 Main Street, Springfield, IL 62701"]
+
+    monkeypatch.setattr(addresses, "normalize_with_edits", lambda block: ("", []))
+    assert [text[start:end] for start, end in find_address_spans(text)] == expected
+
+def test_prefilter_cascade():
+    """
+    Test that the prefilter cascade only sends candidate paragraphs to NER and counts its work.
+
+    Lowercase boilerplate and a numeric table never reach the model. With only the gazetteer
+    stage the paragraph naming Grant is skipped too; the recall check reports the missed
+    entity and still returns the full NER results.
+    """
+    text = "Grant called from Texas.\n\nall rights reserved. see terms.\n\n10 20 30\n40 50 60"
+    seen = []
+    def counting_model(paragraph):
+        seen.append(paragraph)
+        return StubDoc(paragraph)
+
+    get_prefilter_counters(reset=True)
+    entities = extract_ner_entities_prefiltered([text], ["capitalized"], nlp=counting_model)[0]
+    assert entities["PERSON"] == ["Grant"]
+    assert seen == ["Grant called from Texas."]
+    counters = get_prefilter_counters(reset=True)
+    assert (counters["paragraphs"], counters["ner_paragraphs"]) == (3, 1)
+    assert (counters["capitalized_checked"], counters["capitalized_hits"]) == (3, 1)
+
+    text = text.replace("from Texas", "home")
+    assert extract_ner_entities_prefiltered([text], ["gazetteer"], nlp=counting_model)[0]["PERSON"] == []
+    entities = extract_ner_entities_prefiltered([text], ["gazetteer"], nlp=counting_model, recall_check=True)[0]
+    assert entities["PERSON"] == ["Grant"]
+    counters = get_prefilter_counters(reset=True)
+    assert (counters["recall_entities"], counters["recall_missed"]) == (1, 1)
+
+def test_parse_service_address():
+    """
+    Test that the service only listens on loopback TCP hosts unless remote hosts are allowed.
+    """
+    assert parse_service_address("stdin") == ("stdin", None)
+    assert parse_service_address("127.0.0.1:8000") == ("tcp", ("127.0.0.1", 8000))
+    assert parse_service_address("localhost:8000") == ("tcp", ("localhost", 8000))
+    assert parse_service_address("[::1]:8000") == ("tcp", ("::1", 8000))
+    assert parse_service_address("/tmp/redactor.sock") == ("unix", "/tmp/redactor.sock")
+    for address in ("0.0.0.0:8000", "192.168.1.5:8000", "example.com:8000"):
+        with pytest.raises(ValueError):
+            parse_service_address(address)
+    assert parse_service_address("0.0.0.0:8000", allow_remote=True) == ("tcp", ("0.0.0.0", 8000))
+
+    args = argparse.Namespace(names=True, dates=False, phones=False, address=False, concept=None, serve="0.0.0.0:8000")
+    with pytest.raises(ValueError):
+        serve(args)
+
+
+def test_serve_socket_keeps_regular_files(tmp_path):
+    """
+    Test that a --serve path naming a regular file is rejected instead of deleted.
+    """
+    notes = tmp_path / "notes.txt"
+    notes.write_text("keep me", encoding="utf-8")
+    with pytest.raises(ValueError):
+        serve_socket(str(notes), lambda batch: [])
+    assert notes.read_text(encoding="utf-8") == "keep me"
+
+
+def test_service_stdin_and_socket(tmp_path):
+    """
+    Test that the service answers JSON line requests on stdin and on a Unix socket.
+
+    Requests may set their own flags, a malformed request gets an error without stopping the
+    service, and a text naming an existing file is redacted as text, not read from disk.
+    """
+    import io
+    import socket
+    import threading
+    import socketserver
+    args = argparse.Namespace(names=True, dates=False, phones=False, address=False, concept=None,
+                              serve="stdin", service_batch_size=8, service_max_wait=1, service_queue_size=2)
+    requests = [{"id": 1, "text": "Grant called on 01/02/2024."},
+                {"id": 2, "text": "Grant called on 01/02/2024.", "names": False, "dates": True},
+                {"id": 3, "text": "Nothing here", "names": "yes"},
+                {"id": 4, "text": __file__}]
+    stdin = io.StringIO("".join(json.dumps(request) + "\n" for request in requests) + "not json\n")
+    stdout = io.StringIO()
+    register_model('nlp', StubDoc)
+    try:
+        serve_stdin(lambda batch: redact_requests(batch, args), batch_size=2, max_wait=0.001, queue_size=2,
+                    stdin=stdin, stdout=stdout)
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        by_id = {response["id"]: response for response in responses}
+        assert by_id[1] == {"id": 1, "redacted": "█████ called on 01/02/2024.", "counts": {"PERSON": 1}}
+        assert by_id[2] == {"id": 2, "redacted": "Grant called on ██████████.", "counts": {"DATE": 1}}
+        assert "error" in by_id[3] and "error" in by_id[None]
+        assert by_id[4]["redacted"] == __file__
+
+        socket_path = str(tmp_path / "redactor.sock")
+        servers = []
+        started = threading.Event()
+        args.serve = socket_path
+        thread = threading.Thread(target=serve, args=(args,), kwargs={"ready": lambda server: (servers.append(server), started.set())})
+        thread.start()
+        assert started.wait(10)
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                client.sendall(b'{"id": "a", "text": "Grant is here."}\n')
+                client.shutdown(socket.SHUT_WR)
+                reply = client.makefile("r", encoding="utf-8").readline()
+            assert json.loads(reply) == {"id": "a", "redacted": "█████ is here.", "counts": {"PERSON": 1}}
+        finally:
+            servers[0].shutdown()
+            thread.join(10)
+        assert not os.path.exists(socket_path)
+        assert socketserver.ThreadingUnixStreamServer.daemon_threads is False
+    finally:
+        clear_models()
+
+def test_discovery_and_stable_outputs(tmp_path):
+    """
+    Test lazy recursive discovery, stable output names, gzip input and output and aggregated stats.
+
+    Two inputs share a file name in different directories; with --stable-names their outputs
+    mirror the input tree, a ".gz" input is read transparently, and the statistics of every
+    file end up in the one --stats-aggregate file. A file list read from stdin finds the same files.
+    """
+    import io
+    import glob
+    import gzip
+    (tmp_path / "in" / "a").mkdir(parents=True)
+    (tmp_path / "in" / "b").mkdir()
+    (tmp_path / "in" / "a" / "x.txt").write_text("Grant wrote this.", encoding="utf-8")
+    with gzip.open(tmp_path / "in" / "b" / "x.txt.gz", "wt", encoding="utf-8") as f:
+        f.write("Grant wrote that.")
+    (tmp_path / "in" / "b" / "skip.md").write_text("Grant", encoding="utf-8")
+
+    pattern = str(tmp_path / "in" / "**" / "*.txt*")
+    found = sorted(iter_files(pattern))
+    assert found == sorted(glob.glob(pattern, recursive=True))
+    assert sorted(iter_files("-", stdin=io.StringIO("\n".join(found) + "\n"))) == found
+
+    out_dir = tmp_path / "out"
+    args = argparse.Namespace(input=pattern, output=str(out_dir), names=True, dates=False, phones=False,
+                              address=False, concept=None, stats="stdout", stable_names=True, gzip_output=True,
+                              stats_aggregate=str(out_dir / "all_stats.txt"))
+    register_model('nlp', StubDoc)
+    try:
+        main(args)
+    finally:
+        clear_models()
+    with gzip.open(out_dir / "a" / "x.txt.censored.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "█████ wrote this."
+    with gzip.open(out_dir / "b" / "x.txt.censored.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "█████ wrote that."
+    assert (out_dir / "all_stats.txt").read_text(encoding="utf-8").count("PERSON : 1") == 2
+    assert [path.name for path in out_dir.rglob("*stats*")] == ["all_stats.txt"]
+
+def test_sharded_redaction_matches_single_pass():
+    """
+    Test that redacting a document in shards gives the same output, entities and spans as one pass.
+
+    A name only introduced with a title in the last shard must still be masked in the first one,
+    and an address wrapped across lines inside a paragraph must be found as in the full pass.
+    """
+    with open("sample.txt", "r", encoding="utf-8") as f:
+        sample = f.read()
+    text = ("Zed reviewed the file.\n\n" + sample + "\n\nSend it to 123 Maple St,\nSeattle, WA 98101.\n\n") * 3 + "Dear Zed, thanks."
+    args = argparse.Namespace(names=True, dates=True, phones=True, address=True, concept=None, places=None,
+                              shards=3, shard_chars=1000, shard_overlap_chars=200)
+    single_spans, sharded_spans = [], []
+    register_model('nlp', StubDoc)
+    try:
+        assert use_shards(text, args)
+        single = redact_sensitive_info(text, args, spans=single_spans, read_file=False)
+        sharded = redact_sensitive_info_sharded(text, args, spans=sharded_spans)
+    finally:
+        clear_models()
+
+    assert len(plan_shards(text.splitlines(), 1000, 200)) > 3
+    assert sharded[0] == single[0]
+    assert not sharded[0].startswith("Zed")
+    assert [sorted(found) for found in sharded[1:]] == [sorted(found) for found in single[1:]]
+    assert sharded_spans == single_spans
+
+def test_redact_document_written_from_spans(tmp_path):
+    """
+    Test that masking the output while writing it gives the same text as redact_sensitive_info.
+
+    redact_document returns the text with the merged offsets to mask, and write_output masks
+    them while writing, so the redacted text is never built as a string.
+    """
+    text = "Grant lives at 12 Oak St,\nSpringfield, IL 62704.\n\nCall Mr. Lee on 01/02/2024 at 658-856-4967."
+    args = argparse.Namespace(names=True, dates=True, phones=True, address=True)
+    register_model('nlp', StubDoc)
+    try:
+        expected, _, _, _, _ = redact_sensitive_info(text, args, read_file=False)
+        joined, mask, entities = redact_document(text, args, read_file=False)
+    finally:
+        clear_models()
+
+    assert joined == text
+    assert mask == merge_spans(mask)
+    assert "Grant" in entities["PERSON"]
+    write_output(str(tmp_path / "a.censored"), joined, spans=mask)
+    assert (tmp_path / "a.censored").read_text(encoding="utf-8") == expected
+    assert "Springfield" not in expected and "Lee" not in expected
+    buffer = io.StringIO()
+    write_masked(buffer, joined, mask)
+    assert buffer.getvalue() == expected
+
+def test_entity_registry_across_files(tmp_path):
+    """
+    Test that a name found in one file is masked in a later file where no detector finds it.
+
+    The registry is carried from one run to the next through its store. With
+    --entity-registry-skip-ner the registry replaces NER in a file where it finds entities,
+    but a file without registry hits still goes through NER. Short or non-name strings such
+    as email local parts are not registered, and a full registry evicts its least recently
+    used entities.
+    """
+    (tmp_path / "a.txt").write_text("Dear Zed, see you at 12 Oak St.", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("Zed left early.", encoding="utf-8")
+    (tmp_path / "c.txt").write_text("Grant wrote from jdoe@mail.com.", encoding="utf-8")
+    store = tmp_path / "registry.tsv"
+    calls = []
+    def counting_model(text):
+        calls.append(text)
+        return StubDoc(text)
+    register_model('nlp', counting_model)
+    try:
+        for name in ("a.txt", "b.txt", "c.txt"):
+            args = argparse.Namespace(input=str(tmp_path / name), output=str(tmp_path / "out") + os.sep, names=True,
+                                      dates=False, phones=False, address=False, concept=None, stats="stdout",
+                                      entity_registry_store=str(store), entity_registry_skip_ner=True)
+            main(args)
+    finally:
+        clear_models()
+
+    assert (tmp_path / "out" / "b.txt.censored").read_text(encoding="utf-8") == "███ left early."
+    assert len(calls) == 2
+    assert (tmp_path / "out" / "c.txt.censored").read_text(encoding="utf-8").startswith("█████ wrote")
+    stored = load_registry_store(str(store))
+    assert ("PERSON", "Zed", 2) in stored and ("PERSON", "Grant", 1) in stored
+    assert not any(entity == "jdoe" for _, entity, _ in stored)
+    assert not registry_enabled()
+
+    enable_entity_registry(max_entities=10)
+    try:
+        register_entities({"PERSON": ["Name" + chr(ord("A") + number) for number in range(10)]})
+        assert find_registered_entities("NameA and NameB met.")["PERSON"]
+        register_entities({"PERSON": ["Al", "j.doe_2", "the board", "12 34"]})
+        assert registry_size() == 10
+        register_entities({"PERSON": ["NameK"], "ADDRESS": ["Main St"]})
+        assert registry_size() == 9
+        assert set(find_registered_entities("NameA NameB NameC NameK on Main St")["PERSON"]) == {"NameA", "NameB", "NameK"}
+        assert find_registered_entities("NameA NameB NameC NameK on Main St")["ADDRESS"] == ["Main St"]
+    finally:
+        disable_entity_registry()
+
+def test_output_writer_survives_bad_content(tmp_path):
+    """
+    Test that a write failing with something other than OSError is recorded and the writer keeps going.
+
+    With a queue of one output, a writer thread that died on the bad item would leave the
+    following write_output calls blocked forever.
+    """
+    start_output_writer(queue_size=1)
+    try:
+        write_output(str(tmp_path / "bad.txt"), 123)
+        write_output(str(tmp_path / "surrogate.txt"), "\ud800")
+        for index in range(3):
+            write_output(str(tmp_path / f"good{index}.txt"), "ok")
+    finally:
+        errors = stop_output_writer()
+    assert [path for path, _ in errors] == [str(tmp_path / "bad.txt"), str(tmp_path / "surrogate.txt")]
+    assert errors[0][1].startswith("TypeError") and errors[1][1].startswith("UnicodeEncodeError")
+    assert all((tmp_path / f"good{index}.txt").read_text(encoding="utf-8") == "ok" for index in range(3))
+
+
+def test_read_ahead_pipeline(tmp_path, capsys):
+    """
+    Test that files read ahead on the reader thread come back in order, that a read error is
+    raised at its file, and that main reports the utilization of each stage.
+    """
+    for number in range(5):
+        (tmp_path / f"{number}.txt").write_text(f"Grant wrote file {number}.", encoding="utf-8")
+    paths = [str(tmp_path / f"{number}.txt") for number in range(5)]
+    stats = new_pipeline_stats()
+    read = [(path, text) for path, text, _ in read_ahead(iter(paths), read_text_file, queue_size=2, stats=stats)]
+    assert read == [(path, f"Grant wrote file {number}.") for number, path in enumerate(paths)]
+    assert stats["files"] == 5
+
+    inputs = read_ahead(paths[:1] + [str(tmp_path / "missing.txt")], read_text_file, queue_size=1)
+    assert next(inputs)[0] == paths[0]
+    with pytest.raises(FileNotFoundError):
+        next(inputs)
+
+    args = argparse.Namespace(input=str(tmp_path / "*.txt"), output=str(tmp_path / "out") + os.sep, names=True,
+                              dates=False, phones=False, address=False, concept=None, stats="stdout",
+                              batch_size=2, read_queue_size=1, output_queue_size=1, utilization=True)
+    register_model('nlp', StubDoc)
+    try:
+        main(args)
+    finally:
+        clear_models()
+    for number in range(5):
+        assert (tmp_path / "out" / f"{number}.txt.censored").read_text(encoding="utf-8") == f"█████ wrote file {number}."
+    report = capsys.readouterr().err
+    assert "Pipeline over" in report and "5 files" in report and "bottleneck:" in report
+
+def test_redactor_api():
+    """
+    Test that the Redactor library interface gives the same text as redact_sensitive_info,
+    with the masked spans and entity counts. Texts that name files are not read.
+    """
+    texts = ["Grant called 658-856-4967 on 01/02/2024.", "sample.txt", "Nothing here."] * 2
+    register_model('nlp', StubDoc)
+    try:
+        redactor = Redactor(names=True, dates=True, phones=True, batch_size=4)
+        results = list(redactor.redact_many(iter(texts)))
+        single = redactor.redact(texts[0])
+        expected = redact_sensitive_info(texts[0], argparse.Namespace(names=True, dates=True, phones=True, address=False),
+                                         read_file=False)[0]
+    finally:
+        clear_models()
+
+    assert [result["text"] for result in results[:3]] == [expected, "sample.txt", "Nothing here."]
+    assert single == results[0] == results[3]
+    assert single["counts"] == {"PERSON": 1, "DATE": 1, "PHONE": 1}
+    assert {(span["start"], span["end"], span["type"]) for span in single["spans"]} >= {(0, 5, "PERSON")}
+
+def test_structured_csv_and_jsonl(tmp_path):
+    """
+    Test that CSV and JSONL records are redacted cell by cell with their schema kept.
+
+    The header, numeric columns and non-string JSON values are written unchanged, strings in
+    nested JSON objects and lists are redacted, a masked multi-line cell keeps its line breaks,
+    and only the --text-fields cells go through NER.
+    """
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.csv").write_text(
+        'id,name,notes,amount\n1,Grant,"Call 658-856-4967,\nor write to Grant",12.5\n2,Zed,Seen on 01/02/2024,7\n'
+        '3,Ann,nothing,8\n', encoding="utf-8")
+    (tmp_path / "in" / "b.jsonl").write_text(
+        '{"id": 1, "notes": "Grant called on 01/02/2024", "n": 3, "tags": ["Grant", 5]}\n\n'
+        '{"id": 2, "ok": true, "contact": {"name": "Dear Grant", "phone": "658-856-4967", "notes": ["Zed met Grant"]}}\n',
+        encoding="utf-8")
+    calls = []
+    def counting_model(text):
+        calls.append(text)
+        return StubDoc(text)
+    args = argparse.Namespace(input=str(tmp_path / "in" / "*"), output=str(tmp_path / "out") + os.sep, names=True,
+                              dates=True, phones=True, address=False, concept=None, stats="stdout", structured="auto",
+                              text_fields=["notes", "tags", "contact.name", "contact.notes"], structured_batch_rows=2)
+    register_model('nlp', counting_model)
+    try:
+        main(args)
+    finally:
+        clear_models()
+
+    assert (tmp_path / "out" / "a.csv.censored").read_text(encoding="utf-8") == (
+        'id,name,notes,amount\n1,Grant,"Call ████████████,\nor write to █████",12.5\n2,Zed,Seen on ██████████,7\n'
+        '3,Ann,nothing,8\n')
+    assert (tmp_path / "out" / "b.jsonl.censored").read_text(encoding="utf-8") == (
+        '{"id": 1, "notes": "█████ called on ██████████", "n": 3, "tags": ["█████", 5]}\n'
+        '{"id": 2, "ok": true, "contact": {"name": "Dear █████", "phone": "████████████", "notes": ["Zed met █████"]}}\n')
+    assert sorted(calls) == sorted(["Call 658-856-4967,\nor write to Grant", "Seen on 01/02/2024", "nothing",
+                                    "Grant called on 01/02/2024", "Grant", "Dear Grant", "Zed met Grant"])
+    assert path_name(("contacts", 2, "name")) == "contacts[2].name" and is_text_field("contacts[2].name", {"contacts.name"})
+    assert structured_format("x.CSV.gz", "auto") == "csv" and structured_format("x.txt", "auto") == "text"
+
+def test_profile_mode(tmp_path, capsys):
+    """
+    Test that --profile writes the cProfile statistics, collapsed stacks and the slowest
+    documents with their stage timings.
+    """
+    import pstats
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "short.txt").write_text("Grant wrote this.", encoding="utf-8")
+    with open("sample.txt", "r", encoding="utf-8") as f:
+        (tmp_path / "in" / "long.txt").write_text(f.read() * 20, encoding="utf-8")
+    profile_dir = tmp_path / "profile"
+    args = argparse.Namespace(input=str(tmp_path / "in" / "*.txt"), output=str(tmp_path / "out") + os.sep, names=True,
+                              dates=True, phones=True, address=True, concept=None, stats="stdout",
+                              profile=str(profile_dir), profile_top=1, profile_interval=1)
+    register_model('nlp', StubDoc)
+    try:
+        main(args)
+    finally:
+        clear_models()
+
+    assert pstats.Stats(str(profile_dir / "profile.pstats")).total_calls > 0
+    stacks = (profile_dir / "profile.collapsed").read_text(encoding="utf-8").splitlines()
+    assert stacks and all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert any("redact_document (redactor.py:" in line for line in stacks)
+    report = (profile_dir / "slowest.txt").read_text(encoding="utf-8")
+    assert report.startswith("Slowest 1 of 2 documents") and "long.txt" in report and "short.txt" not in report
+    assert "ner" in report.splitlines()[1] and "pyap" in report.splitlines()[1]
+    assert report in capsys.readouterr().err
+
+def test_compile_matcher_long_terms():
+    """
+    Test that terms of 1,000 characters or more are matched without a RecursionError, still
+    preferring the longest term at a position, and that a long address is fully masked.
+    """
+    long_term = "word " * 250
+    prefixes = [long_term[:length] for length in range(1, 101)]
+    matcher = compile_matcher(prefixes + [long_term, long_term + "x"])
+    assert matcher.match(long_term + "x").group() == long_term + "x"
+    assert matcher.match(long_term[:150]).group() == long_term[:100]
+    assert find_spans(matcher, "a " + long_term) == [(2, 2 + len(long_term))]
+
+    text = "Send to 12 " + long_term + "St please."
+    args = argparse.Namespace(names=False, dates=False, phones=False, address=True)
+    register_model('nlp', StubDoc)
+    try:
+        redacted = redact_sensitive_info(text, args, read_file=False)[0]
+    finally:
+        clear_models()
+    assert redacted.startswith("Send to ") and redacted.endswith(" please.") and "word" not in redacted